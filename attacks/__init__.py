@@ -17,6 +17,15 @@ from .untargeted_batch_l1_normalized_gradient_method import *
 from .untargeted_batch_l2_carlini_wagner import *
 from .untargeted_batch_linf_carlini_wagner import *
 from .untargeted_batch_fast_gradient_sign_method import *
+from .untargeted_batch_linf_fused_gradient_method import *
+from .untargeted_batch_l2_fused_gradient_method import *
+from .untargeted_batch_l1_fused_gradient_method import *
+from .untargeted_batch_linf_adaptive_gradient_method import *
+from .untargeted_batch_l2_adaptive_gradient_method import *
+from .untargeted_batch_l1_adaptive_gradient_method import *
+from .untargeted_batch_linf_gauss_newton_method import *
+from .untargeted_batch_l2_gauss_newton_method import *
+from .untargeted_batch_binary_search import *
 
 # Untargeted objectives.
-from .untargeted_objectives import UntargetedF0, UntargetedF6
+from .untargeted_objectives import UntargetedF0, UntargetedF6, CompiledObjective
@@ -1,5 +1,17 @@
 import torch
+from enum import Enum
 from common import cuda
+import common.torch
+
+
+class HistoryMode(Enum):
+    """
+    Defines what is recorded in the history of an attack.
+    """
+
+    OFF = 1
+    SUMMARY = 2
+    FULL = 3
 
 
 class UntargetedAttack:
@@ -76,12 +88,52 @@ class UntargetedAttack:
         self.auto_encoder = None
         """ (torch.nn.Module) Might hold an auto encoder used to enforce on-manifold constraints by projection. """
 
+        self.projection_tolerance = None
+        """
+        (float or None) Tolerance for alternating projections.
+        If set, alternating projections are warm-started from the last projection for samples whose perturbation moved
+        by less than the tolerance, and stopped per sample once the projected perturbation changes by less than the
+        tolerance; otherwise, the given number of projections is always performed.
+        """
+
+        self.projection_inputs = None
+        """ (torch.Tensor or None) Input perturbations of the last alternating projection. """
+
+        self.projection_cache = None
+        """ (torch.Tensor or None) Projected perturbations of the last alternating projection, used as warm start. """
+
         self.training_mode = False
         """ (bool) Training mode. """
 
         self.history = []
         """ ([dict] History. """
 
+        self.history_mode = HistoryMode.OFF
+        """ (HistoryMode) What to record in the history. """
+
+        self.history_skip = 1
+        """ (int) Record the history every history_skip iterations. """
+
+        self.callback = None
+        """ (callable or None) Called in every iteration with the attack, the iteration and a dict of current values. """
+
+        self.compaction = False
+        """ (bool) Whether to drop finished samples from the working batch. """
+
+        self.compaction_callback = None
+        """
+        (callable or None) Compaction callback.
+        Called with the indices (relative to the original batch) of the samples
+        remaining in the working batch whenever the working batch changes; this allows
+        to keep per-sample state of the model, e.g., fixed codes of decoders, in sync.
+        """
+
+        self.indices = None
+        """ (torch.LongTensor) Indices of the samples in the working batch relative to the original batch. """
+
+        self.full_batch = None
+        """ (dict or None) Per-sample state of the original batch while the working batch is compacted. """
+
     def set_training_mode(self, training_mode=True):
         """
         Set training mode for attack.
@@ -192,12 +244,29 @@ class UntargetedAttack:
         #assert isinstance(auto_encoder, models.AutoEncoder), 'auto encoder needs to be AutoEncoder'
         self.auto_encoder = auto_encoder
 
-    def project_auto_encoder(self, perturbations):
+    def set_projection_tolerance(self, projection_tolerance):
+        """
+        Set tolerance for alternating projections; the tolerance should be chosen well below the step size
+        of the attack.
+
+        :param projection_tolerance: tolerance on the L_ord change of the projected perturbation, None to disable
+        :type projection_tolerance: float or None
+        """
+
+        assert projection_tolerance is None or projection_tolerance >= 0
+
+        self.projection_tolerance = projection_tolerance
+        self.projection_inputs = None
+        self.projection_cache = None
+
+    def project_auto_encoder(self, perturbations, indices=None):
         """
         Project the current image + perturbation onto the manifold and deduce the new perurbation from it.
 
         :param perturbations: current perturbations
         :type perturbations: torch.Tensor
+        :param indices: if given, the perturbations correspond to these samples of the working batch
+        :type indices: torch.LongTensor or None
         :return: projected perturbations
         :rtype: torch.Tensor
         """
@@ -205,12 +274,288 @@ class UntargetedAttack:
         assert self.auto_encoder is not None, 'called project_auto_encoder without setting the auto encoder first'
         assert isinstance(perturbations, torch.Tensor), 'given perturbation needs to be torch.Tensor'
 
-        images = torch.autograd.Variable(self.images + perturbations, False)
+        original_images = self.images.data
+        if indices is not None:
+            original_images = original_images.index_select(0, indices)
+
+        images = torch.autograd.Variable(original_images + perturbations, False)
         if cuda.is_cuda(self.auto_encoder):
             images = images.cuda()
 
         reconstruction, _, _ = self.auto_encoder.forward(images)
-        return reconstruction.data - self.images.data # Retrieve the perturbation from the projected image!
+        return reconstruction.data - original_images # Retrieve the perturbation from the projected image!
+
+    def project_alternating(self, perturbations, epsilon, ord=2, max_projections=5):
+        """
+        Alternating projection onto the L_ord epsilon-ball and the manifold given by the auto encoder.
+
+        If a projection tolerance is set, samples whose perturbation moved by less than the tolerance since the last call
+        start alternating from their last projection, shifted by the same step, instead of from the perturbation itself;
+        all samples stop alternating once the change of their projected perturbation falls below the tolerance, and only
+        the remaining samples are passed through the auto encoder. Warm-started samples usually converge after one projection.
+
+        :param perturbations: current perturbations
+        :type perturbations: torch.Tensor
+        :param epsilon: radius of ball
+        :type epsilon: float
+        :param ord: order of norm
+        :type ord: int
+        :param max_projections: maximum number of projections
+        :type max_projections: int
+        :return: projected perturbations
+        :rtype: torch.Tensor
+        """
+
+        assert self.auto_encoder is not None, 'called project_alternating without setting the auto encoder first'
+
+        # Also note that the order of projections is relevant!
+        if self.projection_tolerance is None:
+            for j in range(max_projections):
+                perturbations = common.torch.project(perturbations, epsilon, ord)
+                perturbations = self.project_auto_encoder(perturbations)
+            return perturbations
+
+        def residual(a, b):
+            return torch.norm((a - b).view(a.size(0), -1), ord, 1)
+
+        perturbations = perturbations.clone()
+        inputs = perturbations.clone()
+        active = torch.arange(0, perturbations.size(0)).long()
+        if perturbations.is_cuda:
+            active = active.cuda()
+
+        # The last projection is only a starting point; it is shifted by the step the input took since the last call
+        # such that the progress of the attack is kept, and the projections below are still applied.
+        if self.projection_inputs is not None and self.projection_inputs.size() == perturbations.size():
+            close = torch.nonzero(residual(perturbations, self.projection_inputs) <= self.projection_tolerance).view(-1)
+            if close.numel() > 0:
+                steps = perturbations.index_select(0, close) - self.projection_inputs.index_select(0, close)
+                perturbations.index_copy_(0, close, self.projection_cache.index_select(0, close) + steps)
+
+        for j in range(max_projections):
+            if active.numel() == 0:
+                break
+
+            current = perturbations.index_select(0, active)
+            projected = common.torch.project(current, epsilon, ord)
+            projected = self.project_auto_encoder(projected, active)
+            perturbations.index_copy_(0, active, projected)
+            active = active[residual(projected, current) > self.projection_tolerance]
+
+        self.projection_inputs = inputs
+        self.projection_cache = perturbations.clone()
+        return perturbations
+
+    def set_history(self, history_mode=HistoryMode.FULL, history_skip=1):
+        """
+        Set history mode; in summary mode, only mean, minimum and maximum of the recorded values
+        are kept.
+
+        :param history_mode: history mode
+        :type history_mode: HistoryMode
+        :param history_skip: record every history_skip iterations
+        :type history_skip: int
+        """
+
+        assert isinstance(history_mode, HistoryMode), 'history mode needs to be HistoryMode'
+        assert history_skip > 0
+
+        self.history_mode = history_mode
+        self.history_skip = history_skip
+
+    def set_callback(self, callback):
+        """
+        Set a callback called in every iteration as callback(attack, iteration, values)
+        where values is a dict of the current (device) tensors.
+
+        :param callback: callback
+        :type callback: callable or None
+        """
+
+        self.callback = callback
+
+    def record(self, iteration, values):
+        """
+        Record the current values in the history according to the history mode and call the callback.
+
+        :param iteration: current iteration
+        :type iteration: int
+        :param values: current values of the attack
+        :type values: dict
+        """
+
+        if self.callback is not None:
+            self.callback(self, iteration, values)
+
+        if self.history_mode == HistoryMode.OFF or iteration % self.history_skip != 0:
+            return
+
+        entry = {'iteration': iteration}
+        if self.history_mode == HistoryMode.FULL:
+            for key in values.keys():
+                entry[key] = values[key].detach().cpu().numpy()
+        else:
+            # Statistics are gathered on the device and copied to the host at once.
+            keys = []
+            statistics = []
+            for key in values.keys():
+                value = values[key].detach()
+                if not value.is_floating_point():
+                    continue
+                if value.dim() > 1:
+                    # e.g., probabilities are summarized using the confidence
+                    value = torch.max(value.view(value.size(0), -1), 1)[0]
+                keys.append(key)
+                statistics.append(torch.stack((torch.mean(value), torch.min(value), torch.max(value))))
+
+            if len(statistics) > 0:
+                statistics = torch.stack(statistics).cpu().numpy()
+                for k in range(len(keys)):
+                    entry[keys[k] + '_mean'] = statistics[k, 0]
+                    entry[keys[k] + '_min'] = statistics[k, 1]
+                    entry[keys[k] + '_max'] = statistics[k, 2]
+
+        self.history.append(entry)
+
+    def set_compaction(self, compaction=True, callback=None):
+        """
+        Set compaction mode, i.e., remove samples from the working batch once they succeeded.
+
+        :param compaction: compaction mode
+        :type compaction: bool
+        :param callback: called with the indices of the remaining samples whenever the working batch changes
+        :type callback: callable or None
+        """
+
+        self.compaction = compaction
+        self.compaction_callback = callback
+
+    def initialize_indices(self):
+        """
+        Initialize the indices of the working batch, i.e., start with the full batch.
+        """
+
+        self.indices = torch.arange(0, self.images.size(0)).long()
+        if cuda.is_cuda(self.model):
+            self.indices = self.indices.cuda()
+
+    def select(self, tensor, keep, batch_size):
+        """
+        Select the given samples from a tensor if the tensor holds per-sample values.
+
+        :param tensor: tensor
+        :type tensor: torch.Tensor or None
+        :param keep: indices of samples to keep
+        :type keep: torch.LongTensor
+        :param batch_size: current batch size
+        :type batch_size: int
+        :return: selected tensor
+        :rtype: torch.Tensor or None
+        """
+
+        if isinstance(tensor, torch.Tensor) and tensor.dim() == self.images.dim() and tensor.size(0) == batch_size:
+            return tensor.index_select(0, keep)
+        return tensor
+
+    def scatter(self, tensor, mask, values):
+        """
+        Overwrite the entries of the working batch in a tensor over the original batch wherever the mask is set;
+        in contrast to boolean mask indexing, this does not synchronize with the host.
+
+        :param tensor: tensor over the original batch, updated in-place
+        :type tensor: torch.Tensor
+        :param mask: per-sample mask over the working batch
+        :type mask: torch.Tensor
+        :param values: per-sample values over the working batch or a scalar
+        :type values: torch.Tensor or float
+        """
+
+        current = tensor.index_select(0, self.indices)
+        if not isinstance(values, torch.Tensor):
+            values = current.new_full(current.size(), values)
+        mask = mask.view((-1, ) + (1, )*(current.dim() - 1)).expand_as(current)
+        tensor.index_copy_(0, self.indices, torch.where(mask, values, current))
+
+    def compact(self, keep):
+        """
+        Reduce the working batch to the given samples.
+
+        :param keep: indices of samples to keep, relative to the current working batch
+        :type keep: torch.LongTensor
+        """
+
+        if self.full_batch is None:
+            self.full_batch = {
+                'images': self.images,
+                'logits': self.logits,
+                'classes': self.classes,
+                'min_bound': self.min_bound,
+                'max_bound': self.max_bound,
+                'encoder_min_bound': self.encoder_min_bound,
+                'encoder_max_bound': self.encoder_max_bound,
+            }
+
+        batch_size = self.images.size(0)
+        self.min_bound = self.select(self.min_bound, keep, batch_size)
+        self.max_bound = self.select(self.max_bound, keep, batch_size)
+        self.encoder_min_bound = self.select(self.encoder_min_bound, keep, batch_size)
+        self.encoder_max_bound = self.select(self.encoder_max_bound, keep, batch_size)
+        self.images = self.images.index_select(0, keep)
+        self.logits = self.logits.index_select(0, keep)
+        self.classes = self.classes.index_select(0, keep)
+        self.indices = self.indices.index_select(0, keep)
+        self.projection_inputs = None
+        self.projection_cache = None
+
+        if self.compaction_callback is not None:
+            self.compaction_callback(self.indices)
+
+    def expand(self):
+        """
+        Restore the original batch after compaction.
+        """
+
+        if self.full_batch is not None:
+            self.images = self.full_batch['images']
+            self.logits = self.full_batch['logits']
+            self.classes = self.full_batch['classes']
+            self.min_bound = self.full_batch['min_bound']
+            self.max_bound = self.full_batch['max_bound']
+            self.encoder_min_bound = self.full_batch['encoder_min_bound']
+            self.encoder_max_bound = self.full_batch['encoder_max_bound']
+            self.full_batch = None
+            self.projection_inputs = None
+            self.projection_cache = None
+
+            self.initialize_indices()
+            if self.compaction_callback is not None:
+                self.compaction_callback(self.indices)
+
+    def initialize_perturbations(self, perturbations):
+        """
+        Initialize the attack from given perturbations.
+
+        :param perturbations: perturbations to start from
+        :type perturbations: numpy.ndarray or torch.Tensor
+        """
+
+        raise NotImplementedError()
+
+    def initialize_generator(self, generator):
+        """
+        Initialize the attack from the perturbations predicted by a perturbation generator, such that the attack
+        only needs to refine the prediction.
+
+        :param generator: perturbation generator
+        :type generator: torch.nn.Module
+        """
+
+        assert isinstance(generator, torch.nn.Module), 'generator needs to be torch.nn.Module'
+        assert generator.training is False, 'generator needs to be in eval mode'
+
+        with torch.no_grad():
+            perturbations = generator(self.images)
+        self.initialize_perturbations(perturbations)
 
     def run(self, objective, verbose=False):
         """
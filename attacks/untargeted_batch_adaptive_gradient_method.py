@@ -0,0 +1,194 @@
+import math
+from .untargeted_batch_fused_gradient_method import *
+
+
+class UntargetedBatchAdaptiveGradientMethod(UntargetedBatchFusedGradientMethod):
+    """
+    Implementation of untargeted auto PGD attack, a step-size free variant of PGD with momentum; the per-sample step size
+    starts at 2 epsilon and is halved at checkpoints when progress stalls, restarting from the best perturbation found so far.
+
+    See [Croce and Hein, Reliable evaluation of adversarial robustness with an ensemble of diverse parameter-free attacks, ICML 2020].
+    """
+
+    def __init__(self, model, images, classes=None, epsilon=0.5, max_iterations=100, alpha=0.75, rho=0.75):
+        """
+        Constructor.
+
+        :param model: model to attack
+        :type model: torch.nn.Module
+        :param images: image(s) to attack
+        :type images: torch.autograd.Variable
+        :param classes: true classes, if None, they will be deduced to avoid label leaking
+        :type classes: torch.autograd.Variable
+        :param epsilon: maximum strength of attack
+        :type epsilon: float
+        :param max_iterations: maximum number of iterations
+        :type max_iterations: int
+        :param alpha: momentum
+        :type alpha: float
+        :param rho: fraction of improving iterations between checkpoints below which the step size is halved
+        :type rho: float
+        """
+
+        super(UntargetedBatchAdaptiveGradientMethod, self).__init__(model, images, classes, epsilon, 2*epsilon, max_iterations)
+
+        self.alpha = alpha
+        """ (float) Momentum. """
+
+        self.rho = rho
+        """ (float) Fraction of improving iterations required between checkpoints. """
+
+        self.checkpoints = None
+        """ ([int]) Iterations at which the step size is adapted. """
+
+        self.lrs = None
+        """ (torch.Tensor) Per-sample step sizes. """
+
+        self.previous_perturbations = None
+        """ (torch.Tensor) Buffer for the perturbations of the previous iteration. """
+
+        self.best_perturbations = None
+        """ (torch.Tensor) Buffer for the perturbations with lowest error. """
+
+        self.best_gradients = None
+        """ (torch.Tensor) Buffer for the gradients at the perturbations with lowest error. """
+
+        self.best_error = None
+        """ (torch.Tensor) Lowest error per sample. """
+
+        self.checkpoint_error = None
+        """ (torch.Tensor) Lowest error per sample at the last checkpoint. """
+
+        self.previous_error = None
+        """ (torch.Tensor) Error per sample of the previous iteration. """
+
+        self.improvements = None
+        """ (torch.Tensor) Number of iterations per sample since the last checkpoint that improved on the previous iteration. """
+
+        self.reduced = None
+        """ (torch.Tensor) Whether the step size was reduced at the last checkpoint per sample. """
+
+    def set_epsilon(self, epsilon):
+        """
+        Set epsilon.
+
+        :param epsilon: maximum strength of attack
+        :type epsilon: float
+        """
+
+        self.epsilon = epsilon
+        self.base_lr = 2*epsilon
+
+    def set_base_lr(self, base_lr):
+        """
+        The initial step size is tied to epsilon; the learning rate is ignored.
+
+        :param base_lr: learning rate
+        :type base_lr: float
+        """
+
+        pass
+
+    def initialize_checkpoints(self):
+        """
+        Compute the checkpoints as fractions of the number of iterations.
+        """
+
+        fractions = [0, 0.22]
+        while fractions[-1] < 1:
+            fractions.append(fractions[-1] + max(fractions[-1] - fractions[-2] - 0.03, 0.06))
+
+        self.checkpoints = sorted(set([int(math.ceil(fraction*self.max_iterations)) for fraction in fractions[1:] if fraction < 1]))
+
+    def initialize_buffers(self):
+        """
+        Allocate the working buffers for the current batch.
+        """
+
+        super(UntargetedBatchAdaptiveGradientMethod, self).initialize_buffers()
+        self.initialize_checkpoints()
+
+        batch_size = self.perturbations.size(0)
+        self.lrs = torch.ones((batch_size), dtype=torch.float32, device=self.device)*self.base_lr
+        self.previous_perturbations = self.perturbations.data.clone()
+        self.best_perturbations = self.perturbations.data.clone()
+        self.best_gradients = torch.zeros_like(self.perturbations.data)
+        self.best_error = torch.ones((batch_size), dtype=torch.float32, device=self.device)*float('inf')
+        self.checkpoint_error = self.best_error.clone()
+        self.previous_error = self.best_error.clone()
+        self.improvements = torch.zeros((batch_size), dtype=torch.float32, device=self.device)
+        self.reduced = torch.zeros((batch_size), dtype=torch.uint8, device=self.device) > 0
+
+    def checkpoint(self, iteration, last_iteration):
+        """
+        Halve the step size of samples whose progress stalled, i.e., fewer than a fraction rho of the iterations since the
+        last checkpoint decreased the error compared to the previous iteration, or whose best error did not improve
+        since the last checkpoint; these samples are restarted from their best perturbation.
+
+        :param iteration: current iteration
+        :type iteration: int
+        :param last_iteration: iteration of last checkpoint
+        :type last_iteration: int
+        """
+
+        stalled = self.improvements < self.rho*(iteration - last_iteration)
+        unchanged = (self.reduced == 0) & (self.best_error >= self.checkpoint_error)
+        reduce = stalled | unchanged
+
+        common.torch.where_(self.lrs, reduce, self.lrs/2)
+        common.torch.where_(self.perturbations.data, reduce, self.best_perturbations)
+        common.torch.where_(self.previous_perturbations, reduce, self.best_perturbations)
+        common.torch.where_(self.gradients, reduce, self.best_gradients)
+
+        self.reduced = reduce
+        self.checkpoint_error.copy_(self.best_error)
+        self.improvements.zero_()
+
+    def step(self, iteration, error):
+        """
+        Momentum step with adaptive step size in-place.
+
+        :param iteration: current iteration
+        :type iteration: int
+        :param error: current per-sample error
+        :type error: torch.Tensor
+        """
+
+        self.gradients.copy_(self.perturbations.grad)
+        self.perturbations.grad.zero_()
+
+        perturbations = self.perturbations.data
+        # As in APGD, progress is counted against the previous iteration, not against the best error.
+        if iteration > 0:
+            self.improvements += (error < self.previous_error).float()
+        self.previous_error.copy_(error)
+
+        improved = error < self.best_error
+        common.torch.where_(self.best_error, improved, error)
+        common.torch.where_(self.best_perturbations, improved, perturbations)
+        common.torch.where_(self.best_gradients, improved, self.gradients)
+
+        if iteration in self.checkpoints:
+            self.checkpoint(iteration, max([0] + [checkpoint for checkpoint in self.checkpoints if checkpoint < iteration]))
+
+        # z = P(x - lr*d) is computed in the gradient buffer.
+        self.direction()
+        self.gradients.mul_(-self.lrs.view((-1, ) + (1, )*(self.gradients.dim() - 1)))
+        self.gradients.add_(perturbations)
+        self.project(self.gradients)
+
+        if iteration == 0:
+            self.previous_perturbations.copy_(perturbations)
+            perturbations.copy_(self.gradients)
+        else:
+            # x' = x + alpha*(z - x) + (1 - alpha)*(x - x_prev), computed in the buffer of x_prev, which is swapped with x.
+            self.previous_perturbations.sub_(perturbations).mul_(-(1 - self.alpha))
+            self.previous_perturbations.add_(self.gradients.mul_(self.alpha))
+            self.gradients.copy_(perturbations).mul_(1 - self.alpha)
+            self.previous_perturbations.add_(self.gradients)
+
+            self.gradients.copy_(perturbations)
+            perturbations.copy_(self.previous_perturbations)
+            self.previous_perturbations.copy_(self.gradients)
+
+        self.project()
@@ -0,0 +1,154 @@
+import torch
+import numpy
+from .untargeted_batch_gradient_descent import *
+
+
+class UntargetedBatchBinarySearch:
+    """
+    Binary search over the weight of the objective, i.e., c_2, as in Carlini and Wagner, for attacks based on
+    UntargetedBatchGradientDescent, e.g., the reparameterized or clipped attacks.
+
+    Instead of re-running the attack for every constant, the attack is run once while keeping a constant per sample;
+    the constants are adapted at fixed outer steps depending on whether the sample was successful within the last
+    step. The smallest successful perturbations are tracked using the minimal mode of the attack.
+    """
+
+    def __init__(self, attack, binary_search_steps=5, ord=None, max_c=1e10):
+        """
+        Constructor.
+
+        :param attack: attack to run
+        :type attack: UntargetedBatchGradientDescent
+        :param binary_search_steps: number of outer steps of binary search
+        :type binary_search_steps: int
+        :param ord: norm in which the perturbations are minimized, defaults to the norm of the attack
+        :type ord: float or None
+        :param max_c: upper bound on constants, also used as initial upper bound
+        :type max_c: float
+        """
+
+        assert isinstance(attack, UntargetedBatchGradientDescent), 'binary search requires attacks based on UntargetedBatchGradientDescent'
+        assert binary_search_steps > 0
+        # Without weight on the norm, scaling the objective does not change the minimizer.
+        assert attack.c_0 > 0, 'binary search requires a positive weight c_0 of the norm'
+
+        if ord is None:
+            ord = attack.ord
+        assert ord in attack.minimal_ords, 'norm of the attack could not be determined'
+
+        self.attack = attack
+        """ (UntargetedBatchGradientDescent) Attack. """
+
+        self.binary_search_steps = binary_search_steps
+        """ (int) Number of outer steps of binary search. """
+
+        self.ord = ord
+        """ (float) Norm in which the perturbations are minimized. """
+
+        self.max_c = max_c
+        """ (float) Upper bound on constants. """
+
+        self.c = None
+        """ (torch.Tensor) Per-sample constants. """
+
+        self.lower = None
+        """ (torch.Tensor) Per-sample lower bounds on constants. """
+
+        self.upper = None
+        """ (torch.Tensor) Per-sample upper bounds on constants. """
+
+        self.step_success = None
+        """ (torch.Tensor) Per-sample success within the current outer step. """
+
+        self.step_iterations = None
+        """ (int) Number of iterations per outer step. """
+
+        self.callback = None
+        """ (callable or None) Callback of the attack that is chained. """
+
+        self.minimal_norms = None
+        """ (numpy.ndarray) Norms of smallest successful perturbations, see UntargetedBatchGradientDescent.set_minimal. """
+
+    def update(self):
+        """
+        Update the constants given the success of the last outer step.
+        """
+
+        success = self.step_success
+        self.upper = torch.where(success, torch.min(self.upper, self.c), self.upper)
+        self.lower = torch.where(success, self.lower, torch.max(self.lower, self.c))
+
+        # As long as no successful constant is known, the constant is increased by an order of magnitude.
+        bisect = self.upper < self.max_c
+        c = torch.where(bisect, (self.lower + self.upper)/2, torch.clamp(self.c*10, max=self.max_c))
+
+        # The constants are updated in-place as the tensor is shared with the attack.
+        self.c.copy_(c)
+        self.step_success.fill_(0)
+
+    def record(self, attack, iteration, values):
+        """
+        Callback of the attack, called in every iteration.
+
+        :param attack: attack
+        :type attack: UntargetedBatchGradientDescent
+        :param iteration: iteration
+        :type iteration: int
+        :param values: current values
+        :type values: dict
+        """
+
+        if self.callback is not None:
+            self.callback(attack, iteration, values)
+
+        # In minimal mode, the working batch is always the full batch.
+        self.step_success |= (values['class'].data != attack.classes.data)
+        if (iteration + 1) % self.step_iterations == 0:
+            self.update()
+
+    def run(self, untargeted_objective, verbose=True):
+        """
+        Run the binary search.
+
+        :param untargeted_objective: untargeted objective
+        :type untargeted_objective: UntargetedObjective
+        :param verbose: output progress
+        :type verbose: bool
+        :return: success, perturbations, probabilities, norms, iteration
+        :rtype: numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray, int
+        """
+
+        attack = self.attack
+        batch_size = attack.images.size(0)
+        device = attack.images.device
+
+        self.c = torch.ones((batch_size), dtype=torch.float32, device=device)*attack.c_2
+        self.lower = torch.zeros((batch_size), dtype=torch.float32, device=device)
+        self.upper = torch.ones((batch_size), dtype=torch.float32, device=device)*self.max_c
+        self.step_success = torch.zeros((batch_size), dtype=torch.uint8, device=device) > 0
+        self.step_iterations = max(1, (attack.max_iterations + 1)//self.binary_search_steps)
+
+        # Compaction would need to select the per-sample constants, so it is disabled.
+        c_2 = attack.c_2
+        attack.set_c_2(self.c)
+        attack.set_minimal(True)
+        attack.set_compaction(False)
+        self.callback = attack.callback
+        attack.set_callback(self.record)
+
+        success, perturbations, probabilities, norms, i = attack.run(untargeted_objective, verbose)
+
+        attack.set_callback(self.callback)
+        attack.set_c_2(c_2)
+
+        # Return the smallest successful perturbation in the given norm; probabilities remain those of the first success.
+        n = attack.minimal_ords.index(self.ord)
+        found = attack.minimal_norms[:, n] < float('inf')
+        perturbations[found] = attack.minimal_perturbations[n][found]
+        norms[found] = attack.minimal_norms[found, n]
+        self.minimal_norms = attack.minimal_norms
+
+        if verbose:
+            log('[%s] %d: success=%g c=%g' % (self.__class__.__name__, i, numpy.sum(success >= 0), torch.mean(self.c).item()))
+
+        return success, perturbations, probabilities, norms, i
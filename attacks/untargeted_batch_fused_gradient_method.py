@@ -0,0 +1,369 @@
+import torch
+import numpy
+from .untargeted_attack import *
+from .untargeted_objectives import *
+from common.log import log
+import common.torch
+import common.numpy
+
+
+class UntargetedBatchFusedGradientMethod(UntargetedAttack):
+    """
+    Implementation of untargeted PGD attack with fused, in-place update steps.
+
+    In contrast to UntargetedBatchNormalizedGradientMethod, all working buffers are allocated once per batch,
+    the device is resolved once, and normalization, update, clipping and projection are applied in-place
+    without tracking gradients. As the buffers span the full batch, compaction is not supported.
+    """
+
+    def __init__(self, model, images, classes=None, epsilon=0.5, base_lr=None, max_iterations=1):
+        """
+        Constructor.
+
+        :param model: model to attack
+        :type model: torch.nn.Module
+        :param images: image(s) to attack
+        :type images: torch.autograd.Variable
+        :param classes: true classes, if None, they will be deduced to avoid label leaking
+        :type classes: torch.autograd.Variable
+        :param epsilon: maximum strength of attack, or per-sample strengths
+        :type epsilon: float or torch.Tensor
+        :param base_lr: learning rate, defaults to epsilon
+        :type base_lr: float or torch.Tensor
+        :param max_iterations: maximum number of iterations
+        :type max_iterations: int
+        """
+
+        super(UntargetedBatchFusedGradientMethod, self).__init__(model, images, classes)
+
+        self.device = self.images.device
+        """ (torch.device) Device of the attack, resolved once. """
+
+        self.ord = None
+        """ (float) Norm of the attack, set by child classes. """
+
+        self.perturbations = None
+        """ (torch.Tensor) Perturbation of attack. """
+
+        self.gradients = None
+        """ (torch.Tensor) Buffer for gradients. """
+
+        self.lower = None
+        """ (torch.Tensor) Buffer for the lower bound of the perturbation. """
+
+        self.upper = None
+        """ (torch.Tensor) Buffer for the upper bound of the perturbation. """
+
+        self.epsilon = epsilon
+        """ (float or torch.Tensor) Strength of attack, per sample if given as tensor. """
+
+        self.base_lr = base_lr if base_lr is not None else epsilon
+        """ (float or torch.Tensor) Learning rate, per sample if given as tensor. """
+
+        self.max_iterations = max_iterations
+        """ (int) Maximum number of iterations. """
+
+        self.sparsity = None
+        """ (float or None) Fraction of coordinates updated per step, if None, all coordinates are updated. """
+
+        self.skip = 5
+        """ (int) Verbosity skip. """
+
+    def set_epsilon(self, epsilon):
+        """
+        Set epsilon.
+
+        :param epsilon: maximum strength of attack
+        :type epsilon: float
+        """
+
+        self.epsilon = epsilon
+
+    def set_base_lr(self, base_lr):
+        """
+        Set base_lr.
+
+        :param base_lr: learning rate
+        :type base_lr: float
+        """
+
+        self.base_lr = base_lr
+
+    def set_max_iterations(self, max_iterations):
+        """
+        Set max iterations.
+
+        :param max_iterations: number of iterations
+        :type max_iterations: int
+        """
+
+        self.max_iterations = max_iterations
+
+    def set_sparsity(self, sparsity):
+        """
+        Set sparsity.
+
+        :param sparsity: fraction of coordinates updated per step
+        :type sparsity: float
+        """
+
+        assert sparsity is None or (sparsity > 0 and sparsity <= 1)
+
+        self.sparsity = sparsity
+
+    def set_compaction(self, compaction=True, callback=None):
+        """
+        Compaction is not supported as the working buffers are allocated once for the full batch.
+
+        :param compaction: compaction mode, needs to be False
+        :type compaction: bool
+        :param callback: callback, ignored
+        :type callback: callable or None
+        """
+
+        assert not compaction, 'compaction not supported by %s' % self.__class__.__name__
+
+    def initialize(self):
+        """
+        Initialize the attack.
+        """
+
+        self.initialize_zero()
+
+    def initialize_zero(self):
+        """
+        Initialize the attack.
+        """
+
+        self.perturbations = torch.zeros_like(self.images.data).requires_grad_()
+
+    def initialize_random(self):
+        """
+        Initialize the attack.
+        """
+
+        size = self.images.size()
+        random = common.numpy.uniform_ball(size[0], numpy.prod(size[1:]), epsilon=1, ord=self.ord)
+        self.perturbations = torch.from_numpy(random.reshape(size).astype(numpy.float32)).to(self.device)
+        self.perturbations = (self.perturbations*self.broadcast(self.epsilon)).requires_grad_()
+
+    def initialize_perturbations(self, perturbations):
+        """
+        Initialize the attack from given perturbations, e.g., perturbations found on a related model or for a smaller epsilon.
+
+        :param perturbations: perturbations to start from
+        :type perturbations: numpy.ndarray or torch.Tensor
+        """
+
+        if isinstance(perturbations, numpy.ndarray):
+            perturbations = torch.from_numpy(perturbations.astype(numpy.float32))
+        assert perturbations.size() == self.images.size(), 'perturbations of size %s do not match images of size %s' % (str(perturbations.size()), str(self.images.size()))
+
+        self.perturbations = perturbations.float().to(self.device).requires_grad_()
+
+    def broadcast(self, value):
+        """
+        Reshape per-sample values, e.g., epsilon or learning rate, to broadcast against the perturbations.
+
+        :param value: scalar or per-sample values
+        :type value: float or torch.Tensor
+        :return: value
+        :rtype: float or torch.Tensor
+        """
+
+        if isinstance(value, torch.Tensor):
+            return value.to(self.device).view((-1, ) + (1, )*(self.images.dim() - 1))
+        return value
+
+    def initialize_buffers(self):
+        """
+        Allocate the working buffers for the current batch.
+        """
+
+        self.gradients = torch.zeros_like(self.perturbations.data)
+
+        # Bounds on image + perturbation are expressed as bounds on the perturbation.
+        self.lower = None
+        if self.min_bound is not None:
+            self.lower = (self.min_bound.to(self.device) - self.images.data).expand_as(self.perturbations).contiguous()
+        self.upper = None
+        if self.max_bound is not None:
+            self.upper = (self.max_bound.to(self.device) - self.images.data).expand_as(self.perturbations).contiguous()
+
+    def project(self, perturbations=None):
+        """
+        Clip and project the perturbation in-place.
+
+        :param perturbations: perturbations to project, defaults to the current perturbations
+        :type perturbations: torch.Tensor or None
+        """
+
+        if perturbations is None:
+            perturbations = self.perturbations.data
+
+        # We assume that the auto encoder projection already takes care of clipping the
+        # output to a valid range!
+        if self.auto_encoder is not None:
+            common.torch.project_(perturbations, self.epsilon, self.ord)
+            perturbations.copy_(self.project_auto_encoder(perturbations))
+        else:
+            if self.upper is not None:
+                torch.min(perturbations, self.upper, out=perturbations)
+            if self.lower is not None:
+                torch.max(perturbations, self.lower, out=perturbations)
+            common.torch.project_(perturbations, self.epsilon, self.ord)
+
+    def norm(self):
+        """
+        Norm.
+
+        :return: norm of current perturbation
+        :rtype: torch.Tensor
+        """
+
+        return torch.norm(self.perturbations.data.view(self.perturbations.size(0), -1), self.ord, 1)
+
+    def direction(self):
+        """
+        Compute the normalized step direction from the gradients in-place; for sparse steps, only the top-k
+        coordinates are kept.
+        """
+
+        if self.sparsity is not None:
+            # Coordinates at the bounds would be pushed outside and are ignored when selecting the top-k coordinates.
+            perturbations = self.perturbations.data
+            if self.upper is not None:
+                self.gradients.masked_fill_((self.gradients < 0) & (perturbations >= self.upper), 0)
+            if self.lower is not None:
+                self.gradients.masked_fill_((self.gradients > 0) & (perturbations <= self.lower), 0)
+
+            gradients = self.gradients.view(self.gradients.size(0), -1)
+            k = max(1, int(round(self.sparsity*gradients.size(1))))
+            threshold = torch.topk(torch.abs(gradients), k, dim=1)[0][:, -1:]
+            mask = (torch.abs(gradients) >= threshold).to(gradients.dtype)
+            gradients.sign_().mul_(mask)
+
+        common.torch.normalize_(self.gradients, self.ord)
+
+    def backward(self, error, output_logits):
+        """
+        Backward pass computing the gradients of the objective with respect to the perturbations.
+
+        :param error: current per-sample error
+        :type error: torch.autograd.Variable
+        :param output_logits: current logits
+        :type output_logits: torch.autograd.Variable
+        """
+
+        torch.sum(error).backward()
+
+    def step(self, iteration, error):
+        """
+        Normalized gradient step in-place.
+
+        :param iteration: current iteration
+        :type iteration: int
+        :param error: current per-sample error
+        :type error: torch.Tensor
+        """
+
+        self.gradients.copy_(self.perturbations.grad)
+        self.perturbations.grad.zero_()
+
+        self.direction()
+        self.gradients.mul_(self.broadcast(self.base_lr))
+        self.perturbations.data.sub_(self.gradients)
+
+    def run(self, untargeted_objective, verbose=True):
+        """
+        Run the attack.
+
+        :param untargeted_objective: untargeted objective
+        :type untargeted_objective: UntargetedObjective
+        :param verbose: output progress
+        :type verbose: bool
+        :return: success, perturbations, probabilities, norms, iteration
+        :rtype: numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray, int
+        """
+
+        assert self.perturbations is not None, 'attack was not initialized properly'
+        assert self.ord is not None, 'norm needs to be set by child classes'
+        assert isinstance(untargeted_objective, UntargetedObjective), 'expected an objective of type UntargetedObjective, got %s instead' % untargeted_objective
+
+        self.initialize_buffers()
+        self.initialize_indices()
+
+        batch_size = self.perturbations.size(0)
+        success = torch.ones((batch_size), dtype=torch.int32, device=self.device)*-1
+        success_error = torch.zeros((batch_size), dtype=torch.float32, device=self.device)
+        success_perturbations = torch.zeros(self.perturbations.size(), dtype=torch.float32, device=self.device)
+        success_probabilities = torch.zeros((batch_size, self.logits.size(1)), dtype=torch.float32, device=self.device)
+        success_norms = torch.zeros((batch_size), dtype=torch.float32, device=self.device)
+
+        i = 0
+        for i in range(self.max_iterations + 1):
+            # 0/
+            # Project current perturbation.
+            with torch.no_grad():
+                self.project()
+
+            # 1/
+            # Compute the logits and the objective for the current perturbations.
+            output_logits = self.model.forward(self.images + self.perturbations)
+            error = untargeted_objective.f(output_logits, self.logits, self.classes)
+
+            # 2/
+            # Book-keeping, logging and break condition.
+            with torch.no_grad():
+                output_probabilities = torch.nn.functional.softmax(output_logits, 1)
+                other_classes = torch.max(output_probabilities, 1)[1]
+                check_norm = self.norm()
+
+                other_success = (other_classes != self.classes.data) & (success < 0)
+                if self.training_mode:
+                    update = (error < success_error) | (success < 0)
+                else:
+                    update = other_success
+
+                # Boolean mask indexing would synchronize with the host.
+                common.torch.where_(success, other_success, i)
+                common.torch.where_(success_error, update, error)
+                common.torch.where_(success_perturbations, update, self.perturbations.data)
+                common.torch.where_(success_probabilities, update, output_probabilities)
+                common.torch.where_(success_norms, update, check_norm)
+
+            self.record(i, {
+                'indices': self.indices,
+                'class': other_classes,
+                'success': (success >= 0).float(),
+                'error': error,
+                'probabilities': output_probabilities,
+                'norms': check_norm
+            })
+
+            if verbose and i % self.skip == 0:
+                log('[%s] %d: objective=%g success=%g' % (self.__class__.__name__, i, torch.sum(error.data)/batch_size, torch.sum(success >= 0).item()))
+
+            if not self.training_mode and torch.sum(success < 0).item() == 0:
+                if verbose:
+                    log('[%s] %d: objective=%g success=%g' % (self.__class__.__name__, i, torch.sum(error.data)/batch_size, torch.sum(success >= 0).item()))
+                break
+
+            if i == self.max_iterations:
+                if verbose:
+                    log('[%s] %d: objective=%g success=%g' % (self.__class__.__name__, i, torch.sum(error.data)/batch_size, torch.sum(success >= 0).item()))
+                break
+
+            # 3/
+            # Backward pass and in-place update step.
+            self.backward(error, output_logits)
+            with torch.no_grad():
+                self.step(i, error.data)
+
+        # In any case, we return the current perturbations for non-successful attacks.
+        fail = success < 0
+        common.torch.where_(success_perturbations, fail, self.perturbations.data)
+        common.torch.where_(success_probabilities, fail, output_probabilities.data)
+        common.torch.where_(success_norms, fail, check_norm)
+
+        return success.cpu().numpy(), success_perturbations.cpu().numpy(), success_probabilities.cpu().numpy(), success_norms.cpu().numpy(), i
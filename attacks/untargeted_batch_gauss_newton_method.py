@@ -0,0 +1,155 @@
+from .untargeted_batch_fused_gradient_method import *
+
+
+class UntargetedBatchGaussNewtonMethod(UntargetedBatchFusedGradientMethod):
+    """
+    Implementation of an untargeted second-order attack for low-dimensional inputs, e.g., latent codes of decoders.
+
+    The Jacobian of the logits with respect to the perturbation is computed explicitly, using one backward pass
+    per class. Each iteration takes a damped Gauss-Newton step onto the linearized decision boundary of the
+    closest class, restricted to a per-sample trust region that is adapted based on the agreement of the predicted
+    and the actual change of the margin.
+    """
+
+    def __init__(self, model, images, classes=None, epsilon=0.5, base_lr=None, max_iterations=10, damping=1e-6, overshoot=0.02):
+        """
+        Constructor.
+
+        :param model: model to attack
+        :type model: torch.nn.Module
+        :param images: latent codes (or images) to attack
+        :type images: torch.autograd.Variable
+        :param classes: true classes, if None, they will be deduced to avoid label leaking
+        :type classes: torch.autograd.Variable
+        :param epsilon: maximum strength of attack
+        :type epsilon: float
+        :param base_lr: initial trust region radius, defaults to epsilon
+        :type base_lr: float
+        :param max_iterations: maximum number of iterations
+        :type max_iterations: int
+        :param damping: damping of the Gauss-Newton steps
+        :type damping: float
+        :param overshoot: margin by which to step beyond the linearized decision boundary
+        :type overshoot: float
+        """
+
+        super(UntargetedBatchGaussNewtonMethod, self).__init__(model, images, classes, epsilon, base_lr, max_iterations)
+
+        self.damping = damping
+        """ (float) Damping of Gauss-Newton steps. """
+
+        self.overshoot = overshoot
+        """ (float) Overshoot beyond the linearized decision boundary. """
+
+        self.jacobians = None
+        """ (torch.Tensor) Jacobians of the logits with respect to the perturbation, as batch x classes x dimensions. """
+
+        self.output_logits = None
+        """ (torch.Tensor) Logits corresponding to the Jacobians. """
+
+        self.radius = None
+        """ (torch.Tensor) Per-sample trust region radius. """
+
+        self.previous_margins = None
+        """ (torch.Tensor) Margins before the last step. """
+
+        self.predicted_margins = None
+        """ (torch.Tensor) Margins predicted by the linearization for the last step. """
+
+        self.target_classes = None
+        """ (torch.Tensor) Classes targeted in the last step. """
+
+        self.skip = 1
+        """ (int) Verbosity skip. """
+
+    def set_damping(self, damping):
+        """
+        Set damping.
+
+        :param damping: damping of the Gauss-Newton steps
+        :type damping: float
+        """
+
+        assert damping > 0
+
+        self.damping = damping
+
+    def initialize_buffers(self):
+        """
+        Allocate the working buffers for the current batch.
+        """
+
+        super(UntargetedBatchGaussNewtonMethod, self).initialize_buffers()
+
+        batch_size = self.perturbations.size(0)
+        self.radius = torch.ones((batch_size), dtype=torch.float32, device=self.device)*self.base_lr
+        self.previous_margins = None
+        self.predicted_margins = None
+        self.target_classes = None
+
+    def backward(self, error, output_logits):
+        """
+        Compute the Jacobian of the logits with respect to the perturbations, one backward pass per class.
+
+        :param error: current per-sample error
+        :type error: torch.autograd.Variable
+        :param output_logits: current logits
+        :type output_logits: torch.autograd.Variable
+        """
+
+        batch_size = output_logits.size(0)
+        num_classes = output_logits.size(1)
+
+        jacobians = []
+        for c in range(num_classes):
+            gradients, = torch.autograd.grad(torch.sum(output_logits[:, c]), self.perturbations, retain_graph=c < num_classes - 1)
+            jacobians.append(gradients.view(batch_size, -1))
+
+        self.jacobians = torch.stack(jacobians, 1)
+        self.output_logits = output_logits.detach()
+
+    def step(self, iteration, error):
+        """
+        Damped Gauss-Newton step within the trust region.
+
+        :param iteration: current iteration
+        :type iteration: int
+        :param error: current per-sample error
+        :type error: torch.Tensor
+        """
+
+        batch_size, num_classes, dimensions = self.jacobians.size()
+        classes = self.classes.data.view(-1, 1)
+
+        margins = self.output_logits - self.output_logits.gather(1, classes)
+        directions = self.jacobians - self.jacobians.gather(1, classes.view(-1, 1, 1).expand(-1, 1, dimensions))
+        norms = torch.sum(directions**2, 2) + self.damping
+
+        # Adapt the trust region based on the actual compared to the predicted margin of the last step.
+        if self.predicted_margins is not None:
+            actual = margins.gather(1, self.target_classes.view(-1, 1)).view(-1) - self.previous_margins
+            predicted = self.predicted_margins - self.previous_margins
+            ratio = actual/torch.clamp(predicted, min=1e-12)
+            radius = torch.where(ratio < 0.25, self.radius*0.25, torch.where(ratio > 0.75, self.radius*2, self.radius))
+            self.radius = torch.min(torch.clamp(radius, min=1e-6), torch.ones_like(radius)*2*self.epsilon)
+
+        # The closest linearized decision boundary is targeted, excluding the true class.
+        distances = torch.abs(margins)/torch.sqrt(norms)
+        distances.scatter_(1, classes, float('inf'))
+        target_classes = torch.min(distances, 1)[1]
+
+        margin = margins.gather(1, target_classes.view(-1, 1))
+        direction = directions.gather(1, target_classes.view(-1, 1, 1).expand(-1, 1, dimensions)).view(batch_size, dimensions)
+        norm = norms.gather(1, target_classes.view(-1, 1))
+
+        # Samples beyond the boundary are not moved back.
+        steps = direction*torch.clamp(self.overshoot - margin, min=0)/norm
+        step_norms = torch.norm(steps, 2, 1)
+        scale = torch.clamp(self.radius/torch.clamp(step_norms, min=1e-12), max=1)
+        steps.mul_(scale.view(-1, 1))
+
+        self.previous_margins = margin.view(-1)
+        self.predicted_margins = self.previous_margins + torch.sum(direction*steps, 1)
+        self.target_classes = target_classes
+
+        self.perturbations.data.add_(steps.view(self.perturbations.size()))
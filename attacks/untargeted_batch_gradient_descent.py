@@ -67,6 +67,24 @@ class UntargetedBatchGradientDescent(UntargetedAttack):
         self.skip = 5
         """ (int) Verbosity skip. """
 
+        self.full_perturbations = None
+        """ (torch.Tensor) Perturbations of the original batch while the working batch is compacted. """
+
+        self.minimal = False
+        """ (bool) Minimal mode, i.e., keep track of the smallest successful perturbations. """
+
+        self.minimal_ords = [1, 2, float('inf')]
+        """ ([float]) Norms for which the smallest successful perturbations are tracked. """
+
+        self.ord = None
+        """ (float) Norm of the attack, set by child classes. """
+
+        self.minimal_norms = None
+        """ (torch.Tensor or numpy.ndarray) Norms of smallest successful perturbations (infinity if not successful), per norm. """
+
+        self.minimal_perturbations = None
+        """ ([torch.Tensor] or [numpy.ndarray]) Smallest successful perturbations, per norm. """
+
         assert self.max_iterations > 0
         assert self.base_lr > 0
         assert self.lr_decay > 0
@@ -132,6 +150,57 @@ class UntargetedBatchGradientDescent(UntargetedAttack):
 
         self.max_iterations = max_iterations
 
+    def set_minimal(self, minimal=True):
+        """
+        Set minimal mode; in minimal mode, the attack is run for all iterations and the smallest successful
+        perturbation in L_1, L_2 and L_inf norm is tracked for each sample, see minimal_norms and
+        minimal_perturbations. This allows to compute success rates for arbitrary epsilons from one run.
+
+        :param minimal: minimal mode
+        :type minimal: bool
+        """
+
+        self.minimal = minimal
+
+    def initialize_minimal(self, size):
+        """
+        Initialize book-keeping for minimal mode.
+
+        :param size: size of the (full) perturbations
+        :type size: torch.Size
+        """
+
+        device = self.images.device
+        self.minimal_norms = torch.ones((size[0], len(self.minimal_ords)), dtype=torch.float32, device=device)*float('inf')
+        self.minimal_perturbations = [torch.zeros(size, dtype=torch.float32, device=device) for _ in self.minimal_ords]
+
+    def update_minimal(self, perturbations, mask):
+        """
+        Update the smallest successful perturbations in minimal mode.
+
+        :param perturbations: current perturbations of the working batch
+        :type perturbations: torch.Tensor
+        :param mask: samples of the working batch that are currently successful
+        :type mask: torch.Tensor
+        """
+
+        flat_perturbations = perturbations.view(perturbations.size(0), -1)
+        for n in range(len(self.minimal_ords)):
+            norms = torch.norm(flat_perturbations, self.minimal_ords[n], 1)
+            minimal_norms = self.minimal_norms[:, n]
+            update = mask & (norms < minimal_norms.index_select(0, self.indices))
+
+            self.scatter(minimal_norms, update, norms)
+            self.scatter(self.minimal_perturbations[n], update, perturbations)
+
+    def finalize_minimal(self):
+        """
+        Transfer the results of minimal mode to the host.
+        """
+
+        self.minimal_norms = self.minimal_norms.cpu().numpy()
+        self.minimal_perturbations = [minimal_perturbations.cpu().numpy() for minimal_perturbations in self.minimal_perturbations]
+
     def initialize(self):
         """
         Initialize the attack.
@@ -155,6 +224,20 @@ class UntargetedBatchGradientDescent(UntargetedAttack):
         self.perturbations = torch.from_numpy(random.astype(numpy.float32))
         self.perturbations = torch.autograd.Variable(self.perturbations, requires_grad=True)
 
+    def initialize_perturbations(self, perturbations):
+        """
+        Initialize the attack from given perturbations, e.g., perturbations found on a related model or for a smaller epsilon.
+
+        :param perturbations: perturbations to start from
+        :type perturbations: numpy.ndarray or torch.Tensor
+        """
+
+        if isinstance(perturbations, numpy.ndarray):
+            perturbations = torch.from_numpy(perturbations.astype(numpy.float32))
+        assert perturbations.size() == self.images.size(), 'perturbations of size %s do not match images of size %s' % (str(perturbations.size()), str(self.images.size()))
+
+        self.perturbations = torch.autograd.Variable(perturbations.float().cpu(), requires_grad=True)
+
     def initialize_optimizer(self):
         """
         Initalize optimizer and parameters to optimize.
@@ -185,11 +268,18 @@ class UntargetedBatchGradientDescent(UntargetedAttack):
         # Will hold the individually best results (however, optimization
         # is run for all samples until all are successful or the maximum number
         # of iterations is reached.
-        success = numpy.ones((self.perturbations.size()[0]), dtype=numpy.int32)*-1
-        success_error = numpy.zeros((self.perturbations.size()[0]), dtype=numpy.float32)
-        success_perturbations = numpy.zeros(self.perturbations.size(), dtype=numpy.float32)
-        success_probabilities = numpy.zeros((self.perturbations.size()[0], self.logits.size()[1]), dtype=numpy.float32)
-        success_norms = numpy.zeros((self.perturbations.size()[0]), dtype=numpy.float32)
+        # All book-keeping is done on the device of the perturbations using masked updates;
+        # the results are only transferred to the host once after the main loop.
+        device = self.perturbations.device
+        success = torch.ones((self.perturbations.size()[0]), dtype=torch.int32, device=device)*-1
+        success_error = torch.zeros((self.perturbations.size()[0]), dtype=torch.float32, device=device)
+        success_perturbations = torch.zeros(self.perturbations.size(), dtype=torch.float32, device=device)
+        success_probabilities = torch.zeros((self.perturbations.size()[0], self.logits.size()[1]), dtype=torch.float32, device=device)
+        success_norms = torch.zeros((self.perturbations.size()[0]), dtype=torch.float32, device=device)
+
+        self.initialize_indices()
+        if self.minimal:
+            self.initialize_minimal(self.perturbations.size())
 
         i = 0
         gradient = 0
@@ -236,48 +326,50 @@ class UntargetedBatchGradientDescent(UntargetedAttack):
             check_norm = self.norm() # Will be a vector of individual norms.
             batch_size = self.images.size()[0]
 
-            for b in range(self.perturbations.size()[0]):
-                # We explicitly do not check the norm here.
-                # This allows to evaluate both success and average distance separately.
-                if self.training_mode:
-                    if error[b].item() < success_error[b] or success[b] < 0:
-                        if other_classes.data[b] != self.classes.data[b] and success[b] < 0:
-                            success[b] = i
-                        success_error[b] = error[b].data.cpu()
-                        success_perturbations[b] = numpy.copy(self.perturbations[b].data.cpu().numpy())
-                        success_probabilities[b] = output_probabilities[b].data.cpu()
-                        success_norms[b] = check_norm[b].data.cpu()
-                else:
-                    if other_classes.data[b] != self.classes.data[b] and success[b] < 0: # and check_norm.data[b] <= self.epsilon
-                        success[b] = i
-                        success_error[b] = error[b].data.cpu()
-                        success_perturbations[b] = numpy.copy(self.perturbations[b].data.cpu().numpy())
-                        success_probabilities[b] = output_probabilities[b].data.cpu()
-                        success_norms[b] = check_norm[b].data.cpu()
-
-            self.history.append({
-                'iteration': i,
-                'class': other_classes.cpu().numpy(),
-                'error': error.detach().cpu().numpy(),
-                'probabilities': output_probabilities.detach().cpu().numpy(),
-                'norms': check_norm.detach().cpu().numpy()
+            # We explicitly do not check the norm here.
+            # This allows to evaluate both success and average distance separately.
+            # Results are scattered back to the original batch using the indices of the working batch,
+            # using torch.where instead of boolean mask indexing to avoid synchronizing with the host.
+            other_success = (other_classes.data != self.classes.data) & (success[self.indices] < 0)
+            if self.training_mode:
+                update = (error.data < success_error[self.indices]) | (success[self.indices] < 0)
+            else:
+                update = other_success # & (check_norm.data <= self.epsilon)
+
+            self.scatter(success, other_success, i)
+            self.scatter(success_error, update, error.data)
+            self.scatter(success_perturbations, update, self.perturbations.data)
+            self.scatter(success_probabilities, update, output_probabilities.data)
+            self.scatter(success_norms, update, check_norm.data)
+
+            if self.minimal:
+                self.update_minimal(self.perturbations.data, other_classes.data != self.classes.data)
+
+            self.record(i, {
+                'indices': self.indices,
+                'class': other_classes,
+                'success': (success >= 0).float(),
+                'error': error,
+                'probabilities': output_probabilities,
+                'norms': check_norm
             })
 
             common.torch.set_optimizer_parameter(self.optimizer, 'lr', self.base_lr * (self.lr_decay ** (1 + i / 100)))
             if verbose and i % self.skip == 0:
-                log('[%s] %d: lr=%g objective=%g norm=%g bound=%g success=%g gradient=%g' % (self.__class__.__name__, i, self.base_lr * (self.lr_decay ** (1 + i / 100)), torch.sum(objective).data/batch_size, torch.sum(norm).data/batch_size, torch.sum(bound).data/batch_size, numpy.sum(success >= 0), gradient))
+                log('[%s] %d: lr=%g objective=%g norm=%g bound=%g success=%g gradient=%g' % (self.__class__.__name__, i, self.base_lr * (self.lr_decay ** (1 + i / 100)), torch.sum(objective).data/batch_size, torch.sum(norm).data/batch_size, torch.sum(bound).data/batch_size, torch.sum(success >= 0).item(), gradient))
 
             # 5/
             # Break condition.
-            if numpy.all(success >= 0) and not self.training_mode:
+            # This is the only synchronization with the host within an iteration.
+            if not self.training_mode and not self.minimal and torch.sum(success < 0).item() == 0:
                 if verbose:
-                    log('[%s] %d: objective=%g norm=%g bound=%g success=%g gradient=%g' % (self.__class__.__name__, i, torch.sum(objective).data/batch_size, torch.sum(norm).data/batch_size, torch.sum(bound).data/batch_size, numpy.sum(success >= 0), gradient))
+                    log('[%s] %d: objective=%g norm=%g bound=%g success=%g gradient=%g' % (self.__class__.__name__, i, torch.sum(objective).data/batch_size, torch.sum(norm).data/batch_size, torch.sum(bound).data/batch_size, torch.sum(success >= 0).item(), gradient))
                 break
 
             # Quick hack for handling the last iteration correctly.
             if i == self.max_iterations:
                 if verbose:
-                    log('[%s] %d: objective=%g norm=%g bound=%g success=%g gradient=%g' % (self.__class__.__name__, i, torch.sum(objective).data/batch_size, torch.sum(norm).data/batch_size, torch.sum(bound).data/batch_size, numpy.sum(success >= 0), gradient))
+                    log('[%s] %d: objective=%g norm=%g bound=%g success=%g gradient=%g' % (self.__class__.__name__, i, torch.sum(objective).data/batch_size, torch.sum(norm).data/batch_size, torch.sum(bound).data/batch_size, torch.sum(success >= 0).item(), gradient))
                 break
 
             # 6/
@@ -289,14 +381,73 @@ class UntargetedBatchGradientDescent(UntargetedAttack):
             if verbose:
                 gradient = torch.mean(torch.abs(self.perturbations.grad))
 
-        for b in range(self.perturbations.size()[0]):
-            # In any case, we return the current perturbations for non-successful attacks.
-            if success[b] < 0:
-                success_perturbations[b] = numpy.copy(self.perturbations[b].data.cpu().numpy())
-                success_probabilities[b] = output_probabilities[b].data.cpu()
-                success_norms[b] = check_norm[b].data.cpu()
+            # 7/
+            # Remove samples that succeeded from the working batch.
+            if self.compaction and not self.training_mode and not self.minimal:
+                keep = torch.nonzero(success[self.indices] < 0).view(-1)
+                if keep.size(0) < self.indices.size(0):
+                    self.compact(keep)
+
+        # In any case, we return the current perturbations for non-successful attacks.
+        fail = success[self.indices] < 0
+        self.scatter(success_perturbations, fail, self.perturbations.data)
+        self.scatter(success_probabilities, fail, output_probabilities.data)
+        self.scatter(success_norms, fail, check_norm.data)
+        self.expand()
+
+        if self.minimal:
+            self.finalize_minimal()
+
+        return success.cpu().numpy(), success_perturbations.cpu().numpy(), success_probabilities.cpu().numpy(), success_norms.cpu().numpy(), i
+
+    def compact_optimizer(self, parameter, keep):
+        """
+        Create a new optimizer for the compacted parameter, keeping the optimizer state of the remaining samples.
+
+        :param parameter: compacted parameter
+        :type parameter: torch.nn.Parameter
+        :param keep: indices of samples to keep, relative to the current working batch
+        :type keep: torch.LongTensor
+        """
+
+        lr = self.optimizer.param_groups[0]['lr']
+        states = [state for state in self.optimizer.state.values()]
+        self.optimizer = torch.optim.Adam([parameter], lr=lr)
+
+        if len(states) > 0:
+            for key, value in states[0].items():
+                if isinstance(value, torch.Tensor) and value.dim() > 0:
+                    value = value.index_select(0, keep)
+                self.optimizer.state[parameter][key] = value
+
+    def compact(self, keep):
+        """
+        Reduce the working batch to the given samples.
+
+        :param keep: indices of samples to keep, relative to the current working batch
+        :type keep: torch.LongTensor
+        """
+
+        if self.full_perturbations is None:
+            self.full_perturbations = self.perturbations.data.clone()
+        self.full_perturbations[self.indices] = self.perturbations.data
+
+        super(UntargetedBatchGradientDescent, self).compact(keep)
+
+        self.perturbations = torch.nn.Parameter(self.perturbations.data.index_select(0, keep))
+        self.compact_optimizer(self.perturbations, keep)
+
+    def expand(self):
+        """
+        Restore the original batch after compaction.
+        """
+
+        if self.full_perturbations is not None:
+            self.full_perturbations[self.indices] = self.perturbations.data
+            self.perturbations = torch.nn.Parameter(self.full_perturbations)
+            self.full_perturbations = None
 
-        return success, success_perturbations, success_probabilities, success_norms, i
+        super(UntargetedBatchGradientDescent, self).expand()
 
     def project(self):
         """
@@ -0,0 +1,38 @@
+from .untargeted_batch_fused_gradient_method import *
+
+
+class UntargetedBatchL1FusedGradientMethod(UntargetedBatchFusedGradientMethod):
+    """
+    Implementation of untargeted L_1 PGD attack with fused, in-place update steps; in each iteration, only the top-k
+    coordinates of the gradient are updated and the perturbation is projected exactly onto the L_1 ball.
+
+    Also see [Tramer and Boneh, Adversarial Training and Robustness for Multiple Perturbations, NeurIPS 2019].
+    """
+
+    def __init__(self, model, images, classes=None, epsilon=0.5, base_lr=0.5, max_iterations=500, sparsity=0.01):
+        """
+        Constructor.
+
+        :param model: model to attack
+        :type model: torch.nn.Module
+        :param images: image(s) to attack
+        :type images: torch.autograd.Variable
+        :param classes: true classes, if None, they will be deduced to avoid label leaking
+        :type classes: torch.autograd.Variable
+        :param epsilon: maximum strength of attack
+        :type epsilon: float
+        :param base_lr: learning rate
+        :type base_lr: float
+        :param max_iterations: maximum number of iterations
+        :type max_iterations: int
+        :param sparsity: fraction of coordinates updated per step
+        :type sparsity: float
+        """
+
+        super(UntargetedBatchL1FusedGradientMethod, self).__init__(model, images, classes, epsilon, base_lr, max_iterations)
+
+        self.ord = 1
+        """ (float) Norm of the attack. """
+
+        self.sparsity = sparsity
+        """ (float) Fraction of coordinates updated per step. """
@@ -31,6 +31,9 @@ class UntargetedBatchL1GradientDescent(UntargetedBatchGradientDescent):
 
         super(UntargetedBatchL1GradientDescent, self).__init__(model, images, classes, epsilon, c_1, c_2, base_lr)
 
+        self.ord = 1
+        """ (float) Norm of the attack. """
+
         self.EPS = 1e-6
         """ (float) For approximating the L1 norm. """
 
@@ -27,6 +27,9 @@ class UntargetedBatchL1ReparameterizedGradientDescent(UntargetedBatchReparameter
 
         super(UntargetedBatchL1ReparameterizedGradientDescent, self).__init__(model, images, classes, epsilon, c, base_lr)
 
+        self.ord = 1
+        """ (float) Norm of the attack. """
+
         self.EPS = 1e-6
         """ (float) For approximating the L1 norm. """
 
@@ -0,0 +1,28 @@
+from .untargeted_batch_adaptive_gradient_method import *
+
+
+class UntargetedBatchL2AdaptiveGradientMethod(UntargetedBatchAdaptiveGradientMethod):
+    """
+    Implementation of untargeted L_2 auto PGD attack.
+    """
+
+    def __init__(self, model, images, classes=None, epsilon=0.5, max_iterations=100):
+        """
+        Constructor.
+
+        :param model: model to attack
+        :type model: torch.nn.Module
+        :param images: image(s) to attack
+        :type images: torch.autograd.Variable
+        :param classes: true classes, if None, they will be deduced to avoid label leaking
+        :type classes: torch.autograd.Variable
+        :param epsilon: maximum strength of attack
+        :type epsilon: float
+        :param max_iterations: maximum number of iterations
+        :type max_iterations: int
+        """
+
+        super(UntargetedBatchL2AdaptiveGradientMethod, self).__init__(model, images, classes, epsilon, max_iterations)
+
+        self.ord = 2
+        """ (float) Norm of the attack. """
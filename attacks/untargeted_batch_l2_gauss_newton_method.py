@@ -0,0 +1,30 @@
+from .untargeted_batch_gauss_newton_method import *
+
+
+class UntargetedBatchL2GaussNewtonMethod(UntargetedBatchGaussNewtonMethod):
+    """
+    Implementation of untargeted L_2 Gauss-Newton attack for low-dimensional inputs.
+    """
+
+    def __init__(self, model, images, classes=None, epsilon=0.5, base_lr=None, max_iterations=10):
+        """
+        Constructor.
+
+        :param model: model to attack
+        :type model: torch.nn.Module
+        :param images: latent codes (or images) to attack
+        :type images: torch.autograd.Variable
+        :param classes: true classes, if None, they will be deduced to avoid label leaking
+        :type classes: torch.autograd.Variable
+        :param epsilon: maximum strength of attack
+        :type epsilon: float
+        :param base_lr: initial trust region radius
+        :type base_lr: float
+        :param max_iterations: maximum number of iterations
+        :type max_iterations: int
+        """
+
+        super(UntargetedBatchL2GaussNewtonMethod, self).__init__(model, images, classes, epsilon, base_lr, max_iterations)
+
+        self.ord = 2
+        """ (float) Norm of the attack. """
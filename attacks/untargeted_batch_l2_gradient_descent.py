@@ -29,6 +29,9 @@ class UntargetedBatchL2GradientDescent(UntargetedBatchGradientDescent):
 
         super(UntargetedBatchL2GradientDescent, self).__init__(model, images, classes, epsilon, c_1, c_2, base_lr)
 
+        self.ord = 2
+        """ (float) Norm of the attack. """
+
     def initialize_random(self):
         """
         Initialize the attack.
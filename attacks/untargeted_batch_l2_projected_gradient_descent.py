@@ -60,10 +60,9 @@ class UntargetedBatchL2ProjectedGradientDescent(UntargetedBatchL2GradientDescent
         Project the perturbation.
         """
 
-        # We do alternating projection if the auto encoder projection is set.
+        # We assume that the auto encoder projection already takes care of clipping the
+        # output to a valid range!
         if self.auto_encoder is not None:
-            for j in range(self.max_projections):
-                self.perturbations.data = common.torch.project(self.perturbations.data, self.epsilon)
-                self.perturbations.data = self.project_auto_encoder(self.perturbations.data)
+            self.perturbations.data = self.project_alternating(self.perturbations.data, self.epsilon, 2, self.max_projections)
         else:
-            self.perturbations.data = common.torch.project(self.perturbations.data, self.epsilon)
\ No newline at end of file
+            self.perturbations.data = common.torch.project(self.perturbations.data, self.epsilon)
@@ -27,6 +27,9 @@ class UntargetedBatchL2ReparameterizedGradientDescent(UntargetedBatchReparameter
 
         super(UntargetedBatchL2ReparameterizedGradientDescent, self).__init__(model, images, classes, epsilon, c, base_lr)
 
+        self.ord = 2
+        """ (float) Norm of the attack. """
+
     def initialize_random(self):
         """
         Initialize the attack.
@@ -0,0 +1,30 @@
+from .untargeted_batch_fused_gradient_method import *
+
+
+class UntargetedBatchLInfFusedGradientMethod(UntargetedBatchFusedGradientMethod):
+    """
+    Implementation of untargeted L_inf PGD attack with fused, in-place update steps.
+    """
+
+    def __init__(self, model, images, classes=None, epsilon=0.5, base_lr=0.01, max_iterations=500):
+        """
+        Constructor.
+
+        :param model: model to attack
+        :type model: torch.nn.Module
+        :param images: image(s) to attack
+        :type images: torch.autograd.Variable
+        :param classes: true classes, if None, they will be deduced to avoid label leaking
+        :type classes: torch.autograd.Variable
+        :param epsilon: maximum strength of attack
+        :type epsilon: float
+        :param base_lr: learning rate
+        :type base_lr: float
+        :param max_iterations: maximum number of iterations
+        :type max_iterations: int
+        """
+
+        super(UntargetedBatchLInfFusedGradientMethod, self).__init__(model, images, classes, epsilon, base_lr, max_iterations)
+
+        self.ord = float('inf')
+        """ (float) Norm of the attack. """
@@ -29,6 +29,9 @@ class UntargetedBatchLInfGradientDescent(UntargetedBatchGradientDescent):
 
         super(UntargetedBatchLInfGradientDescent, self).__init__(model, images, classes, epsilon, c_1, c_2, base_lr)
 
+        self.ord = float('inf')
+        """ (float) Norm of the attack. """
+
         self.tau = 0.5
         """ (float) Used to approximate L_infinity norm as objective. """
 
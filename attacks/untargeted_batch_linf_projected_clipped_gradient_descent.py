@@ -73,17 +73,13 @@ class UntargetedBatchLInfProjectedClippedGradientDescent(UntargetedBatchLInfGrad
         Project the perturbation.
         """
 
-        for j in range(self.max_projections):
-            # We assume that the auto encoder projection already takes care of clipping the
-            # output to a valid range!
-            # Also note that the order of projections is relevant!
-            if self.auto_encoder is not None:
-                self.perturbations.data = common.torch.project(self.perturbations.data, self.epsilon, float('inf'))
-                self.perturbations.data = self.project_auto_encoder(self.perturbations.data)
-            else:
-                if self.max_bound is not None:
-                    self.perturbations.data = torch.min(self.max_bound - self.images.data, self.perturbations.data)
-                if self.min_bound is not None:
-                    self.perturbations.data = torch.max(self.min_bound - self.images.data, self.perturbations.data)
-                self.perturbations.data = common.torch.project(self.perturbations.data, self.epsilon, float('inf'))
-
+        # We assume that the auto encoder projection already takes care of clipping the
+        # output to a valid range!
+        if self.auto_encoder is not None:
+            self.perturbations.data = self.project_alternating(self.perturbations.data, self.epsilon, float('inf'), self.max_projections)
+        else:
+            if self.max_bound is not None:
+                self.perturbations.data = torch.min(self.max_bound - self.images.data, self.perturbations.data)
+            if self.min_bound is not None:
+                self.perturbations.data = torch.max(self.min_bound - self.images.data, self.perturbations.data)
+            self.perturbations.data = common.torch.project(self.perturbations.data, self.epsilon, float('inf'))
@@ -28,6 +28,9 @@ class UntargetedBatchLInfReparameterizedGradientDescent(UntargetedBatchReparamet
 
         super(UntargetedBatchLInfReparameterizedGradientDescent, self).__init__(model, images, classes, epsilon, c, base_lr)
 
+        self.ord = float('inf')
+        """ (float) Norm of the attack. """
+
         self.EPS = 1e-6
         """ (float) For approximating the L1 norm. """
 
@@ -57,8 +57,8 @@ class UntargetedBatchNormalizedGradientMethod(UntargetedAttack):
         self.skip = 5
         """ (int) Verbosity skip. """
 
-        self.history = []
-        """ ([dict] History. """
+        self.full_perturbations = None
+        """ (torch.Tensor) Perturbations of the original batch while the working batch is compacted. """
 
         if base_lr is not None:
             self.base_lr = base_lr
@@ -134,6 +134,23 @@ class UntargetedBatchNormalizedGradientMethod(UntargetedAttack):
             self.perturbations = self.perturbations.cuda()
         self.perturbations = torch.autograd.Variable(self.perturbations, requires_grad=True)
 
+    def initialize_perturbations(self, perturbations):
+        """
+        Initialize the attack from given perturbations, e.g., perturbations found on a related model or for a smaller epsilon.
+
+        :param perturbations: perturbations to start from
+        :type perturbations: numpy.ndarray or torch.Tensor
+        """
+
+        if isinstance(perturbations, numpy.ndarray):
+            perturbations = torch.from_numpy(perturbations.astype(numpy.float32))
+        assert perturbations.size() == self.images.size(), 'perturbations of size %s do not match images of size %s' % (str(perturbations.size()), str(self.images.size()))
+
+        self.perturbations = perturbations.float()
+        if cuda.is_cuda(self.model):
+            self.perturbations = self.perturbations.cuda()
+        self.perturbations = torch.autograd.Variable(self.perturbations, requires_grad=True)
+
     def run(self, untargeted_objective, verbose=True):
         """
         Run the attack.
@@ -159,11 +176,16 @@ class UntargetedBatchNormalizedGradientMethod(UntargetedAttack):
         # Will hold the individually best results (however, optimization
         # is run for all samples until all are successful or the maximum number
         # of iterations is reached.
-        success = numpy.ones((self.perturbations.size()[0]), dtype=numpy.int32)*-1
-        success_error = numpy.zeros((self.perturbations.size()[0]), dtype=numpy.float32)
-        success_perturbations = numpy.zeros(self.perturbations.size(), dtype=numpy.float32)
-        success_probabilities = numpy.zeros((self.perturbations.size()[0], self.logits.size()[1]), dtype=numpy.float32)
-        success_norms = numpy.zeros((self.perturbations.size()[0]), dtype=numpy.float32)
+        # All book-keeping is done on the device of the perturbations using masked updates;
+        # the results are only transferred to the host once after the main loop.
+        device = self.perturbations.device
+        success = torch.ones((self.perturbations.size()[0]), dtype=torch.int32, device=device)*-1
+        success_error = torch.zeros((self.perturbations.size()[0]), dtype=torch.float32, device=device)
+        success_perturbations = torch.zeros(self.perturbations.size(), dtype=torch.float32, device=device)
+        success_probabilities = torch.zeros((self.perturbations.size()[0], self.logits.size()[1]), dtype=torch.float32, device=device)
+        success_norms = torch.zeros((self.perturbations.size()[0]), dtype=torch.float32, device=device)
+
+        self.initialize_indices()
 
         i = 0
         gradient = 0
@@ -200,47 +222,46 @@ class UntargetedBatchNormalizedGradientMethod(UntargetedAttack):
             check_norm = self.norm()
             batch_size = self.images.size()[0]
 
-            for b in range(self.perturbations.size()[0]):
-                # We explicitly do not check the norm here.
-                # This allows to evaluate both success and average distance separately.
-                if self.training_mode:
-                    if error[b].item() < success_error[b] or success[b] < 0:
-                        if other_classes.data[b] != self.classes.data[b] and success[b] < 0:
-                            success[b] = i
-                        success_error[b] = error[b].data.cpu()
-                        success_perturbations[b] = numpy.copy(self.perturbations[b].data.cpu().numpy())
-                        success_probabilities[b] = output_probabilities[b].data.cpu()
-                        success_norms[b] = check_norm[b].data.cpu()
-                else:
-                    if other_classes.data[b] != self.classes.data[b] and success[b] < 0: # and check_norm.data[b] <= self.epsilon
-                        success[b] = i
-                        success_error[b] = error[b].data.cpu()
-                        success_perturbations[b] = numpy.copy(self.perturbations[b].data.cpu().numpy())
-                        success_probabilities[b] = output_probabilities[b].data.cpu()
-                        success_norms[b] = check_norm[b].data.cpu()
-
-            self.history.append({
-                'iteration': i,
-                'class': other_classes.cpu().numpy(),
-                'error': error.detach().cpu().numpy(),
-                'probabilities': output_probabilities.detach().cpu().numpy(),
-                'norms': check_norm.detach().cpu().numpy()
+            # We explicitly do not check the norm here.
+            # This allows to evaluate both success and average distance separately.
+            # Results are scattered back to the original batch using the indices of the working batch,
+            # using torch.where instead of boolean mask indexing to avoid synchronizing with the host.
+            other_success = (other_classes.data != self.classes.data) & (success[self.indices] < 0)
+            if self.training_mode:
+                update = (error.data < success_error[self.indices]) | (success[self.indices] < 0)
+            else:
+                update = other_success # & (check_norm.data <= self.epsilon)
+
+            self.scatter(success, other_success, i)
+            self.scatter(success_error, update, error.data)
+            self.scatter(success_perturbations, update, self.perturbations.data)
+            self.scatter(success_probabilities, update, output_probabilities.data)
+            self.scatter(success_norms, update, check_norm.data)
+
+            self.record(i, {
+                'indices': self.indices,
+                'class': other_classes,
+                'success': (success >= 0).float(),
+                'error': error,
+                'probabilities': output_probabilities,
+                'norms': check_norm
             })
 
             if verbose and i % self.skip == 0:
-                log('[%s] %d: objective=%g success=%g gradient=%g' % (self.__class__.__name__, i, torch.sum(error.data)/batch_size, numpy.sum(success >= 0), gradient))
+                log('[%s] %d: objective=%g success=%g gradient=%g' % (self.__class__.__name__, i, torch.sum(error.data)/batch_size, torch.sum(success >= 0).item(), gradient))
 
             # 5/
             # Break condition.
-            if numpy.all(success >= 0) and not self.training_mode:
+            # This is the only synchronization with the host within an iteration.
+            if not self.training_mode and torch.sum(success < 0).item() == 0:
                 if verbose:
-                    log('[%s] %d: objective=%g success=%g gradient=%g' % (self.__class__.__name__, i, torch.sum(error.data)/batch_size, numpy.sum(success >= 0), gradient))
+                    log('[%s] %d: objective=%g success=%g gradient=%g' % (self.__class__.__name__, i, torch.sum(error.data)/batch_size, torch.sum(success >= 0).item(), gradient))
                 break
 
             # Quick hack for handling the last iteration correctly.
             if i == self.max_iterations:
                 if verbose:
-                    log('[%s] %d: objective=%g success=%g gradient=%g' % (self.__class__.__name__, i, torch.sum(error.data)/batch_size, numpy.sum(success >= 0), gradient))
+                    log('[%s] %d: objective=%g success=%g gradient=%g' % (self.__class__.__name__, i, torch.sum(error.data)/batch_size, torch.sum(success >= 0).item(), gradient))
                 break
 
             # 6/
@@ -260,14 +281,54 @@ class UntargetedBatchNormalizedGradientMethod(UntargetedAttack):
             if verbose:
                 gradient = torch.mean(torch.abs(self.perturbations.grad))
 
-        for b in range(self.perturbations.size()[0]):
-            # In any case, we return the current perturbations for non-successful attacks.
-            if success[b] < 0:
-                success_perturbations[b] = numpy.copy(self.perturbations[b].data.cpu().numpy())
-                success_probabilities[b] = output_probabilities[b].data.cpu()
-                success_norms[b] = check_norm[b].data.cpu()
+            # 9/
+            # Remove samples that succeeded from the working batch.
+            if self.compaction and not self.training_mode:
+                keep = torch.nonzero(success[self.indices] < 0).view(-1)
+                if keep.size(0) < self.indices.size(0):
+                    self.compact(keep)
+
+        # In any case, we return the current perturbations for non-successful attacks.
+        fail = success[self.indices] < 0
+        self.scatter(success_perturbations, fail, self.perturbations.data)
+        self.scatter(success_probabilities, fail, output_probabilities.data)
+        self.scatter(success_norms, fail, check_norm.data)
+        self.expand()
+
+        return success.cpu().numpy(), success_perturbations.cpu().numpy(), success_probabilities.cpu().numpy(), success_norms.cpu().numpy(), i
+
+    def compact(self, keep):
+        """
+        Reduce the working batch to the given samples.
+
+        :param keep: indices of samples to keep, relative to the current working batch
+        :type keep: torch.LongTensor
+        """
+
+        if self.full_perturbations is None:
+            self.full_perturbations = self.perturbations.data.clone()
+        self.full_perturbations[self.indices] = self.perturbations.data
+
+        super(UntargetedBatchNormalizedGradientMethod, self).compact(keep)
+
+        # The gradients are carried over as they are accumulated across iterations.
+        gradients = self.perturbations.grad
+        self.perturbations = torch.autograd.Variable(self.perturbations.data.index_select(0, keep), requires_grad=True)
+        if gradients is not None:
+            self.perturbations.grad = gradients.index_select(0, keep)
+        self.gradients = self.gradients.index_select(0, keep)
+
+    def expand(self):
+        """
+        Restore the original batch after compaction.
+        """
+
+        if self.full_perturbations is not None:
+            self.full_perturbations[self.indices] = self.perturbations.data
+            self.perturbations = torch.autograd.Variable(self.full_perturbations, requires_grad=True)
+            self.full_perturbations = None
 
-        return success, success_perturbations, success_probabilities, success_norms, i
+        super(UntargetedBatchNormalizedGradientMethod, self).expand()
 
     def project(self):
         """
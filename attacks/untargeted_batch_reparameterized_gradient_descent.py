@@ -41,6 +41,9 @@ class UntargetedBatchReparameterizedGradientDescent(UntargetedBatchGradientDesce
         self.EPS = 1e-5
         """ (float) For robustness of tanh / arctanh. """
 
+        self.full_w = None
+        """ (torch.Tensor) Reparameterized variables of the original batch while the working batch is compacted. """
+
     def set_auto_encoder(self, auto_encoder):
         """
         Not possible for the reparaetermization.
@@ -83,6 +86,38 @@ class UntargetedBatchReparameterizedGradientDescent(UntargetedBatchGradientDesce
         else:
             self.w = torch.autograd.Variable(self.w, requires_grad=True)
 
+    def initialize_perturbations(self, perturbations):
+        """
+        Initialize the attack from given perturbations, e.g., perturbations found on a related model or for a smaller epsilon.
+
+        :param perturbations: perturbations to start from
+        :type perturbations: numpy.ndarray or torch.Tensor
+        """
+
+        if isinstance(perturbations, numpy.ndarray):
+            perturbations = torch.from_numpy(perturbations.astype(numpy.float32))
+        assert perturbations.size() == self.images.size(), 'perturbations of size %s do not match images of size %s' % (str(perturbations.size()), str(self.images.size()))
+
+        assert self.min_bound is not None, 'reparameterization only works with valid upper and lower bounds'
+        assert self.max_bound is not None, 'reparameterization only works with valid upper and lower bounds'
+
+        # The perturbed images need to lie strictly within the bounds for the inverse of the reparameterization.
+        min_bound = self.min_bound.cpu().numpy()
+        max_bound = self.max_bound.cpu().numpy()
+        images = numpy.clip(self.images.data.cpu().numpy() + perturbations.cpu().numpy(), min_bound, max_bound)
+
+        self.w = numpy.arctanh(
+            (2-self.EPS)
+            * (images - min_bound)
+                / (max_bound - min_bound)
+            - 1 + self.EPS).astype(numpy.float32)
+        self.w = torch.from_numpy(self.w)
+
+        if cuda.is_cuda(self.model):
+            self.w = torch.autograd.Variable(self.w.cuda(), requires_grad=True)
+        else:
+            self.w = torch.autograd.Variable(self.w, requires_grad=True)
+
     def initialize_optimizer(self):
         """
         Initalize optimizer and parameters to optimize.
@@ -95,6 +130,35 @@ class UntargetedBatchReparameterizedGradientDescent(UntargetedBatchGradientDesce
         self.w = torch.nn.Parameter(self.w.data)
         self.optimizer = torch.optim.Adam([self.w], lr=self.base_lr)
 
+    def compact(self, keep):
+        """
+        Reduce the working batch to the given samples.
+
+        :param keep: indices of samples to keep, relative to the current working batch
+        :type keep: torch.LongTensor
+        """
+
+        if self.full_w is None:
+            self.full_w = self.w.data.clone()
+        self.full_w[self.indices] = self.w.data
+
+        UntargetedAttack.compact(self, keep)
+
+        self.w = torch.nn.Parameter(self.w.data.index_select(0, keep))
+        self.compact_optimizer(self.w, keep)
+
+    def expand(self):
+        """
+        Restore the original batch after compaction.
+        """
+
+        if self.full_w is not None:
+            self.full_w[self.indices] = self.w.data
+            self.w = torch.nn.Parameter(self.full_w)
+            self.full_w = None
+
+        UntargetedAttack.expand(self)
+
     def project(self):
         """
         Reparameterization.
@@ -121,11 +185,18 @@ class UntargetedBatchReparameterizedGradientDescent(UntargetedBatchGradientDesce
         # Will hold the individually best results (however, optimization
         # is run for all samples until all are successful or the maximum number
         # of iterations is reached.
-        success = numpy.ones((self.w.size()[0]), dtype=numpy.int32)*-1
-        success_error = numpy.zeros((self.w.size()[0]), dtype=numpy.float32)
-        success_perturbations = numpy.zeros(self.w.size(), dtype=numpy.float32)
-        success_probabilities = numpy.zeros((self.w.size()[0], self.logits.size()[1]), dtype=numpy.float32)
-        success_norms = numpy.zeros((self.w.size()[0]), dtype=numpy.float32)
+        # All book-keeping is done on the device of the reparameterized variables using masked updates;
+        # the results are only transferred to the host once after the main loop.
+        device = self.w.device
+        success = torch.ones((self.w.size()[0]), dtype=torch.int32, device=device)*-1
+        success_error = torch.zeros((self.w.size()[0]), dtype=torch.float32, device=device)
+        success_perturbations = torch.zeros(self.w.size(), dtype=torch.float32, device=device)
+        success_probabilities = torch.zeros((self.w.size()[0], self.logits.size()[1]), dtype=torch.float32, device=device)
+        success_norms = torch.zeros((self.w.size()[0]), dtype=torch.float32, device=device)
+
+        self.initialize_indices()
+        if self.minimal:
+            self.initialize_minimal(self.w.size())
 
         i = 0
         gradient = 0
@@ -169,49 +240,51 @@ class UntargetedBatchReparameterizedGradientDescent(UntargetedBatchGradientDesce
             check_norm = self.norm() # Will be a vector of individual norms.
             batch_size = self.images.size()[0]
 
-            for b in range(self.perturbations.size()[0]):
-                # We explicitly do not check the norm here.
-                # This allows to evaluate both success and average distance separately.
-                if self.training_mode:
-                    if error[b].item() < success_error[b] or success[b] < 0:
-                        if other_classes.data[b] != self.classes.data[b] and success[b] < 0:
-                            success[b] = i
-                        success_error[b] = error[b].data.cpu()
-                        success_perturbations[b] = numpy.copy(self.perturbations[b].data.cpu().numpy() - self.images[b].data.cpu().numpy())
-                        success_probabilities[b] = output_probabilities[b].data.cpu()
-                        success_norms[b] = check_norm[b].data.cpu()
-                else:
-                    if other_classes.data[b] != self.classes.data[b] and success[b] < 0: # and check_norm.data[b] <= self.epsilon
-                        success[b] = i
-                        success_error[b] = error[b].data.cpu()
-                        success_perturbations[b] = numpy.copy(self.perturbations[b].data.cpu().numpy() - self.images[b].data.cpu().numpy())
-                        success_probabilities[b] = output_probabilities[b].data.cpu()
-                        success_norms[b] = check_norm[b].data.cpu()
-
-            self.history.append({
-                'iteration': i,
-                'class': other_classes.cpu().numpy(),
-                'error': error.detach().cpu().numpy(),
-                'objective': objective.detach().cpu().numpy(),
-                'probabilities': output_probabilities.detach().cpu().numpy(),
-                'norms': check_norm.detach().cpu().numpy()
+            # We explicitly do not check the norm here.
+            # This allows to evaluate both success and average distance separately.
+            # Results are scattered back to the original batch using the indices of the working batch,
+            # using torch.where instead of boolean mask indexing to avoid synchronizing with the host.
+            other_success = (other_classes.data != self.classes.data) & (success[self.indices] < 0)
+            if self.training_mode:
+                update = (error.data < success_error[self.indices]) | (success[self.indices] < 0)
+            else:
+                update = other_success # & (check_norm.data <= self.epsilon)
+
+            self.scatter(success, other_success, i)
+            self.scatter(success_error, update, error.data)
+            self.scatter(success_perturbations, update, self.perturbations.data - self.images.data)
+            self.scatter(success_probabilities, update, output_probabilities.data)
+            self.scatter(success_norms, update, check_norm.data)
+
+            if self.minimal:
+                self.update_minimal(self.perturbations.data - self.images.data, other_classes.data != self.classes.data)
+
+            self.record(i, {
+                'indices': self.indices,
+                'class': other_classes,
+                'success': (success >= 0).float(),
+                'error': error,
+                'objective': objective,
+                'probabilities': output_probabilities,
+                'norms': check_norm
             })
 
             common.torch.set_optimizer_parameter(self.optimizer, 'lr', self.base_lr * (self.lr_decay ** (1 + i / 100)))
             if verbose and i % self.skip == 0:
-                log('[%s] %d: lr=%g objective=%g norm=%g success=%g gradient=%g' % (self.__class__.__name__, i, self.base_lr * (self.lr_decay ** (1 + i / 100)), torch.sum(objective).data/batch_size, torch.sum(norm).data/batch_size, numpy.sum(success >= 0), gradient))
+                log('[%s] %d: lr=%g objective=%g norm=%g success=%g gradient=%g' % (self.__class__.__name__, i, self.base_lr * (self.lr_decay ** (1 + i / 100)), torch.sum(objective).data/batch_size, torch.sum(norm).data/batch_size, torch.sum(success >= 0).item(), gradient))
 
             # 5/
             # Break condition.
-            if numpy.all(success >= 0) and not self.training_mode:
+            # This is the only synchronization with the host within an iteration.
+            if not self.training_mode and not self.minimal and torch.sum(success < 0).item() == 0:
                 if verbose:
-                    log('[%s] %d: objective=%g norm=%g success=%g gradient=%g' % (self.__class__.__name__, i, torch.sum(objective).data/batch_size, torch.sum(norm).data/batch_size, numpy.sum(success >= 0), gradient))
+                    log('[%s] %d: objective=%g norm=%g success=%g gradient=%g' % (self.__class__.__name__, i, torch.sum(objective).data/batch_size, torch.sum(norm).data/batch_size, torch.sum(success >= 0).item(), gradient))
                 break
 
             # Quick hack for handling the last iteration correctly.
             if i == self.max_iterations:
                 if verbose:
-                    log('[%s] %d: objective=%g norm=%g success=%g gradient=%g' % (self.__class__.__name__, i, torch.sum(objective).data/batch_size, torch.sum(norm).data/batch_size, numpy.sum(success >= 0), gradient))
+                    log('[%s] %d: objective=%g norm=%g success=%g gradient=%g' % (self.__class__.__name__, i, torch.sum(objective).data/batch_size, torch.sum(norm).data/batch_size, torch.sum(success >= 0).item(), gradient))
                 break
 
             # 6/
@@ -223,14 +296,24 @@ class UntargetedBatchReparameterizedGradientDescent(UntargetedBatchGradientDesce
             if verbose:
                 gradient = torch.mean(torch.abs(self.w.grad))
 
-        for b in range(self.perturbations.size()[0]):
-            # In any case, we return the current perturbations for non-successful attacks.
-            if success[b] < 0:
-                success_perturbations[b] = numpy.copy(self.perturbations[b].data.cpu().numpy() - self.images[b].data.cpu().numpy())
-                success_probabilities[b] = output_probabilities[b].data.cpu()
-                success_norms[b] = check_norm[b].data.cpu()
+            # 7/
+            # Remove samples that succeeded from the working batch.
+            if self.compaction and not self.training_mode and not self.minimal:
+                keep = torch.nonzero(success[self.indices] < 0).view(-1)
+                if keep.size(0) < self.indices.size(0):
+                    self.compact(keep)
+
+        # In any case, we return the current perturbations for non-successful attacks.
+        fail = success[self.indices] < 0
+        self.scatter(success_perturbations, fail, self.perturbations.data - self.images.data)
+        self.scatter(success_probabilities, fail, output_probabilities.data)
+        self.scatter(success_norms, fail, check_norm.data)
+        self.expand()
+
+        if self.minimal:
+            self.finalize_minimal()
 
-        return success, success_perturbations, success_probabilities, success_norms, i
+        return success.cpu().numpy(), success_perturbations.cpu().numpy(), success_probabilities.cpu().numpy(), success_norms.cpu().numpy(), i
 
     def bound_loss(self):
         """
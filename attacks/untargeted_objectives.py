@@ -1,4 +1,5 @@
 import torch
+import common.torch
 
 
 class UntargetedObjective:
@@ -79,3 +80,45 @@ class UntargetedF6(UntargetedObjective):
         other_logits[torch.arange(0, current_logits.size()[0]).long(), classes.long()] = 0
         difference = current_logits[torch.arange(0, current_logits.size()[0]).long(), classes.long()] - torch.max(other_logits, 1)[0]
         return torch.max(torch.ones_like(difference)*self.kappa, difference)
+
+
+class CompiledObjective(UntargetedObjective):
+    """
+    Compiled version of an untargeted attack objective.
+    """
+
+    def __init__(self, objective, batch_size=None, check=True):
+        """
+        Constructor.
+
+        :param objective: objective to compile
+        :type objective: UntargetedObjective
+        :param batch_size: batch size to pad to
+        :type batch_size: int
+        :param check: check compiled against eager outputs
+        :type check: bool
+        """
+
+        assert isinstance(objective, UntargetedObjective)
+
+        self.objective = objective
+        """ (UntargetedObjective) Wrapped objective. """
+
+        self.compiled = common.torch.CompiledFunction(objective.f, batch_size, check)
+        """ (common.torch.CompiledFunction) Compiled objective. """
+
+    def f(self, current_logits, reference_logits, classes):
+        """
+        Objective function.
+
+        :param current_logits: logit output of the network
+        :type current_logits: torch.autograd.Variable
+        :param reference_logits: "true" logits
+        :type reference_logits: torch.autograd.Variable
+        :param classes: true classes
+        :type classes: torch.autograd.Variable
+        :return: error
+        :rtype: torch.autograd.Variable
+        """
+
+        return self.compiled(current_logits, reference_logits, classes)
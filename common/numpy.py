@@ -200,4 +200,85 @@ def angles(vectors_a, vectors_b):
     term_2 = numpy.linalg.norm(term_2, ord=2, axis=0)
     angles = 2*numpy.arctan2(term_1, term_2)
 
-    return angles
\ No newline at end of file
+    return angles
+
+
+def wilson_interval(successes, trials, confidence=0.95):
+    """
+    Wilson score interval for a binomial proportion.
+
+    :param successes: number of successes
+    :type successes: int
+    :param trials: number of trials
+    :type trials: int
+    :param confidence: confidence level
+    :type confidence: float
+    :return: lower and upper bound
+    :rtype: (float, float)
+    """
+
+    assert trials > 0
+    assert successes >= 0 and successes <= trials
+    assert confidence > 0 and confidence < 1
+
+    z = scipy.stats.norm.ppf(1 - (1 - confidence)/2.)
+    p = successes/float(trials)
+
+    denominator = 1 + z**2/trials
+    center = (p + z**2/(2.*trials))/denominator
+    half_width = z*numpy.sqrt(p*(1 - p)/trials + z**2/(4.*trials**2))/denominator
+
+    return max(0., center - half_width), min(1., center + half_width)
+
+
+def clopper_pearson_interval(successes, trials, confidence=0.95):
+    """
+    Clopper-Pearson, i.e., exact, interval for a binomial proportion.
+
+    :param successes: number of successes
+    :type successes: int
+    :param trials: number of trials
+    :type trials: int
+    :param confidence: confidence level
+    :type confidence: float
+    :return: lower and upper bound
+    :rtype: (float, float)
+    """
+
+    assert trials > 0
+    assert successes >= 0 and successes <= trials
+    assert confidence > 0 and confidence < 1
+
+    alpha = 1 - confidence
+    lower = 0.
+    if successes > 0:
+        lower = scipy.stats.beta.ppf(alpha/2., successes, trials - successes + 1)
+    upper = 1.
+    if successes < trials:
+        upper = scipy.stats.beta.ppf(1 - alpha/2., successes + 1, trials - successes)
+
+    return float(lower), float(upper)
+
+
+def binomial_interval(successes, trials, confidence=0.95, method='wilson'):
+    """
+    Confidence interval for a binomial proportion.
+
+    :param successes: number of successes
+    :type successes: int
+    :param trials: number of trials
+    :type trials: int
+    :param confidence: confidence level
+    :type confidence: float
+    :param method: wilson or clopper_pearson
+    :type method: str
+    :return: lower and upper bound
+    :rtype: (float, float)
+    """
+
+    if method == 'wilson':
+        return wilson_interval(successes, trials, confidence)
+    elif method == 'clopper_pearson':
+        return clopper_pearson_interval(successes, trials, confidence)
+    else:
+        raise NotImplementedError()
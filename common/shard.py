@@ -0,0 +1,128 @@
+import os
+import multiprocessing
+import numpy
+from . import utils
+from .log import log
+
+
+def shard_range(N, shard, shards):
+    """
+    Get the contiguous range of samples processed by a shard.
+
+    :param N: number of samples
+    :type N: int
+    :param shard: index of shard
+    :type shard: int
+    :param shards: number of shards
+    :type shards: int
+    :return: start and end of range
+    :rtype: (int, int)
+    """
+
+    assert shards > 0
+    assert shard >= 0 and shard < shards
+
+    start = (N*shard)//shards
+    end = (N*(shard + 1))//shards
+
+    return start, end
+
+
+def shard_file(filepath, shard):
+    """
+    Get the file a shard writes its slice of the output to.
+
+    :param filepath: output file
+    :type filepath: str
+    :param shard: index of shard
+    :type shard: int
+    :return: file of shard
+    :rtype: str
+    """
+
+    base, ext = os.path.splitext(filepath)
+    return '%s.shard%d%s' % (base, shard, ext)
+
+
+def worker(program_class, args, threads):
+    """
+    Run a program as worker.
+
+    :param program_class: program to run
+    :type program_class: type
+    :param args: arguments of the program
+    :type args: [str]
+    :param threads: number of intra-op threads, 0 to keep the default
+    :type threads: int
+    """
+
+    if threads > 0:
+        import torch
+        torch.set_num_threads(threads)
+
+    program = program_class(args)
+    program.main()
+
+
+def run(program_class, args, shards, threads=1, log_file=''):
+    """
+    Run a program in parallel worker processes, each processing one shard.
+
+    :param program_class: program to run, needs to support -shard
+    :type program_class: type
+    :param args: arguments of the program
+    :type args: [str]
+    :param shards: number of shards, i.e., worker processes
+    :type shards: int
+    :param threads: number of intra-op threads per worker, 0 to keep the default
+    :type threads: int
+    :param log_file: log file, every worker logs to its own file
+    :type log_file: str
+    """
+
+    # Spawned processes do not inherit the intra-op thread pools or CUDA state of the parent.
+    context = multiprocessing.get_context('spawn')
+
+    processes = []
+    for shard in range(shards):
+        shard_args = list(args) + ['-shard=%d' % shard]
+        if log_file:
+            shard_args += ['-log_file=%s' % shard_file(log_file, shard)]
+
+        process = context.Process(target=worker, args=(program_class, shard_args, threads))
+        process.start()
+        processes.append(process)
+        log('[Shard] started shard %d' % shard)
+
+    for shard in range(shards):
+        processes[shard].join()
+        assert processes[shard].exitcode == 0, 'shard %d failed with exit code %d' % (shard, processes[shard].exitcode)
+        log('[Shard] finished shard %d' % shard)
+
+
+def merge_hdf5(filepath, shards, axis=0):
+    """
+    Merge the slices written by the shards into the output file and remove the files of the shards.
+
+    :param filepath: output file
+    :type filepath: str
+    :param shards: number of shards
+    :type shards: int
+    :param axis: axis along which samples are sharded
+    :type axis: int
+    :return: merged tensor
+    :rtype: numpy.ndarray
+    """
+
+    tensors = []
+    for shard in range(shards):
+        tensors.append(utils.read_hdf5(shard_file(filepath, shard)))
+
+    tensor = numpy.concatenate(tensors, axis=axis)
+    utils.write_hdf5(filepath, tensor)
+    log('[Shard] wrote %s' % filepath)
+
+    for shard in range(shards):
+        utils.remove(shard_file(filepath, shard))
+
+    return tensor
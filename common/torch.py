@@ -1,6 +1,7 @@
 import torch
 import numpy
 from . import cuda
+from .log import log, LogLevel
 
 
 def one_hot(classes, C):
@@ -51,6 +52,39 @@ def set_optimizer_parameter(optimizer, parameter, value):
         param_group[parameter] = value
 
 
+def l1_threshold(tensor, epsilon=1):
+    """
+    Compute the per-sample soft-thresholds for the orthogonal projection onto the L_1 epsilon-ball using the sort-based algorithm of
+    [Duchi et al., Efficient Projections onto the l1-Ball for Learning in High Dimensions, ICML 2008];
+    the projection is given by sign(x)*max(|x| - threshold, 0). For samples inside the ball, the threshold is zero.
+
+    **Assumes the first dimension to be batch dimension, which is preserved.**
+
+    :param tensor: tensor
+    :type tensor: torch.Tensor
+    :param epsilon: radius of ball, or per-sample radii
+    :type epsilon: float or torch.Tensor
+    :return: thresholds
+    :rtype: torch.Tensor
+    """
+
+    if isinstance(epsilon, torch.Tensor):
+        epsilon = epsilon.view(-1, 1)
+
+    absolute = torch.abs(tensor.view(tensor.size(0), -1))
+    sorted = torch.sort(absolute, dim=1, descending=True)[0]
+    cumulative = torch.cumsum(sorted, dim=1) - epsilon
+    counts = torch.arange(1, sorted.size(1) + 1, dtype=sorted.dtype, device=sorted.device).view(1, -1)
+
+    # rho is the number of non-zero entries after projection; the condition holds for a prefix of the sorted entries.
+    rho = torch.sum((sorted*counts > cumulative).long(), dim=1)
+    rho = torch.clamp(rho, min=1)
+    threshold = torch.gather(cumulative, 1, (rho - 1).view(-1, 1)).view(-1)/rho.to(sorted.dtype)
+
+    outside = (torch.sum(absolute, dim=1, keepdim=True) > epsilon).to(sorted.dtype).view(-1)
+    return torch.clamp(threshold, min=0)*outside
+
+
 def project(tensor, epsilon=1, ord=2):
     """
     Compute the orthogonal projection of the input tensor (as vector) onto the L_ord epsilon-ball.
@@ -84,12 +118,110 @@ def project(tensor, epsilon=1, ord=2):
             tensor = tensor.view(-1, size[1])
     elif ord == float('inf'):
         tensor = torch.clamp(tensor, min=-epsilon, max=epsilon)
+    elif ord == 1:
+        threshold = l1_threshold(tensor.data, epsilon)
+        threshold = threshold.view((-1, ) + (1, )*(tensor.dim() - 1))
+        tensor = torch.sign(tensor)*torch.clamp(torch.abs(tensor) - threshold, min=0)
     else:
         raise NotImplementedError()
 
     return tensor
 
 
+def project_(tensor, epsilon=1, ord=2):
+    """
+    In-place version of project, i.e., project the input tensor (as vector) onto the L_ord epsilon-ball.
+
+    **Assumes the first dimension to be batch dimension, which is preserved.**
+
+    :param tensor: tensor
+    :type tensor: torch.Tensor
+    :param epsilon: radius of ball, or per-sample radii
+    :type epsilon: float or torch.Tensor
+    :param ord: order of norm
+    :type ord: int
+    :return: projected tensor
+    :rtype: torch.Tensor
+    """
+
+    assert isinstance(tensor, torch.Tensor), 'given tensor should be torch.Tensor'
+
+    if ord == 2:
+        norms = torch.norm(tensor.view(tensor.size(0), -1), 2, 1)
+        norms = torch.clamp(epsilon/norms, max=1)
+        tensor.mul_(norms.view((-1, ) + (1, )*(tensor.dim() - 1)))
+    elif ord == float('inf'):
+        if isinstance(epsilon, torch.Tensor):
+            epsilon = epsilon.view((-1, ) + (1, )*(tensor.dim() - 1))
+            torch.min(tensor, epsilon, out=tensor)
+            torch.max(tensor, -epsilon, out=tensor)
+        else:
+            tensor.clamp_(min=-epsilon, max=epsilon)
+    elif ord == 1:
+        threshold = l1_threshold(tensor, epsilon)
+        threshold = threshold.view((-1, ) + (1, )*(tensor.dim() - 1))
+        signs = torch.sign(tensor)
+        tensor.abs_().sub_(threshold).clamp_(min=0).mul_(signs)
+    else:
+        raise NotImplementedError()
+
+    return tensor
+
+
+def normalize_(tensor, ord=2):
+    """
+    Normalize the input tensor (as vector) in-place to obtain the steepest descent direction with respect to the L_ord norm;
+    for L_inf, this is the sign of the tensor.
+
+    **Assumes the first dimension to be batch dimension, which is preserved.**
+
+    :param tensor: tensor
+    :type tensor: torch.Tensor
+    :param ord: order of norm
+    :type ord: int
+    :return: normalized tensor
+    :rtype: torch.Tensor
+    """
+
+    assert isinstance(tensor, torch.Tensor), 'given tensor should be torch.Tensor'
+
+    if ord == float('inf'):
+        tensor.sign_()
+    else:
+        norms = torch.norm(tensor.view(tensor.size(0), -1), ord, 1)
+        norms.clamp_(min=1e-12)
+        tensor.div_(norms.view((-1, ) + (1, )*(tensor.dim() - 1)))
+
+    return tensor
+
+
+def where_(tensor, mask, values):
+    """
+    In-place version of torch.where for per-sample masks, i.e., overwrite the samples of the tensor where the mask is set;
+    in contrast to boolean mask indexing, this does not synchronize with the host.
+
+    **Assumes the first dimension to be batch dimension, which is preserved.**
+
+    :param tensor: tensor
+    :type tensor: torch.Tensor
+    :param mask: per-sample mask
+    :type mask: torch.Tensor
+    :param values: per-sample values or a scalar
+    :type values: torch.Tensor or float
+    :return: updated tensor
+    :rtype: torch.Tensor
+    """
+
+    assert isinstance(tensor, torch.Tensor), 'given tensor should be torch.Tensor'
+
+    if not isinstance(values, torch.Tensor):
+        values = tensor.new_full(tensor.size(), values)
+    mask = mask.view((-1, ) + (1, )*(tensor.dim() - 1)).expand_as(tensor)
+    tensor.copy_(torch.where(mask, values, tensor))
+
+    return tensor
+
+
 def tensor_or_value(mixed):
     """
     Get tensor or single value.
@@ -242,3 +374,145 @@ class Scale(torch.nn.Module):
 
         return self.min + torch.mul(self.max - self.min, input)
 
+
+def quantize(model):
+    """
+    Quantize a model for inference on CPU using dynamic int8 quantization of the linear layers, i.e., weights are
+    stored in int8 and activations are quantized on the fly. Convolutional layers are not quantized, so this is
+    only meaningful for fully connected models; requires PyTorch 1.3 or newer.
+
+    :param model: model in eval mode
+    :type model: torch.nn.Module
+    :return: quantized model
+    :rtype: torch.nn.Module
+    """
+
+    assert not model.training, 'model needs to be in eval mode'
+    assert not cuda.is_cuda(model), 'quantized models are only supported on CPU'
+
+    quantization = getattr(torch, 'quantization', None)
+    assert quantization is not None and getattr(quantization, 'quantize_dynamic', None) is not None, \
+        'dynamic quantization not supported by PyTorch %s' % torch.__version__
+
+    return quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+class CompiledFunction:
+    """
+    Compiled version of a function or module for inference; uses torch.compile where available and falls
+    back to TorchScript tracing, or to eager execution if compilation fails. Tracing requires PyTorch 1.0 or
+    newer, on older versions (such as the pinned 0.4.0) the function is always run eagerly.
+
+    Inputs are padded to a fixed batch size such that the ragged last batch (or a compacted batch) does not
+    trigger recompilation; larger batches are compiled separately.
+    """
+
+    def __init__(self, function, batch_size=None, check=True, tolerance=1e-4):
+        """
+        Constructor.
+
+        :param function: function or module to compile
+        :type function: callable
+        :param batch_size: batch size to pad to, if None the batch size of the first call is used
+        :type batch_size: int
+        :param check: check compiled against eager outputs after compilation
+        :type check: bool
+        :param tolerance: tolerance for check
+        :type tolerance: float
+        """
+
+        self.function = function
+        """ (callable) Function or module. """
+
+        self.batch_size = batch_size
+        """ (int) Batch size to pad to. """
+
+        self.check = check
+        """ (bool) Check compiled against eager outputs. """
+
+        self.tolerance = tolerance
+        """ (float) Tolerance for check. """
+
+        self.compiled = dict()
+        """ ({int: callable}) Compiled functions per batch size. """
+
+        self.failed = False
+        """ (bool) Whether compilation failed. """
+
+    def pad(self, tensor, batch_size):
+        """
+        Pad tensor with zeros along the first dimension.
+
+        :param tensor: tensor
+        :type tensor: torch.Tensor
+        :param batch_size: batch size
+        :type batch_size: int
+        :return: padded tensor
+        :rtype: torch.Tensor
+        """
+
+        if not isinstance(tensor, torch.Tensor) or tensor.size(0) == batch_size:
+            return tensor
+        return torch.cat((tensor, tensor.new_zeros((batch_size - tensor.size(0), ) + tuple(tensor.size()[1:]))), 0)
+
+    def compile(self, inputs):
+        """
+        Compile for the given (padded) inputs.
+
+        :param inputs: inputs
+        :type inputs: (torch.Tensor)
+        :return: compiled function or None if compilation failed
+        :rtype: callable or None
+        """
+
+        if getattr(torch, 'compile', None) is None and tuple(map(int, torch.__version__.split('.')[:2])) < (1, 0):
+            log('[Compiled] compilation not supported by PyTorch %s, using eager execution' % torch.__version__, LogLevel.WARNING)
+            return None
+
+        try:
+            if getattr(torch, 'compile', None) is not None:
+                compiled = torch.compile(self.function, dynamic=False)
+            else:
+                compiled = torch.jit.trace(self.function, tuple(input.detach() for input in inputs))
+
+            if self.check:
+                # Checked under the grad mode of the call, as the compiled graphs with and without autograd may differ.
+                expected = self.function(*inputs).detach()
+                actual = compiled(*inputs).detach()
+                if not torch.allclose(expected, actual, rtol=self.tolerance, atol=self.tolerance):
+                    log('[Compiled] compiled and eager outputs differ, using eager execution', LogLevel.WARNING)
+                    return None
+        except Exception as e:
+            log('[Compiled] compilation failed (%s), using eager execution' % str(e), LogLevel.WARNING)
+            return None
+
+        log('[Compiled] compiled %s for batch size %d' % (getattr(self.function, '__name__', self.function.__class__.__name__), inputs[0].size(0)))
+        return compiled
+
+    def __call__(self, *inputs):
+        """
+        Call compiled function, padding inputs and slicing the output.
+
+        :param inputs: inputs, the first dimension is the batch dimension
+        :type inputs: (torch.Tensor)
+        :return: output
+        :rtype: torch.Tensor
+        """
+
+        if self.failed:
+            return self.function(*inputs)
+
+        size = inputs[0].size(0)
+        if self.batch_size is None:
+            self.batch_size = size
+        batch_size = max(size, self.batch_size)
+
+        inputs = tuple(self.pad(input, batch_size) for input in inputs)
+        if batch_size not in self.compiled.keys():
+            compiled = self.compile(inputs)
+            if compiled is None:
+                self.failed = True
+                return self.function(*inputs)[:size]
+            self.compiled[batch_size] = compiled
+
+        return self.compiled[batch_size](*inputs)[:size]
@@ -79,6 +79,78 @@ def read_hdf5(filepath, key = 'tensor'):
         return tensor
 
 
+def create_hdf5(filepath, shape, dtype, fill_value=0, chunks=True, key='tensor'):
+    """
+    Preallocate a tensor in HDF5 to be written slice by slice; the file is created if it does not exist,
+    existing tensors with other keys are kept.
+
+    :param filepath: path to file to write
+    :type filepath: str
+    :param shape: shape of tensor
+    :type shape: tuple
+    :param dtype: data type of tensor
+    :type dtype: type
+    :param fill_value: value of unwritten entries
+    :type fill_value: mixed
+    :param chunks: chunk shape, or True to let HDF5 decide
+    :type chunks: tuple or bool
+    :param key: key to use for tensor
+    :type key: str
+    """
+
+    opened_hdf5() # To be sure as there were some weird opening errors.
+    makedir(os.path.dirname(filepath))
+
+    with h5py.File(filepath, 'a') as h5f:
+        assert key not in [key for key in h5f.keys()], 'key %s already exists in %s' % (key, filepath)
+        h5f.create_dataset(key, shape=shape, dtype=dtype, fillvalue=fill_value, chunks=chunks, compression='gzip')
+        return
+
+
+def write_hdf5_slice(filepath, tensor, index, key='tensor'):
+    """
+    Write a slice of a tensor preallocated using create_hdf5.
+
+    :param filepath: path to file to write
+    :type filepath: str
+    :param tensor: slice to write
+    :type tensor: numpy.ndarray
+    :param index: index of slice, e.g., numpy.s_[:, 0:10]
+    :type index: tuple
+    :param key: key of tensor
+    :type key: str
+    """
+
+    opened_hdf5() # To be sure as there were some weird opening errors.
+    assert os.path.exists(filepath), 'file %s not found' % filepath
+
+    with h5py.File(filepath, 'r+') as h5f:
+        assert key in [key for key in h5f.keys()], 'key %s does not exist in %s' % (key, filepath)
+        h5f[key][index] = tensor
+        h5f.flush()
+        return
+
+
+def has_hdf5(filepath, key='tensor'):
+    """
+    Check whether a HDF5 file exists and contains the given key.
+
+    :param filepath: path to file to check
+    :type filepath: str
+    :param key: key to check
+    :type key: str
+    :return: whether key exists
+    :rtype: bool
+    """
+
+    if not os.path.exists(filepath):
+        return False
+
+    opened_hdf5() # To be sure as there were some weird opening errors.
+    with h5py.File(filepath, 'r') as h5f:
+        return key in [key for key in h5f.keys()]
+
+
 def opened_hdf5():
     """
     Close all open HDF5 files and report number of closed files.
@@ -8,8 +8,11 @@ from .decoder import *
 from .auto_encoder import *
 from .decoder_classifier import *
 from .selective_decoder import *
+from .spatial_transformer import *
 from .stn_decoder import *
 from .learned_auto_encoder import *
 from .learned_encoder import *
 from .learned_variational_encoder import *
 from .learned_decoder import *
+from .compiled import *
+from .perturbation_generator import *
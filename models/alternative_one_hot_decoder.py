@@ -1,5 +1,5 @@
 import torch
-import common.cuda
+from .spatial_transformer import SpatialTransformer
 from .decoder import Decoder
 
 
@@ -48,6 +48,9 @@ class AlternativeOneHotDecoder(Decoder):
         self.N_theta = N_theta
         """ (int) Number of transformation parameters. """
 
+        self.spatial_transformer = SpatialTransformer(N_theta)
+        """ (SpatialTransformer) Spatial transformer applying the transformation. """
+
         if softmax:
             self.softmax = torch.nn.Softmax(dim=1)
             """ (torch.nn.Softmax) Whether to apply softmax. """
@@ -61,25 +64,26 @@ class AlternativeOneHotDecoder(Decoder):
         # https://github.com/pytorch/pytorch/issues/4632
         #torch.backends.cudnn.benchmark = False
 
-    def stn(self, theta, input):
+    def code_indices(self, code):
         """
-        Apply spatial transformer network on image using affine transformation theta.
+        Get the prototype indices of hard one-hot codes, combining the font and class indices.
 
-        :param theta: transformation parameters as 6-vector
-        :type theta: torch.autograd.Variable
-        :param input: image(s) to apply transformation to
-        :type input: torch.autograd.Variable
-        :return: transformed image(s)
-        :rtype: torch.autograd.Variable
+        :param code: code(s) as batch size x code length
+        :type code: torch.autograd.Variable
+        :return: indices or None if prototypes cannot be selected by index
+        :rtype: torch.autograd.Variable or None
         """
 
-        # theta is given as 6-vector
-        theta = theta.view(-1, 2, 3)
+        if self.softmax:
+            return None
 
-        grid = torch.nn.functional.affine_grid(theta, input.size())
-        output = torch.nn.functional.grid_sample(input, grid)
+        code_font, code_class = torch.split(code, self.N_font, 1)
+        font_indices = self.one_hot_indices(code_font)
+        class_indices = self.one_hot_indices(code_class)
+        if font_indices is None or class_indices is None:
+            return None
 
-        return output
+        return font_indices*self.N_class + class_indices
 
     def _forward(self, code, theta):
         """
@@ -94,108 +98,27 @@ class AlternativeOneHotDecoder(Decoder):
         """
 
         batch_size = code.size()[0]
-        code_font, code_class = torch.split(code, self.N_font, 1)
+        indices = self.fixed_code_indices(code)
 
-        if self.softmax:
-            code_font = self.softmax(code_font/self.temperature)
-            code_class = self.softmax(code_class/self.temperature)
+        if indices is not None:
+            # hard one-hot codes directly select the corresponding prototypes
+            image = torch.index_select(self.database[0], 0, indices) # N x H x W
+        else:
+            code_font, code_class = torch.split(code, self.N_font, 1)
+            if self.softmax:
+                code_font = self.softmax(code_font/self.temperature)
+                code_class = self.softmax(code_class/self.temperature)
 
-        code_font = code_font.view(-1, self.N_font, 1).expand((batch_size, self.N_font, self.N_class))
-        code_font = code_font.contiguous().view(-1, self.N_font * self.N_class)
+            code_font = code_font.view(-1, self.N_font, 1).expand((batch_size, self.N_font, self.N_class))
+            code_font = code_font.contiguous().view(-1, self.N_font * self.N_class)
 
-        code_class = code_class.view(-1, 1, self.N_class).expand((batch_size, self.N_font, self.N_class))
-        code_class = code_class.contiguous().view(-1, self.N_font * self.N_class)
+            code_class = code_class.view(-1, 1, self.N_class).expand((batch_size, self.N_font, self.N_class))
+            code_class = code_class.contiguous().view(-1, self.N_font * self.N_class)
 
-        code = code_font * code_class
-        code = code.view(code.size()[0], code.size()[1], 1, 1)
+            code = code_font * code_class
+            code = code.view(code.size()[0], code.size()[1], 1, 1)
 
-        image = torch.sum(torch.mul(self.database, code), 1) # 1 x N x H x W and B x N x 1 x 1
+            image = torch.sum(torch.mul(self.database, code), 1) # 1 x N x H x W and B x N x 1 x 1
         image.unsqueeze_(1)
 
-        if self.N_theta > 0:
-            translation_x = theta[:, 0]
-        if self.N_theta > 1:
-            translation_y = theta[:, 1]
-        if self.N_theta > 2:
-            shear_x = theta[:, 2]
-        if self.N_theta > 3:
-            shear_y = theta[:, 3]
-        if self.N_theta > 4:
-            scales = theta[:, 4]
-        if self.N_theta > 5:
-            rotation = theta[:, 5]
-
-        transformation = torch.autograd.Variable(torch.FloatTensor(theta.size()[0], 6).fill_(0))
-        if common.cuda.is_cuda(theta):
-            transformation = transformation.cuda()
-
-        # translation x
-        if self.N_theta == 1:
-            transformation[:, 0] = 1
-            transformation[:, 4] = 1
-            transformation[:, 2] = translation_x
-        # translation y
-        elif self.N_theta == 2:
-            transformation[:, 0] = 1
-            transformation[:, 4] = 1
-            transformation[:, 2] = translation_x
-            transformation[:, 5] = translation_y
-        # shear x
-        elif self.N_theta == 3:
-            transformation[:, 0] = 1
-            transformation[:, 1] = shear_x
-            transformation[:, 2] = translation_x
-            transformation[:, 4] = 1
-            transformation[:, 5] = translation_y
-        # shear y
-        elif self.N_theta == 4:
-            transformation[:, 0] = 1
-            transformation[:, 1] = shear_x
-            transformation[:, 2] = translation_x
-            transformation[:, 3] = shear_y
-            transformation[:, 4] = 1
-            transformation[:, 5] = translation_y
-        # scale
-        elif self.N_theta == 5:
-            transformation[:, 0] = scales
-            transformation[:, 1] = scales * shear_x
-            transformation[:, 2] = translation_x
-            transformation[:, 3] = scales * shear_y
-            transformation[:, 4] = scales
-            transformation[:, 5] = translation_y
-        # rotation
-        elif self.N_theta >= 6 and self.N_theta <= 9:
-            transformation[:, 0] = torch.cos(rotation) * scales - torch.sin(rotation) * scales * shear_x
-            transformation[:, 1] = -torch.sin(rotation) * scales + torch.cos(rotation) * scales * shear_x
-            transformation[:, 2] = translation_x
-            transformation[:, 3] = torch.cos(rotation) * scales * shear_y + torch.sin(rotation) * scales
-            transformation[:, 4] = -torch.sin(rotation) * scales * shear_y + torch.cos(rotation) * scales
-            transformation[:, 5] = translation_y
-        else:
-            raise NotImplementedError()
-
-        output = torch.clamp(torch.clamp(self.stn(transformation, image), min=0), max=1)
-
-        if self.N_theta == 7:
-            output = torch.mul(output, theta[:, 6].view(-1, 1, 1, 1))
-        elif self.N_theta == 8:
-            r = torch.mul(output, theta[:, 6].view(-1, 1, 1, 1))
-            g = torch.mul(output, theta[:, 7].view(-1, 1, 1, 1))
-            b = output
-            output = 1 - torch.cat((
-                r,
-                g,
-                b
-            ), dim=1)
-        elif self.N_theta == 9:
-            # view is important as reshape does not allow grads in the cat case
-            r = torch.mul(output, theta[:, 6].view(-1, 1, 1, 1))
-            g = torch.mul(output, theta[:, 7].view(-1, 1, 1, 1))
-            b = torch.mul(output, theta[:, 8].view(-1, 1, 1, 1))
-            output = 1 - torch.cat((
-                r,
-                g,
-                b
-            ), dim=1)
-
-        return output
+        return self.spatial_transformer(theta, image)
@@ -2,6 +2,56 @@ import torch
 import common.torch
 
 
+def _fold(layer, bn):
+    """
+    Fold batch normalization in eval mode into the preceding linear or convolutional layer.
+
+    :param layer: linear or convolutional layer
+    :type layer: torch.nn.Linear or torch.nn.Conv2d
+    :param bn: batch normalization following the layer
+    :type bn: torch.nn.BatchNorm1d or torch.nn.BatchNorm2d
+    """
+
+    assert not bn.training, 'batch normalization can only be folded in eval mode'
+
+    scale = 1/torch.sqrt(bn.running_var + bn.eps)
+    if bn.weight is not None:
+        scale = scale*bn.weight.data
+    shift = -bn.running_mean*scale
+    if bn.bias is not None:
+        shift = shift + bn.bias.data
+
+    if layer.bias is None:
+        layer.bias = torch.nn.Parameter(torch.zeros_like(shift))
+    layer.weight.data.mul_(scale.view((-1, ) + (1, )*(layer.weight.dim() - 1)))
+    layer.bias.data.mul_(scale).add_(shift)
+
+
+def _fold_forward(bn, layer):
+    """
+    Fold batch normalization in eval mode into the following linear layer.
+
+    :param bn: batch normalization preceding the layer
+    :type bn: torch.nn.BatchNorm1d
+    :param layer: linear layer
+    :type layer: torch.nn.Linear
+    """
+
+    assert not bn.training, 'batch normalization can only be folded in eval mode'
+
+    scale = 1/torch.sqrt(bn.running_var + bn.eps)
+    if bn.weight is not None:
+        scale = scale*bn.weight.data
+    shift = -bn.running_mean*scale
+    if bn.bias is not None:
+        shift = shift + bn.bias.data
+
+    if layer.bias is None:
+        layer.bias = torch.nn.Parameter(torch.zeros(layer.weight.size()[0], device=layer.weight.device))
+    layer.bias.data.add_(torch.mv(layer.weight.data, shift))
+    layer.weight.data.mul_(scale.view(1, -1))
+
+
 class _ResNetBlock(torch.nn.Module):
     """
     Taken from https://github.com/pytorch/vision/blob/master/torchvision/models/resnet.py.
@@ -40,11 +90,13 @@ class _ResNetBlock(torch.nn.Module):
         identity = x
 
         out = self.conv1(x)
-        out = self.bn1(out)
+        if self.bn1 is not None:
+            out = self.bn1(out)
 
         out = self.relu(out)
         out = self.conv2(out)
-        out = self.bn2(out)
+        if self.bn2 is not None:
+            out = self.bn2(out)
 
         if self.downsample is not None:
             identity = self.downsample(x)
@@ -54,6 +106,20 @@ class _ResNetBlock(torch.nn.Module):
 
         return out
 
+    def fold(self):
+        """
+        Fold batch normalization into the convolutions.
+        """
+
+        _fold(self.conv1, self.bn1)
+        self.bn1 = None
+        _fold(self.conv2, self.bn2)
+        self.bn2 = None
+
+        if self.downsample is not None:
+            _fold(self.downsample[0], self.downsample[1])
+            self.downsample = torch.nn.Sequential(self.downsample[0])
+
 
 class Classifier(torch.nn.Module):
     """
@@ -691,6 +757,9 @@ class Classifier(torch.nn.Module):
         self.layers = []
         """ ([str]) Will hold layer names. """
 
+        self.folded = False
+        """ (bool) Whether batch normalization has been folded, i.e., the classifier is frozen for inference. """
+
         if architecture == 'standard':
             self.standard(resolution, **kwargs)
         elif architecture == 'mlp':
@@ -710,6 +779,70 @@ class Classifier(torch.nn.Module):
         else:
             raise NotImplementedError()
 
+    def train(self, mode=True):
+        """
+        Set training mode, not possible for folded classifiers.
+
+        :param mode: whether to set training mode
+        :type mode: bool
+        :return: classifier
+        :rtype: Classifier
+        """
+
+        assert not mode or not self.folded, 'folded classifier cannot be trained'
+        return super(Classifier, self).train(mode)
+
+    def fold(self):
+        """
+        Freeze the classifier for inference: batch normalization in eval mode is folded into the preceding linear or
+        convolutional layer, or into the following linear layer if it follows an activation, and gradients with
+        respect to the parameters are disabled. Dropout layers are removed.
+
+        :return: classifier
+        :rtype: Classifier
+        """
+
+        assert not self.training, 'classifier needs to be in eval mode'
+        assert not self.folded
+
+        layers = []
+        for i in range(len(self.layers)):
+            name = self.layers[i]
+            layer = getattr(self, name)
+
+            if isinstance(layer, torch.nn.BatchNorm1d) or isinstance(layer, torch.nn.BatchNorm2d):
+                previous = getattr(self, layers[-1]) if len(layers) > 0 else None
+                following = None
+                for j in range(i + 1, len(self.layers)):
+                    following = getattr(self, self.layers[j])
+                    if not isinstance(following, torch.nn.Dropout) and not isinstance(following, torch.nn.Dropout2d):
+                        break
+
+                if isinstance(previous, torch.nn.Linear) or isinstance(previous, torch.nn.Conv2d):
+                    _fold(previous, layer)
+                    delattr(self, name)
+                    continue
+                elif isinstance(layer, torch.nn.BatchNorm1d) and isinstance(following, torch.nn.Linear):
+                    _fold_forward(layer, following)
+                    delattr(self, name)
+                    continue
+            elif isinstance(layer, torch.nn.Dropout) or isinstance(layer, torch.nn.Dropout2d):
+                delattr(self, name)
+                continue
+            elif isinstance(layer, torch.nn.Sequential):
+                for module in layer:
+                    if isinstance(module, _ResNetBlock):
+                        module.fold()
+
+            layers.append(name)
+
+        self.layers = layers
+        for parameter in self.parameters():
+            parameter.requires_grad = False
+
+        self.folded = True
+        return self
+
     def forward(self, image, return_features=False):
         """
         Forward pass, takes an image and outputs the predictions.
@@ -733,6 +866,92 @@ class Classifier(torch.nn.Module):
         else:
             return output
 
+    def interval_bounds(self, lower, upper, layers=None):
+        """
+        Interval bound propagation, i.e., propagate element-wise lower and upper bounds on the input through the network;
+        supports linear, convolutional, batch normalization (in eval mode), pooling and monotonic activation layers.
+
+        :param lower: lower bounds on input
+        :type lower: torch.autograd.Variable
+        :param upper: upper bounds on input
+        :type upper: torch.autograd.Variable
+        :param layers: names of layers to propagate through, defaults to all layers
+        :type layers: [str]
+        :return: lower and upper bounds on output
+        :rtype: torch.autograd.Variable, torch.autograd.Variable
+        """
+
+        if layers is None:
+            layers = self.layers
+
+        # Layers might operate in-place.
+        lower = lower.clone()
+        upper = upper.clone()
+
+        for name in layers:
+            layer = getattr(self, name)
+            if isinstance(layer, torch.nn.Linear) or isinstance(layer, torch.nn.Conv2d):
+                center = (upper + lower)/2
+                radius = (upper - lower)/2
+                center = layer(center)
+                if isinstance(layer, torch.nn.Linear):
+                    radius = torch.nn.functional.linear(radius, torch.abs(layer.weight))
+                else:
+                    radius = torch.nn.functional.conv2d(radius, torch.abs(layer.weight), None, layer.stride, layer.padding, layer.dilation, layer.groups)
+                lower = center - radius
+                upper = center + radius
+            elif isinstance(layer, torch.nn.BatchNorm1d) or isinstance(layer, torch.nn.BatchNorm2d):
+                assert not layer.training, 'interval bounds require batch normalization in eval mode'
+                center = (upper + lower)/2
+                radius = (upper - lower)/2
+                scale = 1/torch.sqrt(layer.running_var + layer.eps)
+                if layer.weight is not None:
+                    scale = scale*layer.weight
+                center = layer(center)
+                radius = radius*torch.abs(scale).view((1, -1) + (1, )*(radius.dim() - 2))
+                lower = center - radius
+                upper = center + radius
+            elif isinstance(layer, torch.nn.ReLU) or isinstance(layer, torch.nn.LeakyReLU) \
+                    or isinstance(layer, torch.nn.Sigmoid) or isinstance(layer, torch.nn.Tanh) \
+                    or isinstance(layer, torch.nn.MaxPool2d) or isinstance(layer, torch.nn.AvgPool2d) \
+                    or isinstance(layer, torch.nn.Dropout) or isinstance(layer, torch.nn.Dropout2d) \
+                    or isinstance(layer, common.torch.View):
+                # Monotonic layers (dropout is the identity in eval mode).
+                lower = layer(lower)
+                upper = layer(upper)
+            else:
+                raise NotImplementedError('interval bounds not supported for %s' % layer.__class__.__name__)
+
+        return lower, upper
+
+    def margin_bounds(self, lower, upper, classes):
+        """
+        Lower bound on the margin between the logit of the given classes and all other logits, given element-wise
+        bounds on the input. The last linear layer is folded into the margins to obtain tighter bounds.
+
+        :param lower: lower bounds on input
+        :type lower: torch.autograd.Variable
+        :param upper: upper bounds on input
+        :type upper: torch.autograd.Variable
+        :param classes: classes
+        :type classes: torch.autograd.Variable
+        :return: lower bounds on margins, if positive the prediction cannot change
+        :rtype: torch.autograd.Variable
+        """
+
+        assert self.layers[-1] == 'logits' and isinstance(self.logits, torch.nn.Linear), 'last layer needs to be linear'
+
+        lower, upper = self.interval_bounds(lower, upper, self.layers[:-1])
+        center = (upper + lower)/2
+        radius = (upper - lower)/2
+
+        difference = self.logits.weight[classes].unsqueeze(1) - self.logits.weight.unsqueeze(0)
+        bias = self.logits.bias[classes].unsqueeze(1) - self.logits.bias.unsqueeze(0)
+        margins = torch.bmm(difference, center.unsqueeze(2)).squeeze(2) - torch.bmm(torch.abs(difference), radius.unsqueeze(2)).squeeze(2) + bias
+
+        margins = margins.scatter(1, classes.view(-1, 1), float('inf'))
+        return torch.min(margins, 1)[0]
+
     def __str__(self):
         """
         Print network.
@@ -0,0 +1,92 @@
+import torch
+import common.torch
+from .decoder import Decoder
+
+
+class Compiled(torch.nn.Module):
+    """
+    Wrapper running a model compiled in evaluation mode, e.g., for attacks; in training mode,
+    the wrapped model is run eagerly.
+    """
+
+    def __init__(self, module, batch_size=None, check=True):
+        """
+        Constructor.
+
+        :param module: model to compile
+        :type module: torch.nn.Module
+        :param batch_size: batch size to pad to
+        :type batch_size: int
+        :param check: check compiled against eager outputs
+        :type check: bool
+        """
+
+        super(Compiled, self).__init__()
+
+        self.module = module
+        """ (torch.nn.Module) Wrapped model. """
+
+        self.compiled = common.torch.CompiledFunction(module, batch_size, check)
+        """ (common.torch.CompiledFunction) Compiled model. """
+
+        self.train(module.training)
+
+    def forward(self, *inputs):
+        """
+        Forward pass.
+
+        :param inputs: inputs
+        :type inputs: (torch.autograd.Variable)
+        :return: output
+        :rtype: torch.autograd.Variable
+        """
+
+        if self.module.training:
+            return self.module(*inputs)
+        return self.compiled(*inputs)
+
+
+class CompiledDecoder(Decoder):
+    """
+    Wrapper running a decoder compiled in evaluation mode; fixed code or theta are set on the wrapper.
+    """
+
+    def __init__(self, decoder, batch_size=None, check=True):
+        """
+        Constructor.
+
+        :param decoder: decoder to compile
+        :type decoder: Decoder
+        :param batch_size: batch size to pad to
+        :type batch_size: int
+        :param check: check compiled against eager outputs
+        :type check: bool
+        """
+
+        assert isinstance(decoder, Decoder)
+
+        super(CompiledDecoder, self).__init__()
+
+        self.decoder = decoder
+        """ (Decoder) Wrapped decoder. """
+
+        self.compiled = common.torch.CompiledFunction(decoder._forward, batch_size, check)
+        """ (common.torch.CompiledFunction) Compiled decoder. """
+
+        self.train(decoder.training)
+
+    def _forward(self, code, theta):
+        """
+        Forward pass, takes a code(s) and generates the corresponding image(s).
+
+        :param code: code
+        :type code: torch.autograd.Variable
+        :param theta: theta
+        :type theta: torch.autograd.Variable
+        :return: output image
+        :rtype: torch.autograd.Variable
+        """
+
+        if self.decoder.training:
+            return self.decoder._forward(code, theta)
+        return self.compiled(code, theta)
@@ -24,6 +24,9 @@ class Decoder(torch.nn.Module):
         self._code = None
         """ (None or torch.autograd.Variable) Fixed code if set. """
 
+        self._indices = None
+        """ (None or torch.autograd.Variable) Prototype indices of the fixed code if it is hard one-hot. """
+
     def forward(self, code_or_theta, theta=None):
         """
         Wrapper forward function that also allows to call forward on only the code or theta
@@ -67,13 +70,63 @@ class Decoder(torch.nn.Module):
 
     def set_code(self, code):
         """
-        Set fixed code to use in forward pass.
+        Set fixed code to use in forward pass; the prototype indices of hard one-hot codes are computed once here
+        instead of in every forward pass.
 
         :param code: code
         :type code: torch.autograd.Variable
         """
 
         self._code = code
+        self._indices = self.code_indices(code)
+
+    def code_indices(self, code):
+        """
+        Get the prototype indices of hard one-hot codes, see one_hot_indices.
+
+        :param code: code(s) as batch size x code length
+        :type code: torch.autograd.Variable
+        :return: indices or None if prototypes cannot be selected by index
+        :rtype: torch.autograd.Variable or None
+        """
+
+        return None
+
+    def fixed_code_indices(self, code):
+        """
+        Get the prototype indices of the given code, reusing the indices computed in set_code for the fixed code.
+
+        :param code: code(s) as batch size x code length
+        :type code: torch.autograd.Variable
+        :return: indices or None if prototypes cannot be selected by index
+        :rtype: torch.autograd.Variable or None
+        """
+
+        if code is self._code:
+            return self._indices
+        return self.code_indices(code)
+
+    def one_hot_indices(self, code):
+        """
+        Get the indices of hard one-hot codes such that prototypes can be selected by index instead of computing
+        the weighted sum over the whole database; codes requiring gradients are not considered hard as the
+        gradients with respect to all code entries are needed.
+
+        :param code: code(s) as batch size x code length
+        :type code: torch.autograd.Variable
+        :return: indices or None if any code is not hard one-hot
+        :rtype: torch.autograd.Variable or None
+        """
+
+        if code.requires_grad:
+            return None
+
+        code = code.view(code.size()[0], -1)
+        values, indices = torch.max(code, 1)
+        if torch.sum(values != 1).item() > 0 or torch.sum(code != 0).item() != code.size()[0]:
+            return None
+
+        return indices
 
     def _forward(self, code, theta):
         """
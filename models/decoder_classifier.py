@@ -5,6 +5,7 @@ from .classifier import Classifier
 from .learned_decoder import LearnedDecoder
 from .selective_decoder import SelectiveDecoder
 from .stn_decoder import STNDecoder
+from .compiled import Compiled
 
 
 class DecoderClassifier(torch.nn.Module):
@@ -22,8 +23,11 @@ class DecoderClassifier(torch.nn.Module):
         :type classifier: torch.nn.Module
         """
 
-        assert isinstance(decoder, Decoder) or isinstance(decoder, LearnedDecoder) or isinstance(decoder, SelectiveDecoder) or isinstance(decoder, STNDecoder)
-        assert isinstance(classifier, Classifier)
+        # Compiled models are checked by the model they wrap.
+        check_decoder = decoder.module if isinstance(decoder, Compiled) else decoder
+        check_classifier = classifier.module if isinstance(classifier, Compiled) else classifier
+        assert isinstance(check_decoder, Decoder) or isinstance(check_decoder, LearnedDecoder) or isinstance(check_decoder, SelectiveDecoder) or isinstance(check_decoder, STNDecoder)
+        assert isinstance(check_classifier, Classifier)
 
         super(DecoderClassifier, self).__init__()
         assert cuda.is_cuda(decoder) == cuda.is_cuda(classifier), 'decoder and classifier have to be both cuda or not'
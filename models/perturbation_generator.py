@@ -0,0 +1,165 @@
+import torch
+import common.torch
+from operator import mul
+from functools import reduce
+
+
+class PerturbationGenerator(torch.nn.Module):
+    """
+    Small network predicting an initial perturbation for an attack from the input, i.e., from an image or from
+    a latent code; the predicted perturbation lies within the epsilon-ball of the attack.
+    """
+
+    def add_layer(self, name, layer):
+        """
+        Add a layer.
+
+        :param name: name of layer
+        :type name: str
+        :param layer: layer
+        :type layer: torch.nn.Module
+        """
+
+        setattr(self, name, layer)
+        self.layers.append(name)
+
+    def standard(self, resolution, **kwargs):
+        """
+        Fully convolutional architecture preserving the resolution, for images.
+
+        :param resolution: input resolution as channels x height x width
+        :type resolution: [int]
+        """
+
+        assert len(resolution) == 3
+
+        batch_normalization = kwargs.get('batch_normalization', True)
+        channels = kwargs.get('start_channels', 16)
+        layers = kwargs.get('layers', 3)
+
+        in_channels = resolution[0]
+        for layer in range(layers):
+            conv = torch.nn.Conv2d(in_channels, channels, kernel_size=3, padding=1)
+            torch.nn.init.kaiming_normal_(conv.weight, mode='fan_out', nonlinearity='relu')
+            torch.nn.init.constant_(conv.bias, 0)
+            self.add_layer('conv%d' % layer, conv)
+
+            if batch_normalization:
+                bn = torch.nn.BatchNorm2d(channels)
+                torch.nn.init.constant_(bn.weight, 1)
+                torch.nn.init.constant_(bn.bias, 0)
+                self.add_layer('bn%d' % layer, bn)
+
+            relu = torch.nn.ReLU(inplace=True)
+            self.add_layer('relu%d' % layer, relu)
+            in_channels = channels
+
+        conv = torch.nn.Conv2d(in_channels, resolution[0], kernel_size=3, padding=1)
+        torch.nn.init.normal_(conv.weight, 0, 0.001)
+        torch.nn.init.constant_(conv.bias, 0)
+        self.add_layer('conv%d' % layers, conv)
+
+    def mlp(self, resolution, **kwargs):
+        """
+        MLP architecture, for latent codes.
+
+        :param resolution: input resolution
+        :type resolution: [int]
+        """
+
+        batch_normalization = kwargs.get('batch_normalization', True)
+        units = kwargs.get('units', [64, 64])
+
+        dim = reduce(mul, resolution, 1)
+        units = [dim] + units
+        view = common.torch.View(-1, dim)
+        self.add_layer('view0', view)
+
+        for layer in range(1, len(units)):
+            lin = torch.nn.Linear(in_features=units[layer - 1], out_features=units[layer])
+            torch.nn.init.kaiming_normal_(lin.weight, torch.nn.init.calculate_gain('relu'))
+            torch.nn.init.constant_(lin.bias, 0)
+            self.add_layer('lin%d' % layer, lin)
+
+            relu = torch.nn.ReLU(inplace=True)
+            self.add_layer('relu%d' % layer, relu)
+
+            if batch_normalization:
+                bn = torch.nn.BatchNorm1d(units[layer])
+                torch.nn.init.constant_(bn.weight, 1)
+                torch.nn.init.constant_(bn.bias, 0)
+                self.add_layer('bn%d' % layer, bn)
+
+        lin = torch.nn.Linear(units[-1], dim)
+        torch.nn.init.normal_(lin.weight, 0, 0.001)
+        torch.nn.init.constant_(lin.bias, 0)
+        self.add_layer('lin%d' % len(units), lin)
+
+        view = common.torch.View(-1, *resolution)
+        self.add_layer('view%d' % len(units), view)
+
+    def __init__(self, resolution=(1, 28, 28), epsilon=0.3, ord=float('inf'), architecture='standard', **kwargs):
+        """
+        Initialize perturbation generator.
+
+        :param resolution: input resolution as channels x height x width for images or dimensionality for latent codes
+        :type resolution: [int]
+        :param epsilon: epsilon of the attack
+        :type epsilon: float
+        :param ord: norm of the attack
+        :type ord: int or float
+        :param architecture: architecture builder to use
+        :type architecture: str
+        """
+
+        super(PerturbationGenerator, self).__init__()
+
+        assert epsilon > 0, 'positive epsilon expected'
+        assert ord in [1, 2, float('inf')], 'only L_1, L_2 and L_inf norms supported'
+        resolution = list(resolution)
+
+        self.epsilon = epsilon
+        """ (float) Epsilon of the attack. """
+
+        self.ord = ord
+        """ (int or float) Norm of the attack. """
+
+        self.layers = []
+        """ ([str]) Will hold layer names. """
+
+        if architecture == 'standard':
+            self.standard(resolution, **kwargs)
+        elif architecture == 'mlp':
+            self.mlp(resolution, **kwargs)
+        else:
+            raise NotImplementedError()
+
+    def forward(self, inputs):
+        """
+        Forward pass, takes inputs and outputs the perturbations.
+
+        :param inputs: input images or latent codes
+        :type inputs: torch.autograd.Variable
+        :return: perturbations
+        :rtype: torch.autograd.Variable
+        """
+
+        output = inputs
+        for name in self.layers:
+            output = getattr(self, name)(output)
+
+        output = self.epsilon*torch.tanh(output)
+        if self.ord != float('inf'):
+            output = common.torch.project(output, self.epsilon, self.ord)
+
+        return output
+
+    def __str__(self):
+        """
+        Print network.
+        """
+
+        string = ''
+        for name in self.layers:
+            string += '(' + name + ', ' + getattr(self, name).__class__.__name__ + ')\n'
+        return string
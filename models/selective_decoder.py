@@ -1,4 +1,6 @@
 import torch
+import numpy
+import common.torch
 from . import learned_decoder
 from common import cuda
 
@@ -8,12 +10,17 @@ class SelectiveDecoder(torch.nn.Module):
     Decoder consisting of multiple decoders per class.
     """
 
-    def __init__(self, decoders, resolution):
+    def __init__(self, decoders, resolution, grouped=False):
         """
         Initialize decoder.
 
         :param decoders: list of decoders
         :type decoders: [LearnedDecoder]
+        :param resolution: resolution of output
+        :type resolution: (int, int, int)
+        :param grouped: sort codes by class once per set_code and run the decoders on contiguous slices; decoders sharing
+            an architecture are evaluated at once using stacked weights
+        :type grouped: bool
         """
 
         super(SelectiveDecoder, self).__init__()
@@ -39,6 +46,27 @@ class SelectiveDecoder(torch.nn.Module):
         self._code = None
         """ (None or torch.autograd.Variable) Fixed code if set. """
 
+        self.grouped = grouped
+        """ (bool) Whether to use grouped execution. """
+
+        self._permutation = None
+        """ (torch.Tensor) Permutation sorting the fixed code by class. """
+
+        self._inverse = None
+        """ (torch.Tensor) Inverse of the permutation. """
+
+        self._segments = None
+        """ ([(int, int, int)]) Class, start and end of the contiguous slices of the sorted codes. """
+
+        self._gather = None
+        """ (torch.Tensor) Indices into the sorted codes to obtain a padded classes x samples batch for stacked execution. """
+
+        self._valid = None
+        """ (torch.Tensor) Indices of the non-padded entries of the flattened classes x samples batch. """
+
+        self._stacked = None
+        """ (dict) Stacked weights of all decoders, None if the decoders cannot be stacked. """
+
     def forward(self, input):
         """
         Wrapper forward function that also allows to call forward on only the code or theta
@@ -54,6 +82,13 @@ class SelectiveDecoder(torch.nn.Module):
 
         assert self._code is not None
 
+        if self.grouped:
+            if self._stacked is None and self.stackable():
+                self.stack()
+            if self._stacked is not None:
+                return self.forward_stacked(input)
+            return self.forward_grouped(input)
+
         use_gpu = cuda.is_cuda(self.decoders[0])
         output = torch.zeros([self._code.size()[0], self.resolution[0], self.resolution[1], self.resolution[2]])
         if use_gpu:
@@ -78,3 +113,161 @@ class SelectiveDecoder(torch.nn.Module):
         """
 
         self._code = code
+        if self.grouped:
+            self.group()
+
+    def group(self):
+        """
+        Sort the fixed code by class once and cache the permutation and the per-class slices.
+        """
+
+        codes = self._code.view(-1).cpu().numpy()
+        device = self._code.device
+
+        # stable sort to keep the order within classes
+        permutation = numpy.argsort(codes, kind='mergesort')
+        counts = numpy.bincount(codes, minlength=len(self.decoders))
+        starts = numpy.concatenate(([0], numpy.cumsum(counts)[:-1]))
+
+        self._permutation = torch.from_numpy(permutation).to(device)
+        self._inverse = torch.from_numpy(numpy.argsort(permutation)).to(device)
+        self._segments = [(c, starts[c], starts[c] + counts[c]) for c in range(len(self.decoders)) if counts[c] > 0]
+
+        # for stacked execution, every class gets the same number of samples by repeating samples; classes without
+        # samples work on an arbitrary sample and are discarded
+        samples = max(1, numpy.max(counts))
+        offsets = numpy.minimum(numpy.arange(samples).reshape(1, -1), numpy.maximum(counts.reshape(-1, 1) - 1, 0))
+        gather = numpy.minimum(starts.reshape(-1, 1) + offsets, codes.shape[0] - 1)
+        valid = numpy.arange(samples).reshape(1, -1) < counts.reshape(-1, 1)
+
+        self._gather = torch.from_numpy(gather.reshape(-1)).to(device)
+        self._valid = torch.from_numpy(numpy.nonzero(valid.reshape(-1))[0]).to(device)
+
+    def forward_grouped(self, input):
+        """
+        Forward pass running every decoder on the contiguous slice of its class.
+
+        :param input: code
+        :type input: torch.autograd.Variable
+        :return: output image
+        :rtype: torch.autograd.Variable
+        """
+
+        input = torch.index_select(input, 0, self._permutation)
+        outputs = []
+        for c, start, end in self._segments:
+            outputs.append(self.decoders[c].forward(input[start: end]))
+
+        return torch.index_select(torch.cat(outputs, 0), 0, self._inverse)
+
+    def stackable(self):
+        """
+        Check whether the decoders can be evaluated at once using stacked weights, i.e., whether they share an
+        architecture consisting of supported layers and are in eval mode.
+
+        :return: whether decoders can be stacked
+        :rtype: bool
+        """
+
+        supported = (torch.nn.Linear, torch.nn.Conv2d, torch.nn.ConvTranspose2d, torch.nn.BatchNorm1d, torch.nn.BatchNorm2d,
+                     torch.nn.ReLU, torch.nn.Sigmoid, torch.nn.Tanh, torch.nn.LeakyReLU, torch.nn.UpsamplingNearest2d, common.torch.View)
+
+        decoder = self.decoders[0]
+        for name in decoder.layers:
+            if not isinstance(getattr(decoder, name), supported):
+                return False
+            if isinstance(getattr(decoder, name), (torch.nn.Conv2d, torch.nn.ConvTranspose2d)) and getattr(decoder, name).groups != 1:
+                return False
+
+        for other in self.decoders:
+            if other.training or other.layers != decoder.layers:
+                return False
+            for name in decoder.layers:
+                if type(getattr(other, name)) != type(getattr(decoder, name)):
+                    return False
+                for key, parameter in getattr(decoder, name).state_dict().items():
+                    if getattr(other, name).state_dict()[key].size() != parameter.size():
+                        return False
+
+        return True
+
+    def stack(self):
+        """
+        Stack the weights of all decoders; assumes that the weights of the decoders are not changed afterwards.
+        """
+
+        self._stacked = dict()
+        for name in self.decoders[0].layers:
+            layer = getattr(self.decoders[0], name)
+            layers = [getattr(decoder, name) for decoder in self.decoders]
+
+            if isinstance(layer, torch.nn.Linear):
+                self._stacked[name] = (
+                    torch.stack([layer.weight.detach().t() for layer in layers], 0),
+                    torch.stack([layer.bias.detach() for layer in layers], 0).unsqueeze(1),
+                )
+            elif isinstance(layer, (torch.nn.Conv2d, torch.nn.ConvTranspose2d)):
+                self._stacked[name] = (
+                    torch.cat([layer.weight.detach() for layer in layers], 0),
+                    torch.cat([layer.bias.detach() for layer in layers], 0),
+                )
+            elif isinstance(layer, torch.nn.BatchNorm1d):
+                # in eval mode, batch normalization is an affine transformation
+                scale = torch.stack([layer.weight.detach()/torch.sqrt(layer.running_var + layer.eps) for layer in layers], 0)
+                shift = torch.stack([layer.bias.detach() for layer in layers], 0) - torch.stack([layer.running_mean for layer in layers], 0)*scale
+                self._stacked[name] = (scale.unsqueeze(1), shift.unsqueeze(1))
+            elif isinstance(layer, torch.nn.BatchNorm2d):
+                self._stacked[name] = (
+                    torch.cat([layer.running_mean for layer in layers], 0),
+                    torch.cat([layer.running_var for layer in layers], 0),
+                    torch.cat([layer.weight.detach() for layer in layers], 0),
+                    torch.cat([layer.bias.detach() for layer in layers], 0),
+                )
+
+    def forward_stacked(self, input):
+        """
+        Forward pass evaluating all decoders at once using stacked weights; fully connected layers use batched matrix
+        multiplications on classes x samples x features and convolutional layers use grouped convolutions on
+        samples x (classes x channels) x height x width.
+
+        :param input: code
+        :type input: torch.autograd.Variable
+        :return: output image
+        :rtype: torch.autograd.Variable
+        """
+
+        classes = len(self.decoders)
+        output = torch.index_select(torch.index_select(input, 0, self._permutation), 0, self._gather)
+        output = output.view(classes, -1, output.size()[1])
+        samples = output.size()[1]
+        channels = False
+
+        for name in self.decoders[0].layers:
+            layer = getattr(self.decoders[0], name)
+
+            if isinstance(layer, torch.nn.Linear):
+                weight, bias = self._stacked[name]
+                output = torch.bmm(output, weight) + bias
+            elif isinstance(layer, torch.nn.BatchNorm1d):
+                scale, shift = self._stacked[name]
+                output = output*scale + shift
+            elif isinstance(layer, common.torch.View):
+                output = output.permute(1, 0, 2).contiguous().view((samples, -1) + tuple(layer.shape[2:]))
+                channels = True
+            elif isinstance(layer, torch.nn.Conv2d):
+                weight, bias = self._stacked[name]
+                output = torch.nn.functional.conv2d(output, weight, bias, layer.stride, layer.padding, layer.dilation, classes)
+            elif isinstance(layer, torch.nn.ConvTranspose2d):
+                weight, bias = self._stacked[name]
+                output = torch.nn.functional.conv_transpose2d(output, weight, bias, layer.stride, layer.padding, layer.output_padding, classes, layer.dilation)
+            elif isinstance(layer, torch.nn.BatchNorm2d):
+                running_mean, running_var, weight, bias = self._stacked[name]
+                output = torch.nn.functional.batch_norm(output, running_mean, running_var, weight, bias, False, 0, layer.eps)
+            else:
+                output = layer(output)
+
+        assert channels
+        output = output.view((samples, classes, -1) + tuple(output.size()[2:]))
+        output = output.transpose(0, 1).contiguous().view((classes*samples, ) + tuple(output.size()[2:]))
+
+        return torch.index_select(torch.index_select(output, 0, self._valid), 0, self._inverse)
@@ -0,0 +1,133 @@
+import torch
+
+
+class SpatialTransformer(torch.nn.Module):
+    """
+    Spatial transformer applying the affine transformation, and optionally the color transformation, described by
+    the transformation parameters theta to images; shared among the decoders.
+
+    The parameters are, in this order: translation x, translation y, shear x, shear y, scale, rotation and up to
+    three color channels; the first N_theta parameters are used.
+    """
+
+    def __init__(self, N_theta):
+        """
+        Initialize spatial transformer.
+
+        :param N_theta: number of transformation parameters
+        :type N_theta: int
+        """
+
+        super(SpatialTransformer, self).__init__()
+
+        assert N_theta > 0 and N_theta <= 9
+
+        self.N_theta = N_theta
+        """ (int) Number of transformation parameters. """
+
+        self.grids = dict()
+        """ (dict) Cached identity sampling grids per resolution and device. """
+
+    def transformation(self, theta):
+        """
+        Get the affine transformation matrices; parameters not used for the given N_theta are set to the
+        identity such that all cases are handled by one expression.
+
+        :param theta: transformation parameters
+        :type theta: torch.autograd.Variable
+        :return: transformation matrices as batch size x 2 x 3
+        :rtype: torch.autograd.Variable
+        """
+
+        zeros = theta.new_zeros(theta.size()[0])
+        ones = theta.new_ones(theta.size()[0])
+
+        translation_x = theta[:, 0]
+        translation_y = theta[:, 1] if self.N_theta > 1 else zeros
+        shear_x = theta[:, 2] if self.N_theta > 2 else zeros
+        shear_y = theta[:, 3] if self.N_theta > 3 else zeros
+        scales = theta[:, 4] if self.N_theta > 4 else ones
+        rotation = theta[:, 5] if self.N_theta > 5 else zeros
+
+        cos = torch.cos(rotation)
+        sin = torch.sin(rotation)
+
+        transformation = torch.stack((
+            cos * scales - sin * scales * shear_x,
+            -sin * scales + cos * scales * shear_x,
+            translation_x,
+            cos * scales * shear_y + sin * scales,
+            -sin * scales * shear_y + cos * scales,
+            translation_y,
+        ), dim=1)
+
+        return transformation.view(-1, 2, 3)
+
+    def grid(self, height, width, reference):
+        """
+        Get the cached identity sampling grid in homogeneous coordinates, as computed by affine_grid.
+
+        :param height: height
+        :type height: int
+        :param width: width
+        :type width: int
+        :param reference: tensor to take device and type from
+        :type reference: torch.Tensor
+        :return: grid as 1 x height*width x 3
+        :rtype: torch.Tensor
+        """
+
+        key = (height, width, reference.device, reference.dtype)
+        if key not in self.grids:
+            # The identity grid is taken from affine_grid itself as its coordinates depend on the PyTorch version.
+            identity = torch.tensor([[[1, 0, 0], [0, 1, 0]]], dtype=reference.dtype, device=reference.device)
+            grid = torch.nn.functional.affine_grid(identity, torch.Size((1, 1, height, width))).view(1, height*width, 2)
+            self.grids[key] = torch.cat((grid, grid.new_ones((1, height*width, 1))), dim=2)
+
+        return self.grids[key]
+
+    def forward(self, theta, images):
+        """
+        Transform images.
+
+        :param theta: transformation parameters
+        :type theta: torch.autograd.Variable
+        :param images: image(s) to apply transformation to
+        :type images: torch.autograd.Variable
+        :return: transformed image(s)
+        :rtype: torch.autograd.Variable
+        """
+
+        batch_size, _, height, width = images.size()
+        transformation = self.transformation(theta)
+
+        # single batched matrix multiplication with the cached identity grid instead of affine_grid
+        grid = self.grid(height, width, transformation).expand(batch_size, -1, -1)
+        grid = torch.bmm(grid, transformation.transpose(1, 2)).view(batch_size, height, width, 2)
+
+        output = torch.nn.functional.grid_sample(images, grid)
+        output = torch.clamp(torch.clamp(output, min=0), max=1)
+
+        if self.N_theta == 7:
+            output = torch.mul(output, theta[:, 6].view(-1, 1, 1, 1))
+        elif self.N_theta == 8:
+            r = torch.mul(output, theta[:, 6].view(-1, 1, 1, 1))
+            g = torch.mul(output, theta[:, 7].view(-1, 1, 1, 1))
+            b = output
+            output = 1 - torch.cat((
+                r,
+                g,
+                b
+            ), dim=1)
+        elif self.N_theta == 9:
+            # view is important as reshape does not allow grads in the cat case
+            r = torch.mul(output, theta[:, 6].view(-1, 1, 1, 1))
+            g = torch.mul(output, theta[:, 7].view(-1, 1, 1, 1))
+            b = torch.mul(output, theta[:, 8].view(-1, 1, 1, 1))
+            output = 1 - torch.cat((
+                r,
+                g,
+                b
+            ), dim=1)
+
+        return output
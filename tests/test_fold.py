@@ -0,0 +1,72 @@
+import os
+import sys
+sys.path.insert(1, os.path.dirname(os.path.realpath(__file__)) + '/../')
+import models
+import unittest
+import torch
+
+
+ARCHITECTURES = {
+    'standard': {'start_channels': 4, 'dropout': True},
+    'mlp': {'units': [16, 16], 'dropout': True},
+    'dcgan': {'start_channels': 4},
+    'pool': {'start_channels': 4},
+    'linear': {},
+    'simple': {'start_channels': 4},
+    'resnet': {'start_channels': 4, 'units': [1, 1, 1]},
+    'vgg': {'units': [4, 8, 8]},
+}
+""" (dict) Small configurations of all classifier architectures. """
+
+
+def randomize_batch_normalization(model):
+    """
+    Randomize statistics and affine parameters of all batch normalization layers such that folding is not trivial.
+
+    :param model: model
+    :type model: torch.nn.Module
+    """
+
+    for module in model.modules():
+        if isinstance(module, torch.nn.BatchNorm1d) or isinstance(module, torch.nn.BatchNorm2d):
+            module.running_mean.uniform_(-0.5, 0.5)
+            module.running_var.uniform_(0.5, 2)
+            if module.weight is not None:
+                module.weight.data.uniform_(0.5, 2)
+            if module.bias is not None:
+                module.bias.data.uniform_(-0.5, 0.5)
+
+
+class TestFold(unittest.TestCase):
+    def testFoldedLogits(self):
+        for architecture in ARCHITECTURES.keys():
+            with self.subTest(architecture=architecture):
+                torch.manual_seed(0)
+                model = models.Classifier(10, resolution=(1, 32, 32), architecture=architecture, **ARCHITECTURES[architecture])
+                randomize_batch_normalization(model)
+                model.eval()
+
+                inputs = torch.rand(8, 1, 32, 32)
+                with torch.no_grad():
+                    expected = model(inputs)
+                model.fold()
+                with torch.no_grad():
+                    actual = model(inputs)
+
+                self.assertTrue(model.folded)
+                self.assertEqual(expected.size(), actual.size())
+                self.assertTrue(torch.allclose(expected, actual, rtol=1e-4, atol=1e-4), torch.max(torch.abs(expected - actual)).item())
+
+    def testFoldedNoGradients(self):
+        model = models.Classifier(10, resolution=(1, 32, 32), architecture='standard', **ARCHITECTURES['standard'])
+        model.eval()
+        model.fold()
+
+        for parameter in model.parameters():
+            self.assertFalse(parameter.requires_grad)
+        with self.assertRaises(AssertionError):
+            model.train()
+
+
+if __name__ == '__main__':
+    unittest.main()
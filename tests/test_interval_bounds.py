@@ -0,0 +1,84 @@
+import os
+import sys
+sys.path.insert(1, os.path.dirname(os.path.realpath(__file__)) + '/../')
+import models
+from tests.test_fold import ARCHITECTURES, randomize_batch_normalization
+import unittest
+import torch
+
+
+class TestIntervalBounds(unittest.TestCase):
+    def setUp(self):
+        torch.manual_seed(0)
+        self.epsilon = 0.03
+        self.images = torch.rand(4, 1, 32, 32)
+        self.lower = torch.clamp(self.images - self.epsilon, min=0, max=1)
+        self.upper = torch.clamp(self.images + self.epsilon, min=0, max=1)
+
+    def sample(self, samples):
+        """
+        Sample points uniformly within the bounds.
+
+        :param samples: number of samples per image
+        :type samples: int
+        :return: points as samples x batch size x channels x height x width
+        :rtype: torch.Tensor
+        """
+
+        uniform = torch.rand((samples, ) + tuple(self.images.size()))
+        return self.lower.unsqueeze(0) + uniform*(self.upper - self.lower).unsqueeze(0)
+
+    def model(self, architecture):
+        """
+        Get a randomly initialized classifier in eval mode.
+
+        :param architecture: architecture
+        :type architecture: str
+        :return: classifier
+        :rtype: models.Classifier
+        """
+
+        model = models.Classifier(10, resolution=(1, 32, 32), architecture=architecture, **ARCHITECTURES[architecture])
+        randomize_batch_normalization(model)
+        model.eval()
+        return model
+
+    def testBoundsContainLogits(self):
+        for architecture in ['standard', 'mlp', 'vgg']:
+            with self.subTest(architecture=architecture):
+                model = self.model(architecture)
+                with torch.no_grad():
+                    lower, upper = model.interval_bounds(self.lower, self.upper)
+                    for points in self.sample(16):
+                        logits = model(points)
+                        self.assertTrue(torch.all(logits >= lower - 1e-4))
+                        self.assertTrue(torch.all(logits <= upper + 1e-4))
+
+    def testMarginBounds(self):
+        for architecture in ['standard', 'mlp', 'vgg']:
+            with self.subTest(architecture=architecture):
+                model = self.model(architecture)
+                with torch.no_grad():
+                    classes = torch.max(model(self.images), 1)[1]
+                    bounds = model.margin_bounds(self.lower, self.upper, classes)
+                    for points in self.sample(16):
+                        logits = model(points)
+                        margins = logits.gather(1, classes.view(-1, 1)) - logits
+                        margins = margins.scatter(1, classes.view(-1, 1), float('inf'))
+                        self.assertTrue(torch.all(bounds <= torch.min(margins, 1)[0] + 1e-4))
+
+    def testFoldedBounds(self):
+        model = self.model('standard')
+        model.fold()
+
+        # Folding changes the layers the bounds are propagated through, so the bounds may differ but have to remain sound.
+        with torch.no_grad():
+            lower, upper = model.interval_bounds(self.lower, self.upper)
+            for points in self.sample(16):
+                logits = model(points)
+                self.assertTrue(torch.all(logits >= lower - 1e-4))
+                self.assertTrue(torch.all(logits <= upper + 1e-4))
+
+
+if __name__ == '__main__':
+    unittest.main()
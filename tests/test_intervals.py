@@ -0,0 +1,62 @@
+import os
+import sys
+sys.path.insert(1, os.path.dirname(os.path.realpath(__file__)) + '/../')
+import common.numpy
+import unittest
+
+
+class TestIntervals(unittest.TestCase):
+    def testWilson(self):
+        lower, upper = common.numpy.wilson_interval(50, 100, 0.95)
+        self.assertAlmostEqual(lower, 0.4038, places=4)
+        self.assertAlmostEqual(upper, 0.5962, places=4)
+
+        lower, upper = common.numpy.wilson_interval(0, 10, 0.95)
+        self.assertAlmostEqual(lower, 0, places=6)
+        self.assertAlmostEqual(upper, 0.2775, places=4)
+
+        lower, upper = common.numpy.wilson_interval(10, 10, 0.95)
+        self.assertAlmostEqual(lower, 0.7225, places=4)
+        self.assertAlmostEqual(upper, 1, places=6)
+
+    def testClopperPearson(self):
+        lower, upper = common.numpy.clopper_pearson_interval(50, 100, 0.95)
+        self.assertAlmostEqual(lower, 0.3983, places=4)
+        self.assertAlmostEqual(upper, 0.6017, places=4)
+
+        lower, upper = common.numpy.clopper_pearson_interval(0, 10, 0.95)
+        self.assertEqual(lower, 0)
+        self.assertAlmostEqual(upper, 0.3085, places=4)
+
+        lower, upper = common.numpy.clopper_pearson_interval(10, 10, 0.95)
+        self.assertAlmostEqual(lower, 0.6915, places=4)
+        self.assertEqual(upper, 1)
+
+    def testContainsEstimate(self):
+        for method in ['wilson', 'clopper_pearson']:
+            for trials in [1, 7, 100, 1000]:
+                for successes in range(0, trials + 1, max(1, trials//7)):
+                    with self.subTest(method=method, trials=trials, successes=successes):
+                        lower, upper = common.numpy.binomial_interval(successes, trials, 0.95, method)
+                        self.assertLessEqual(0, lower)
+                        self.assertLessEqual(lower, successes/float(trials))
+                        self.assertLessEqual(successes/float(trials), upper)
+                        self.assertLessEqual(upper, 1)
+
+    def testWidth(self):
+        for method in ['wilson', 'clopper_pearson']:
+            with self.subTest(method=method):
+                # Intervals narrow with more trials and widen with higher confidence.
+                lower_100, upper_100 = common.numpy.binomial_interval(30, 100, 0.95, method)
+                lower_1000, upper_1000 = common.numpy.binomial_interval(300, 1000, 0.95, method)
+                lower_99, upper_99 = common.numpy.binomial_interval(30, 100, 0.99, method)
+                self.assertLess(upper_1000 - lower_1000, upper_100 - lower_100)
+                self.assertLess(upper_100 - lower_100, upper_99 - lower_99)
+
+    def testUnknownMethod(self):
+        with self.assertRaises(NotImplementedError):
+            common.numpy.binomial_interval(5, 10, 0.95, 'normal')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import os
+import sys
+sys.path.insert(1, os.path.dirname(os.path.realpath(__file__)) + '/../')
+import common.torch
+import unittest
+import numpy
+import torch
+
+
+def brute_force_l1_threshold(vector, epsilon):
+    """
+    Soft-threshold of the projection onto the L_1 epsilon-ball by bisection.
+
+    :param vector: vector
+    :type vector: numpy.ndarray
+    :param epsilon: radius of ball
+    :type epsilon: float
+    :return: threshold
+    :rtype: float
+    """
+
+    absolute = numpy.abs(vector.astype(numpy.float64))
+    if numpy.sum(absolute) <= epsilon:
+        return 0.
+
+    lower, upper = 0., numpy.max(absolute)
+    for i in range(200):
+        threshold = (lower + upper)/2
+        if numpy.sum(numpy.maximum(absolute - threshold, 0)) > epsilon:
+            lower = threshold
+        else:
+            upper = threshold
+
+    return upper
+
+
+class TestProjections(unittest.TestCase):
+    def setUp(self):
+        torch.manual_seed(0)
+        numpy.random.seed(0)
+
+    def testL1Threshold(self):
+        tensor = torch.randn(32, 1, 8, 8)
+        for epsilon in [0.1, 1, 10, 100]:
+            thresholds = common.torch.l1_threshold(tensor, epsilon)
+            for b in range(tensor.size(0)):
+                expected = brute_force_l1_threshold(tensor[b].numpy(), epsilon)
+                self.assertAlmostEqual(thresholds[b].item(), expected, places=4)
+
+    def testL1ThresholdPerSample(self):
+        tensor = torch.randn(32, 64)
+        epsilon = torch.from_numpy(numpy.random.uniform(0.1, 80, size=32).astype(numpy.float32))
+        thresholds = common.torch.l1_threshold(tensor, epsilon)
+        for b in range(tensor.size(0)):
+            expected = brute_force_l1_threshold(tensor[b].numpy(), epsilon[b].item())
+            self.assertAlmostEqual(thresholds[b].item(), expected, places=4)
+
+    def testL1ThresholdInside(self):
+        tensor = torch.randn(16, 64)
+        epsilon = torch.sum(torch.abs(tensor), 1).max().item() + 1
+        thresholds = common.torch.l1_threshold(tensor, epsilon)
+        self.assertEqual(torch.sum(thresholds != 0).item(), 0)
+
+    def testL1Projection(self):
+        tensor = torch.randn(32, 1, 8, 8)
+        epsilon = 2
+        projected = common.torch.project(tensor, epsilon, 1)
+        norms = torch.sum(torch.abs(projected.view(projected.size(0), -1)), 1)
+        self.assertTrue(torch.all(norms <= epsilon + 1e-4))
+
+        # The projection is at least as close as random points within the ball.
+        for b in range(tensor.size(0)):
+            distance = torch.norm(tensor[b] - projected[b]).item()
+            random = torch.randn(100, 64)
+            random = random/torch.sum(torch.abs(random), 1, keepdim=True)*epsilon*torch.rand(100, 1)
+            distances = torch.norm(tensor[b].view(1, -1) - random, 2, 1)
+            self.assertTrue(torch.all(distances >= distance - 1e-4))
+
+    def testL1ProjectionInPlace(self):
+        tensor = torch.randn(32, 1, 8, 8)
+        expected = common.torch.project(tensor, 2, 1)
+        common.torch.project_(tensor, 2, 1)
+        self.assertTrue(torch.allclose(expected, tensor, atol=1e-6))
+
+
+if __name__ == '__main__':
+    unittest.main()
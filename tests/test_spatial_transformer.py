@@ -0,0 +1,69 @@
+import os
+import sys
+sys.path.insert(1, os.path.dirname(os.path.realpath(__file__)) + '/../')
+import models
+import unittest
+import torch
+
+
+class TestSpatialTransformer(unittest.TestCase):
+    def setUp(self):
+        torch.manual_seed(0)
+        self.images = torch.rand(8, 1, 24, 28)
+
+    def theta(self, N_theta):
+        """
+        Random transformation parameters close to the identity.
+
+        :param N_theta: number of transformation parameters
+        :type N_theta: int
+        :return: transformation parameters
+        :rtype: torch.Tensor
+        """
+
+        theta = (torch.rand(self.images.size(0), N_theta) - 0.5)*0.4
+        if N_theta > 4:
+            theta[:, 4] += 1
+        if N_theta > 6:
+            theta[:, 6:] += 1
+        return theta
+
+    def testGrid(self):
+        batch_size, _, height, width = self.images.size()
+        for N_theta in range(1, 7):
+            with self.subTest(N_theta=N_theta):
+                spatial_transformer = models.SpatialTransformer(N_theta)
+                transformation = spatial_transformer.transformation(self.theta(N_theta))
+
+                grid = spatial_transformer.grid(height, width, transformation).expand(batch_size, -1, -1)
+                grid = torch.bmm(grid, transformation.transpose(1, 2)).view(batch_size, height, width, 2)
+                expected = torch.nn.functional.affine_grid(transformation, self.images.size())
+                self.assertTrue(torch.allclose(grid, expected, atol=1e-5))
+
+    def testForward(self):
+        for N_theta in range(1, 7):
+            with self.subTest(N_theta=N_theta):
+                spatial_transformer = models.SpatialTransformer(N_theta)
+                theta = self.theta(N_theta)
+
+                grid = torch.nn.functional.affine_grid(spatial_transformer.transformation(theta), self.images.size())
+                expected = torch.clamp(torch.nn.functional.grid_sample(self.images, grid), min=0, max=1)
+                self.assertTrue(torch.allclose(spatial_transformer(theta, self.images), expected, atol=1e-5))
+
+    def testIdentity(self):
+        theta = torch.zeros(self.images.size(0), 6)
+        theta[:, 4] = 1
+
+        output = models.SpatialTransformer(6)(theta, self.images)
+        self.assertTrue(torch.allclose(output, self.images, atol=1e-5))
+
+    def testColor(self):
+        for N_theta in range(7, 10):
+            with self.subTest(N_theta=N_theta):
+                theta = self.theta(N_theta)
+                output = models.SpatialTransformer(N_theta)(theta, self.images)
+                self.assertEqual(output.size(), (self.images.size(0), 1 if N_theta == 7 else 3) + tuple(self.images.size()[2:]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -9,6 +9,8 @@ from common import cuda
 from common import paths
 import common.torch
 import common.numpy
+import common.shard
+import attacks
 import math
 import torch
 import numpy
@@ -31,6 +33,9 @@ class AttackClassifier:
         self.args = None
         """ Arguments of program. """
 
+        self.argv = args if args is not None else sys.argv[1:]
+        """ ([str]) Arguments as given, e.g., passed on to shards. """
+
         parser = self.get_parser()
         if args is not None:
             self.args = parser.parse_args(args)
@@ -61,6 +66,18 @@ class AttackClassifier:
         self.success = None
         """ (numpy.ndarray) Success per test image. """
 
+        self.results = dict()
+        """ (dict) Will hold the estimated robust error. """
+
+        self.generator = None
+        """ (models.PerturbationGenerator) Perturbation generator to initialize attacks with. """
+
+        self.offset = 0
+        """ (int) Offset of the test images with respect to the full test set, e.g., for shards. """
+
+        self.norms = None
+        """ (numpy.ndarray) Norms of smallest successful perturbations per test image. """
+
         if self.args.log_file:
             utils.makedir(os.path.dirname(self.args.log_file))
             Log.get_instance().attach(open(self.args.log_file, 'w'))
@@ -94,6 +111,7 @@ class AttackClassifier:
         parser.add_argument('-accuracy_file', default=paths.results_file('classifier/accuracy'), help='Correctly classified test samples of classifier.', type=str)
         parser.add_argument('-perturbations_file', default=paths.results_file('classifier/perturbations'), help='HDF5 file containing perturbations.', type=str)
         parser.add_argument('-success_file', default=paths.results_file('classifier/success'), help='HDF5 file containing perturbations.', type=str)
+        parser.add_argument('-norms_file', default=paths.results_file('classifier/norms'), help='HDF5 file containing norms of smallest successful perturbations.', type=str)
         parser.add_argument('-log_file', default=paths.log_file('classifier/attacks'), help='Log file.', type=str)
         parser.add_argument('-attack', default='UntargetedBatchL2ClippedGradientDescent', help='Attack to try.', type=str)
         parser.add_argument('-objective', default='UntargetedF6', help='Objective to use.', type=str)
@@ -106,10 +124,29 @@ class AttackClassifier:
         parser.add_argument('-c_2', default=0.5, help='Weight of objective.', type=float)
         parser.add_argument('-max_iterations', default=250, help='Number of iterations for attack.', type=int)
         parser.add_argument('-max_projections', default=5, help='Number of projections for alternating projection.', type=int)
+        parser.add_argument('-projection_tolerance', default=None, help='Tolerance for stopping alternating projection early.', type=float)
         parser.add_argument('-base_lr', default=0.005, help='Learning rate for attack.', type=float)
         parser.add_argument('-no_gpu', dest='use_gpu', action='store_false')
+        parser.add_argument('-fold', default=False, action='store_true', help='Fold batch normalization into the classifier and freeze it for faster inference.')
         parser.add_argument('-no_label_leaking', default=False, dest='no_label_leaking', action='store_true')
+        parser.add_argument('-compaction', default=False, action='store_true', help='Remove successful samples from the working batch of the attack.')
+        parser.add_argument('-minimal', default=False, action='store_true', help='Keep track of the smallest successful perturbations in L_1, L_2 and L_inf norm.')
+        parser.add_argument('-batched_attempts', default=False, action='store_true', help='Run all attempts at once by replicating samples in the batch.')
+        parser.add_argument('-compile', default=False, action='store_true', help='Compile models and objective for the attack; requires PyTorch 1.0 or newer, otherwise the attack runs eagerly.')
+        parser.add_argument('-triage', default=False, action='store_true', help='Do not attack misclassified samples and samples certified robust using interval bound propagation.')
+        parser.add_argument('-binary_search_steps', default=0, help='Number of outer steps of binary search over c_2 for minimal perturbations, requires -c_0 > 0, 0 to disable.', type=int)
         parser.add_argument('-initialize_zero', default=False, action='store_true', help='Initialize attack at zero.')
+        parser.add_argument('-generator_file', default='', help='Snapshot state file of a perturbation generator to initialize the attack with.', type=str)
+        parser.add_argument('-generator_architecture', default='standard', help='Architecture of the perturbation generator.', type=str)
+        parser.add_argument('-initialize_file', default='', help='HDF5 file containing perturbed images to initialize the attack from, e.g., from a related model or a smaller epsilon.', type=str)
+        parser.add_argument('-stream', default=False, action='store_true', help='Write results to disk after every batch, allowing to resume interrupted attacks at the next unfinished batch.')
+        parser.add_argument('-estimate_width', default=0, help='Only estimate robust error, attacking samples in random order until the confidence interval is narrower than this width; 0 to disable.', type=float)
+        parser.add_argument('-estimate_confidence', default=0.95, help='Confidence level of the interval on robust error.', type=float)
+        parser.add_argument('-estimate_interval', default='wilson', help='Confidence interval on robust error, wilson or clopper_pearson.', type=str)
+        parser.add_argument('-estimate_file', default='', help='Pickle file to write the estimated robust error to.', type=str)
+        parser.add_argument('-shards', default=1, help='Number of worker processes to split the samples across.', type=int)
+        parser.add_argument('-shard', default=-1, help='Shard processed by this worker, -1 to start all shards.', type=int)
+        parser.add_argument('-threads', default=1, help='Number of intra-op threads per worker, 0 to keep the default.', type=int)
 
         # Some network parameters.
         parser.add_argument('-network_architecture', default='standard', help='Classifier architecture to use.', type=str)
@@ -121,7 +158,7 @@ class AttackClassifier:
 
         return parser
 
-    def setup_attack(self, batch_images, batch_classes):
+    def setup_attack(self, batch_images, batch_classes, batch_initialization=None):
         """
         Setup and initialize attack.
 
@@ -129,6 +166,8 @@ class AttackClassifier:
         :type batch_images: torch.autograd.Variable
         :param batch_classes: true classes to attack
         :type batch_classes: torch.autograd.Variable
+        :param batch_initialization: perturbations to initialize the attack with, otherwise zero or random initialization
+        :type batch_initialization: numpy.ndarray
         """
 
         if self.args.no_label_leaking:
@@ -144,17 +183,33 @@ class AttackClassifier:
             attack.set_c_2(self.args.c_2)
         if getattr(attack, 'set_max_projections', None) is not None:
             attack.set_max_projections(self.args.max_projections)
+        if getattr(attack, 'set_projection_tolerance', None) is not None:
+            attack.set_projection_tolerance(self.args.projection_tolerance)
 
         attack.set_max_iterations(self.args.max_iterations)
         attack.set_base_lr(self.args.base_lr)
 
+        if self.args.compaction:
+            attack.set_compaction(True)
+        if self.args.minimal:
+            assert getattr(attack, 'set_minimal', None) is not None, 'minimal mode not supported by %s' % self.args.attack
+            attack.set_minimal(True)
+
         assert attack.training_mode is False
 
-        if self.args.initialize_zero:
+        if batch_initialization is not None:
+            attack.initialize_perturbations(batch_initialization)
+        elif self.generator is not None:
+            attack.initialize_generator(self.generator)
+        elif self.args.initialize_zero:
             attack.initialize_zero()
         else:
             attack.initialize_random()
 
+        if self.args.binary_search_steps > 0:
+            assert self.args.c_0 > 0, 'binary search requires -c_0 > 0 as otherwise the constants do not change the attack'
+            attack = attacks.UntargetedBatchBinarySearch(attack, self.args.binary_search_steps)
+
         return attack
 
     def test(self):
@@ -202,7 +257,12 @@ class AttackClassifier:
         assert self.test_images.shape[0] == self.test_codes.shape[0], 'number of samples has to match'
 
         concatenate_axis = -1
-        if os.path.exists(self.args.perturbations_file) and os.path.exists(self.args.success_file):
+        offset = self.offset
+        completed = None
+        if self.args.stream and utils.has_hdf5(self.partial_file(self.args.success_file), 'completed'):
+            completed = utils.read_hdf5(self.partial_file(self.args.success_file), 'completed')
+            log('[Attack] read %s, %d of %d batches completed' % (self.partial_file(self.args.success_file), numpy.sum(completed), completed.shape[0]))
+        elif os.path.exists(self.args.perturbations_file) and os.path.exists(self.args.success_file):
             self.original_perturbations = utils.read_hdf5(self.args.perturbations_file)
             if self.test_images.shape[3] > 1:
                 assert len(self.original_perturbations.shape) == 5
@@ -226,6 +286,7 @@ class AttackClassifier:
                     self.test_images = self.test_images[self.original_perturbations.shape[1]:]
                     self.test_codes = self.test_codes[self.original_perturbations.shape[1]:]
                     self.args.max_samples = self.args.max_samples - self.original_perturbations.shape[1]
+                    offset += self.original_perturbations.shape[1]
                     concatenate_axis = 1
                     log('[Attack] found %d attempts with %d perturbations, computing %d more perturbations' % (self.original_perturbations.shape[0], self.original_perturbations.shape[1], self.args.max_samples))
                 elif self.original_perturbations.shape[1] == self.args.max_samples:
@@ -233,59 +294,392 @@ class AttackClassifier:
                     concatenate_axis = 0
                     log('[Attack] found %d attempts with %d perturbations, computing %d more attempts' % (self.original_perturbations.shape[0], self.original_perturbations.shape[1], self.args.max_attempts))
 
-        # can't squeeze here!
-        if self.test_images.shape[3] > 1:
-            self.perturbations = numpy.zeros((self.args.max_attempts, self.args.max_samples, self.test_images.shape[1], self.test_images.shape[2], self.test_images.shape[3]))
-        else:
-            self.perturbations = numpy.zeros((self.args.max_attempts, self.args.max_samples, self.test_images.shape[1], self.test_images.shape[2]))
-        self.success = numpy.ones((self.args.max_attempts, self.args.max_samples), dtype=int) * -1
-
         if self.args.attack.find('Batch') >= 0:
             batch_size = min(self.args.batch_size, self.args.max_samples)
         else:
             batch_size = 1
+        num_batches = int(math.ceil(self.args.max_samples/batch_size))
+
+        # Results are only streamed when not extending results computed without streaming.
+        stream = self.args.stream and concatenate_axis < 0
+        if stream:
+            if completed is None:
+                completed = numpy.zeros((num_batches), dtype=bool)
+                self.create_streams(batch_size, num_batches)
+            assert completed.shape[0] == num_batches, 'streamed results were computed with different batch size or number of samples'
+        else:
+            self.allocate(self.args.max_samples)
 
+        initializations = None
+        if self.args.initialize_file:
+            initializations = utils.read_hdf5(self.args.initialize_file)
+            log('[Attack] read %s' % self.args.initialize_file)
+            assert initializations.shape[1] >= offset + self.args.max_samples, 'not enough samples to initialize from'
+            assert initializations.shape[2] == self.test_images.shape[1]
+            assert initializations.shape[3] == self.test_images.shape[2]
+
+        if self.args.triage and self.accuracy is None:
+            self.accuracy = utils.read_hdf5(self.args.accuracy_file)
+            log('[Attack] read %s' % self.args.accuracy_file)
+
+        # With batched attempts, all attempts are attacked at once.
         objective = self.objective_class()
-        num_batches = int(math.ceil(self.args.max_samples/batch_size))
+        if self.args.compile:
+            objective = attacks.CompiledObjective(objective, batch_size*self.args.max_attempts if self.args.batched_attempts else batch_size)
 
+        # Index of the first sample held by perturbations, success and norms; when streaming, only the current batch is held.
+        start = 0
         for i in range(num_batches):  # self.test_images.shape[0]
             if i*batch_size == self.args.max_samples:
                 break
                 
             i_start = i*batch_size
             i_end = min((i+1)*batch_size, self.args.max_samples)
-
-            batch_images = common.torch.as_variable(self.test_images[i_start: i_end], self.args.use_gpu)
-            batch_classes = common.torch.as_variable(numpy.array(self.test_codes[i_start: i_end]), self.args.use_gpu)
+            if stream:
+                if completed[i]:
+                    log('[Attack] %d: already completed' % i)
+                    continue
+                start = i_start
+                self.allocate(i_end - i_start)
+
+            indices = numpy.arange(i_start, i_end)
+            if self.args.triage:
+                indices = self.triage(indices, offset, start)
+                if indices.shape[0] == 0:
+                    if stream:
+                        self.write_streams(i, i_start, i_end)
+                    log('[Attack] %d: skipped' % i)
+                    continue
+
+            batch_images = common.torch.as_variable(self.test_images[indices], self.args.use_gpu)
+            batch_classes = common.torch.as_variable(numpy.array(self.test_codes[indices]), self.args.use_gpu)
             batch_images = batch_images.permute(0, 3, 1, 2)
 
+            if self.args.batched_attempts:
+                # Attempts are folded into the batch dimension: every sample is replicated for each attempt
+                # such that a single, larger attack replaces the sequential restarts.
+                batch_images = torch.cat([batch_images] * self.args.max_attempts, 0)
+                batch_classes = torch.cat([batch_classes] * self.args.max_attempts, 0)
+
             t = 0
             while t < self.args.max_attempts:
-                attack = self.setup_attack(batch_images, batch_classes)
+                batch_initialization = None
+                if initializations is not None:
+                    attempts = range(t, self.args.max_attempts) if self.args.batched_attempts else [t]
+                    batch_initialization = self.initialization(initializations, indices, attempts, offset)
+
+                attack = self.setup_attack(batch_images, batch_classes, batch_initialization)
                 success, perturbations, probabilities, norm, _ = attack.run(objective)
                 assert not numpy.any(perturbations != perturbations), perturbations
 
-                # Note that we save the perturbed image, not only the perturbation!
-                self.perturbations[t][i_start: i_end] = numpy.squeeze(numpy.transpose(perturbations + batch_images.cpu().numpy(), (0, 2, 3, 1)))
-                self.success[t][i_start: i_end] = success
+                # Split into attempts; there are several attempts per run in batched mode.
+                perturbations = perturbations.reshape((-1, indices.shape[0]) + perturbations.shape[1:])
+                success = success.reshape((-1, indices.shape[0]))
+                images = batch_images[:indices.shape[0]].cpu().numpy()
+                if self.args.minimal:
+                    norms = attack.minimal_norms.reshape((-1, indices.shape[0], attack.minimal_norms.shape[1]))
+
+                for k in range(success.shape[0]):
+                    # Note that we save the perturbed image, not only the perturbation!
+                    self.perturbations[t][indices - start] = numpy.squeeze(numpy.transpose(perturbations[k] + images, (0, 2, 3, 1)))
+                    self.success[t][indices - start] = success[k]
+                    if self.args.minimal:
+                        self.norms[t][indices - start] = norms[k]
 
-                # IMPORTANT: The adversarial examples are not considering whether the classifier is
-                # actually correct to start with.
+                    # IMPORTANT: The adversarial examples are not considering whether the classifier is
+                    # actually correct to start with, except when using triage.
 
-                t += 1
+                    t += 1
 
+            if stream:
+                self.write_streams(i, i_start, i_end)
             log('[Attack] %d: completed' % i)
 
+        if stream:
+            self.finish_streams()
+            return
+
         if concatenate_axis >= 0:
             if self.perturbations.shape[0] == self.args.max_attempts:
                 self.perturbations = numpy.concatenate((self.original_perturbations, self.perturbations), axis=concatenate_axis)
                 self.success = numpy.concatenate((self.original_success, self.success), axis=concatenate_axis)
+                if self.args.minimal:
+                    if os.path.exists(self.args.norms_file):
+                        original_norms = utils.read_hdf5(self.args.norms_file)
+                        log('[Attack] read %s' % self.args.norms_file)
+                    else:
+                        original_norms = numpy.ones(self.original_success.shape + (3, ), dtype=numpy.float32) * numpy.inf
+                    self.norms = numpy.concatenate((original_norms, self.norms), axis=concatenate_axis)
                 log('[Attack] concatenated')
 
         utils.write_hdf5(self.args.perturbations_file, self.perturbations)
         log('[Attack] wrote %s' % self.args.perturbations_file)
         utils.write_hdf5(self.args.success_file, self.success)
         log('[Attack] wrote %s' % self.args.success_file)
+        if self.args.minimal:
+            utils.write_hdf5(self.args.norms_file, self.norms)
+            log('[Attack] wrote %s' % self.args.norms_file)
+
+    def estimate(self):
+        """
+        Estimate robust error by attacking samples in random order until the confidence interval on robust error is narrow enough;
+        a sample counts as error if it is misclassified or any attempt is successful. Attacks are initialized as usual,
+        e.g., using the perturbation generator, and triage skips certified samples. No perturbations are written.
+        """
+
+        assert self.model is not None
+        assert self.model.training is False
+        assert self.test_images.shape[0] == self.test_codes.shape[0], 'number of samples has to match'
+        assert self.args.estimate_width > 0
+        assert not self.args.batched_attempts, 'batched attempts not supported when estimating robust error'
+        assert not self.args.initialize_file, 'initialization from file not supported when estimating robust error'
+
+        if self.accuracy is None:
+            self.accuracy = utils.read_hdf5(self.args.accuracy_file)
+            log('[Attack] read %s' % self.args.accuracy_file)
+
+        if self.args.attack.find('Batch') >= 0:
+            batch_size = min(self.args.batch_size, self.args.max_samples)
+        else:
+            batch_size = 1
+
+        objective = self.objective_class()
+        if self.args.compile:
+            objective = attacks.CompiledObjective(objective, batch_size)
+
+        permutation = numpy.random.permutation(self.args.max_samples)
+        num_batches = int(math.ceil(self.args.max_samples/batch_size))
+        errors = 0
+        samples = 0
+        lower, upper = 0, 1
+
+        for i in range(num_batches):
+            indices = permutation[i*batch_size: min((i + 1)*batch_size, self.args.max_samples)]
+
+            # Misclassified samples count as errors without attacking; with triage, certified samples count as robust.
+            misclassified = numpy.logical_not(self.accuracy[self.offset + indices])
+            batch_errors = numpy.copy(misclassified)
+            attacked = numpy.logical_not(misclassified)
+            if self.args.triage:
+                certified = numpy.logical_and(self.certify(indices), attacked)
+                attacked = numpy.logical_and(attacked, numpy.logical_not(certified))
+                log('[Attack] triage: %d misclassified, %d certified of %d' % (numpy.sum(misclassified), numpy.sum(certified), indices.shape[0]))
+            indices = indices[attacked]
+
+            if indices.shape[0] > 0:
+                batch_images = common.torch.as_variable(self.test_images[indices], self.args.use_gpu)
+                batch_classes = common.torch.as_variable(numpy.array(self.test_codes[indices]), self.args.use_gpu)
+                batch_images = batch_images.permute(0, 3, 1, 2)
+
+                successful = numpy.zeros(indices.shape[0], dtype=bool)
+                for t in range(self.args.max_attempts):
+                    attack = self.setup_attack(batch_images, batch_classes)
+                    success, _, _, _, _ = attack.run(objective)
+                    successful = numpy.logical_or(successful, success >= 0)
+
+                batch_errors[attacked] = successful
+
+            errors += numpy.sum(batch_errors)
+            samples += batch_errors.shape[0]
+            lower, upper = common.numpy.binomial_interval(errors, samples, self.args.estimate_confidence, self.args.estimate_interval)
+            log('[Attack] %d: robust error %g in [%g, %g] on %d samples' % (i, errors/float(samples), lower, upper, samples))
+
+            if upper - lower < self.args.estimate_width:
+                break
+
+        self.results = {
+            'error': errors/float(samples),
+            'lower': lower,
+            'upper': upper,
+            'samples': samples,
+        }
+        if self.args.estimate_file:
+            utils.write_pickle(self.args.estimate_file, self.results)
+            log('[Attack] wrote %s' % self.args.estimate_file)
+
+    def allocate(self, samples):
+        """
+        Allocate perturbations, success and norms for all attempts on the given number of samples.
+
+        :param samples: number of samples
+        :type samples: int
+        """
+
+        # can't squeeze here!
+        if self.test_images.shape[3] > 1:
+            self.perturbations = numpy.zeros((self.args.max_attempts, samples, self.test_images.shape[1], self.test_images.shape[2], self.test_images.shape[3]))
+        else:
+            self.perturbations = numpy.zeros((self.args.max_attempts, samples, self.test_images.shape[1], self.test_images.shape[2]))
+        self.success = numpy.ones((self.args.max_attempts, samples), dtype=int) * -1
+        if self.args.minimal:
+            self.norms = numpy.ones((self.args.max_attempts, samples, 3), dtype=numpy.float32) * numpy.inf
+
+    def partial_file(self, filepath):
+        """
+        Get the temporary file results are streamed to until all batches are completed.
+
+        :param filepath: file
+        :type filepath: str
+        :return: temporary file
+        :rtype: str
+        """
+
+        return filepath + '.partial'
+
+    def create_streams(self, batch_size, num_batches):
+        """
+        Preallocate perturbations, success and norms on disk, chunked by batch, to write the results of every batch to;
+        completed batches are marked in the success file. Results are streamed to temporary files such that
+        incomplete results are never mistaken for finished ones, see finish_streams.
+
+        :param batch_size: batch size
+        :type batch_size: int
+        :param num_batches: number of batches
+        :type num_batches: int
+        """
+
+        utils.remove(self.partial_file(self.args.perturbations_file))
+        utils.remove(self.partial_file(self.args.success_file))
+        if self.args.minimal:
+            utils.remove(self.partial_file(self.args.norms_file))
+
+        shape = (self.args.max_attempts, self.args.max_samples, self.test_images.shape[1], self.test_images.shape[2])
+        if self.test_images.shape[3] > 1:
+            shape += (self.test_images.shape[3], )
+
+        utils.create_hdf5(self.partial_file(self.args.perturbations_file), shape, numpy.float32, 0, (1, batch_size) + shape[2:])
+        utils.create_hdf5(self.partial_file(self.args.success_file), shape[:2], int, -1, (1, batch_size))
+        utils.create_hdf5(self.partial_file(self.args.success_file), (num_batches, ), bool, False, key='completed')
+        if self.args.minimal:
+            utils.create_hdf5(self.partial_file(self.args.norms_file), shape[:2] + (3, ), numpy.float32, numpy.inf, (1, batch_size, 3))
+        log('[Attack] created %s' % self.partial_file(self.args.perturbations_file))
+
+    def write_streams(self, i, i_start, i_end):
+        """
+        Write the results of a batch to disk and mark it as completed.
+
+        :param i: batch
+        :type i: int
+        :param i_start: first sample of batch
+        :type i_start: int
+        :param i_end: end of batch
+        :type i_end: int
+        """
+
+        utils.write_hdf5_slice(self.partial_file(self.args.perturbations_file), self.perturbations.astype(numpy.float32), numpy.s_[:, i_start: i_end])
+        utils.write_hdf5_slice(self.partial_file(self.args.success_file), self.success, numpy.s_[:, i_start: i_end])
+        if self.args.minimal:
+            utils.write_hdf5_slice(self.partial_file(self.args.norms_file), self.norms, numpy.s_[:, i_start: i_end])
+
+        # Only marked as completed after all results are written.
+        utils.write_hdf5_slice(self.partial_file(self.args.success_file), numpy.array([True]), numpy.s_[i: i + 1], key='completed')
+
+    def finish_streams(self):
+        """
+        Move the streamed results to their final files once all batches are completed.
+        """
+
+        completed = utils.read_hdf5(self.partial_file(self.args.success_file), 'completed')
+        assert numpy.all(completed), 'only %d of %d batches completed' % (numpy.sum(completed), completed.shape[0])
+
+        # The success file is moved last as its existence marks finished results.
+        files = [self.args.perturbations_file, self.args.success_file]
+        if self.args.minimal:
+            files.insert(0, self.args.norms_file)
+        for filepath in files:
+            os.replace(self.partial_file(filepath), filepath)
+            log('[Attack] wrote %s' % filepath)
+
+    def initialization(self, initializations, indices, attempts, offset=0):
+        """
+        Get perturbations to initialize the attack with from stored perturbed images; if fewer attempts are stored,
+        they are reused cyclically.
+
+        :param initializations: perturbed images as attempts x samples x height x width (x channels)
+        :type initializations: numpy.ndarray
+        :param indices: indices of samples to attack
+        :type indices: numpy.ndarray
+        :param attempts: attempts to get perturbations for, concatenated along the batch dimension
+        :type attempts: [int]
+        :param offset: offset of the test images with respect to the stored perturbed images
+        :type offset: int
+        :return: perturbations as samples x channels x height x width
+        :rtype: numpy.ndarray
+        """
+
+        images = self.test_images[indices]
+        perturbations = []
+        for t in attempts:
+            perturbed_images = initializations[t % initializations.shape[0], offset + indices]
+            perturbations.append(perturbed_images.reshape(images.shape) - images)
+
+        return numpy.transpose(numpy.concatenate(perturbations, axis=0), (0, 3, 1, 2)).astype(numpy.float32)
+
+    def certify(self, indices):
+        """
+        Certify samples to be robust within epsilon using interval bound propagation, if supported by the classifier.
+
+        :param indices: indices of samples to certify
+        :type indices: numpy.ndarray
+        :return: whether samples are certified
+        :rtype: numpy.ndarray
+        """
+
+        certified = numpy.zeros(indices.shape[0], dtype=bool)
+        model = self.model.module if isinstance(self.model, models.Compiled) else self.model
+        if getattr(model, 'margin_bounds', None) is None:
+            return certified
+
+        batch_images = common.torch.as_variable(self.test_images[indices], self.args.use_gpu)
+        batch_classes = common.torch.as_variable(numpy.array(self.test_codes[indices]), self.args.use_gpu)
+        batch_images = batch_images.permute(0, 3, 1, 2)
+
+        # The L_inf ball contains the L_2 and L_1 balls, so certification is sound for all norms.
+        lower = torch.clamp(batch_images - self.args.epsilon, min=0, max=1)
+        upper = torch.clamp(batch_images + self.args.epsilon, min=0, max=1)
+
+        try:
+            with torch.no_grad():
+                margins = model.margin_bounds(lower, upper, batch_classes)
+            certified = margins.cpu().numpy() > 0
+        except NotImplementedError as e:
+            log('[Attack] could not certify samples (%s)' % str(e), LogLevel.WARNING)
+
+        return certified
+
+    def triage(self, indices, offset=0, start=0):
+        """
+        Triage samples before attacking: misclassified samples are trivially successful, and samples certified to be robust
+        within epsilon using interval bound propagation cannot be attacked successfully; both are stored with zero perturbation
+        and are not attacked.
+
+        :param indices: indices of samples to triage
+        :type indices: numpy.ndarray
+        :param offset: offset of the test images with respect to the accuracy
+        :type offset: int
+        :param start: index of the first sample held by perturbations, success and norms
+        :type start: int
+        :return: indices of samples to attack
+        :rtype: numpy.ndarray
+        """
+
+        misclassified = numpy.logical_not(self.accuracy[offset + indices])
+
+        # In minimal mode, larger perturbations than epsilon are relevant, so samples are not certified.
+        certified = numpy.zeros(indices.shape[0], dtype=bool)
+        if not self.args.minimal:
+            certified = numpy.logical_and(self.certify(indices), numpy.logical_not(misclassified))
+
+        skip = numpy.logical_or(misclassified, certified)
+        images = numpy.squeeze(self.test_images[indices[skip]])
+        for t in range(self.perturbations.shape[0]):
+            self.perturbations[t][indices[skip] - start] = images
+        self.success[:, indices[misclassified] - start] = 0
+        if self.args.minimal:
+            self.norms[:, indices[misclassified] - start] = 0
+
+        log('[Attack] triage: %d misclassified, %d certified of %d' % (numpy.sum(misclassified), numpy.sum(certified), indices.shape[0]))
+        return indices[numpy.logical_not(skip)]
 
     def load_attack(self):
         """
@@ -305,6 +699,32 @@ class AttackClassifier:
             exit(1)
         log('[Attack] found %s' % self.objective_class)
 
+    def load_generator(self):
+        """
+        Load perturbation generator to initialize attacks with, if requested.
+        """
+
+        if not self.args.generator_file:
+            return
+
+        if self.args.attack.lower().find('linf') > 0:
+            ord = float('inf')
+        elif self.args.attack.lower().find('l1') > 0:
+            ord = 1
+        else:
+            ord = 2
+
+        self.generator = models.PerturbationGenerator((self.test_images.shape[3], self.test_images.shape[1], self.test_images.shape[2]), self.args.epsilon, ord, architecture=self.args.generator_architecture)
+        assert os.path.exists(self.args.generator_file), 'state file %s not found' % self.args.generator_file
+        state = State.load(self.args.generator_file)
+        log('[Attack] read %s' % self.args.generator_file)
+
+        self.generator.load_state_dict(state.model)
+        if self.args.use_gpu and not cuda.is_cuda(self.generator):
+            self.generator = self.generator.cuda()
+        self.generator.eval()
+        log('[Attack] loaded generator')
+
     def load_models(self):
         """
         Load models.
@@ -334,6 +754,14 @@ class AttackClassifier:
         self.model.eval()
         log('[Attack] set classifier to eval')
 
+        if self.args.fold:
+            self.model.fold()
+            log('[Attack] folded classifier')
+
+        if self.args.compile:
+            self.model = models.Compiled(self.model, self.args.batch_size*self.args.max_attempts if self.args.batched_attempts else self.args.batch_size)
+            log('[Attack] compiled classifier')
+
     def load_data(self):
         """
         Load data.
@@ -355,6 +783,22 @@ class AttackClassifier:
         else:
             self.args.max_samples = min(self.args.max_samples, self.test_images.shape[0])
 
+    def shard(self):
+        """
+        Restrict the attack to the samples of the shard; the results are written to separate files per shard.
+        """
+
+        start, end = common.shard.shard_range(self.args.max_samples, self.args.shard, self.args.shards)
+        self.test_images = self.test_images[start: end]
+        self.test_codes = self.test_codes[start: end]
+        self.args.max_samples = end - start
+        self.offset = start
+
+        self.args.perturbations_file = common.shard.shard_file(self.args.perturbations_file, self.args.shard)
+        self.args.success_file = common.shard.shard_file(self.args.success_file, self.args.shard)
+        self.args.norms_file = common.shard.shard_file(self.args.norms_file, self.args.shard)
+        log('[Attack] shard %d: samples %d to %d' % (self.args.shard, start, end))
+
     def main(self):
         """
         Main.
@@ -363,8 +807,25 @@ class AttackClassifier:
         self.load_data()
         self.load_models()
         self.load_attack()
+        self.load_generator()
         if not os.path.exists(self.args.accuracy_file):
             self.test()
+
+        if self.args.estimate_width > 0:
+            self.estimate()
+            return
+
+        if self.args.shard >= 0:
+            self.shard()
+        elif self.args.shards > 1 and not (os.path.exists(self.args.perturbations_file) and os.path.exists(self.args.success_file)):
+            # All shards read the accuracy computed above.
+            common.shard.run(self.__class__, self.argv, self.args.shards, self.args.threads, self.args.log_file)
+            common.shard.merge_hdf5(self.args.perturbations_file, self.args.shards, axis=1)
+            common.shard.merge_hdf5(self.args.success_file, self.args.shards, axis=1)
+            if self.args.minimal:
+                common.shard.merge_hdf5(self.args.norms_file, self.args.shards, axis=1)
+            return
+
         self.attack()
 
 
@@ -0,0 +1,188 @@
+import os
+import sys
+sys.path.insert(1, os.path.dirname(os.path.realpath(__file__)) + '/../')
+from common import utils
+from common.log import log, LogLevel
+import common.torch
+import attacks
+from training import attack_classifier
+import math
+import numpy
+
+
+class AttackClassifierCascade(attack_classifier.AttackClassifier):
+    """
+    Attack a trained classifier using a cascade of increasingly expensive attacks; only samples not yet
+    successfully attacked are passed on to the next stage.
+    """
+
+    def __init__(self, args=None):
+        """
+        Initialize.
+
+        :param args: optional arguments if not to use sys.argv
+        :type args: [str]
+        """
+
+        super(AttackClassifierCascade, self).__init__(args)
+
+        self.stages = None
+        """ ([dict]) Stages of the cascade. """
+
+    def get_parser(self):
+        """
+        Get parser.
+
+        :return: parser
+        :rtype: argparse.ArgumentParser
+        """
+
+        parser = super(AttackClassifierCascade, self).get_parser()
+        parser.add_argument('-cascade_attacks', default='UntargetedBatchL2NormalizedGradientMethod,UntargetedBatchL2NormalizedGradientMethod,UntargetedBatchL2ReparameterizedGradientDescent', help='Attacks of the cascade.', type=str)
+        parser.add_argument('-cascade_objectives', default='UntargetedF0,UntargetedF0,UntargetedF6', help='Objectives of the cascade.', type=str)
+        parser.add_argument('-cascade_iterations', default='10,100,1000', help='Iterations of the attacks of the cascade.', type=str)
+        parser.add_argument('-cascade_attempts', default='1,1,1', help='Attempts of the attacks of the cascade.', type=str)
+
+        return parser
+
+    def set_stage(self, stage):
+        """
+        Set the attack, objective and iterations of a stage.
+
+        :param stage: stage
+        :type stage: dict
+        """
+
+        self.args.attack = stage['attack']
+        self.args.objective = stage['objective']
+        self.args.max_iterations = stage['max_iterations']
+        self.attack_class = stage['attack_class']
+        self.objective_class = stage['objective_class']
+
+    def attack(self):
+        """
+        Attack the model.
+        """
+
+        assert self.model is not None
+        assert self.model.training is False
+        assert self.test_images.shape[0] == self.test_codes.shape[0], 'number of samples has to match'
+        assert not self.args.minimal, 'minimal mode not supported in cascade'
+        assert not self.args.batched_attempts, 'batched attempts not supported in cascade'
+        assert not self.args.stream, 'streaming not supported in cascade'
+        assert not self.args.triage, 'triage not supported in cascade'
+        assert not self.args.initialize_file, 'initialization from file not supported in cascade'
+        assert self.args.binary_search_steps == 0, 'binary search not supported in cascade'
+
+        self.args.max_attempts = max([stage['max_attempts'] for stage in self.stages])
+
+        # Results of earlier runs cannot be extended by the cascade and are never overwritten.
+        if os.path.exists(self.args.perturbations_file) and os.path.exists(self.args.success_file):
+            original_success = utils.read_hdf5(self.args.success_file)
+            log('[Attack] read %s' % self.args.success_file)
+            assert original_success.shape[0] >= self.args.max_attempts and original_success.shape[1] >= self.args.max_samples, \
+                'found %d attempts, %d samples in %s, remove the files to re-run the cascade' % (original_success.shape[0], original_success.shape[1], self.args.success_file)
+            log('[Attack] found %d attempts, %d samples, requested no more' % (original_success.shape[0], original_success.shape[1]))
+            return
+
+        if self.test_images.shape[3] > 1:
+            self.perturbations = numpy.zeros((self.args.max_attempts, self.args.max_samples, self.test_images.shape[1], self.test_images.shape[2], self.test_images.shape[3]))
+        else:
+            self.perturbations = numpy.zeros((self.args.max_attempts, self.args.max_samples, self.test_images.shape[1], self.test_images.shape[2]))
+        self.success = numpy.ones((self.args.max_attempts, self.args.max_samples), dtype=int) * -1
+
+        # Unused attempts correspond to unsuccessful attacks with zero perturbation.
+        for t in range(self.args.max_attempts):
+            self.perturbations[t] = numpy.squeeze(self.test_images[:self.args.max_samples])
+
+        remaining = numpy.arange(self.args.max_samples)
+        for k in range(len(self.stages)):
+            if remaining.shape[0] == 0:
+                break
+
+            self.set_stage(self.stages[k])
+            if self.args.attack.find('Batch') >= 0:
+                batch_size = min(self.args.batch_size, remaining.shape[0])
+            else:
+                batch_size = 1
+
+            objective = self.objective_class()
+            if self.args.compile:
+                objective = attacks.CompiledObjective(objective, batch_size)
+
+            evaluations = 0
+            num_batches = int(math.ceil(remaining.shape[0]/batch_size))
+
+            for i in range(num_batches):
+                indices = remaining[i*batch_size: min((i + 1)*batch_size, remaining.shape[0])]
+
+                batch_images = common.torch.as_variable(self.test_images[indices], self.args.use_gpu)
+                batch_classes = common.torch.as_variable(numpy.array(self.test_codes[indices]), self.args.use_gpu)
+                batch_images = batch_images.permute(0, 3, 1, 2)
+                images = batch_images.cpu().numpy()
+
+                for t in range(self.stages[k]['max_attempts']):
+                    attack = self.setup_attack(batch_images, batch_classes)
+                    success, perturbations, probabilities, norm, iterations = attack.run(objective)
+                    assert not numpy.any(perturbations != perturbations), perturbations
+
+                    # Note that we save the perturbed image, not only the perturbation!
+                    self.perturbations[t, indices] = numpy.squeeze(numpy.transpose(perturbations + images, (0, 2, 3, 1)))
+                    self.success[t, indices] = success
+                    evaluations += (iterations + 1)*indices.shape[0]
+
+            robust = numpy.all(self.success[:, remaining] < 0, axis=0)
+            log('[Attack] stage %d (%s, %d iterations): %d of %d samples successfully attacked, ~%d gradient evaluations' % (
+                k, self.args.attack, self.args.max_iterations, remaining.shape[0] - numpy.sum(robust), remaining.shape[0], evaluations))
+            remaining = remaining[robust]
+
+        utils.write_hdf5(self.args.perturbations_file, self.perturbations)
+        log('[Attack] wrote %s' % self.args.perturbations_file)
+        utils.write_hdf5(self.args.success_file, self.success)
+        log('[Attack] wrote %s' % self.args.success_file)
+
+    def estimate(self):
+        """
+        Estimation of robust error is not supported for cascades.
+        """
+
+        assert False, 'estimation of robust error not supported in cascade'
+
+    def load_attack(self):
+        """
+        Load attacks and objectives of the cascade.
+        """
+
+        attack_names = self.args.cascade_attacks.split(',')
+        objectives = self.args.cascade_objectives.split(',')
+        iterations = list(map(int, self.args.cascade_iterations.split(',')))
+        attempts = list(map(int, self.args.cascade_attempts.split(',')))
+        assert len(attack_names) == len(objectives) == len(iterations) == len(attempts), 'cascade needs the same number of attacks, objectives, iterations and attempts'
+
+        self.stages = []
+        for k in range(len(attack_names)):
+            attack_class = utils.get_class('attacks', attack_names[k])
+            if not attack_class:
+                log('[Error] could not find attack %s' % attack_names[k], LogLevel.ERROR)
+                exit(1)
+            log('[Attack] found %s' % attack_class)
+
+            objective_class = utils.get_class('attacks', objectives[k])
+            if not objective_class:
+                log('[Error] could not find objective %s' % objectives[k], LogLevel.ERROR)
+                exit(1)
+            log('[Attack] found %s' % objective_class)
+
+            self.stages.append({
+                'attack': attack_names[k],
+                'objective': objectives[k],
+                'max_iterations': iterations[k],
+                'max_attempts': attempts[k],
+                'attack_class': attack_class,
+                'objective_class': objective_class,
+            })
+
+
+if __name__ == '__main__':
+    program = AttackClassifierCascade()
+    program.main()
@@ -0,0 +1,217 @@
+import os
+import sys
+sys.path.insert(1, os.path.dirname(os.path.realpath(__file__)) + '/../')
+from common import utils
+from common.log import log, LogLevel
+import common.torch
+import attacks
+from training import attack_classifier
+import copy
+import math
+import numpy
+import torch
+
+
+class AttackClassifierSweep(attack_classifier.AttackClassifier):
+    """
+    Attack a trained classifier using several attack configurations while loading model and data only once;
+    configurations of attacks supporting per-sample epsilons that only differ in epsilon are stacked along
+    the batch dimension and attacked at once.
+    """
+
+    def __init__(self, args=None):
+        """
+        Initialize.
+
+        :param args: optional arguments if not to use sys.argv
+        :type args: [str]
+        """
+
+        super(AttackClassifierSweep, self).__init__(args)
+
+        self.groups = None
+        """ ([[dict]]) Groups of configurations attacked at once. """
+
+    def get_parser(self):
+        """
+        Get parser.
+
+        :return: parser
+        :rtype: argparse.ArgumentParser
+        """
+
+        parser = super(AttackClassifierSweep, self).get_parser()
+        parser.add_argument('-sweep_file', default='', help='JSON file containing a list of attack configurations, each overriding arguments such as attack, epsilon, base_lr, perturbations_file and success_file.', type=str)
+
+        return parser
+
+    def set_configuration(self, configuration):
+        """
+        Set the arguments, attack and objective of a configuration.
+
+        :param configuration: configuration
+        :type configuration: dict
+        """
+
+        self.args = copy.copy(configuration['args'])
+        self.attack_class = configuration['attack_class']
+        self.objective_class = configuration['objective_class']
+
+    def attack(self):
+        """
+        Attack the model.
+        """
+
+        assert self.model is not None
+        assert self.model.training is False
+        assert self.test_images.shape[0] == self.test_codes.shape[0], 'number of samples has to match'
+
+        for group in self.groups:
+            self.set_configuration(group[0])
+
+            # The working batch holds all stacked configurations.
+            batch_size = max(1, self.args.batch_size//len(group))
+            if self.args.attack.find('Batch') < 0:
+                batch_size = 1
+            batch_size = min(batch_size, self.args.max_samples)
+
+            epsilons = numpy.array([configuration['args'].epsilon for configuration in group], dtype=numpy.float32)
+            log('[Attack] %s with epsilons %s' % (self.args.attack, ', '.join(['%g' % epsilon for epsilon in epsilons])))
+
+            for configuration in group:
+                if self.test_images.shape[3] > 1:
+                    configuration['perturbations'] = numpy.zeros((self.args.max_attempts, self.args.max_samples, self.test_images.shape[1], self.test_images.shape[2], self.test_images.shape[3]))
+                else:
+                    configuration['perturbations'] = numpy.zeros((self.args.max_attempts, self.args.max_samples, self.test_images.shape[1], self.test_images.shape[2]))
+                configuration['success'] = numpy.ones((self.args.max_attempts, self.args.max_samples), dtype=int) * -1
+                if self.args.minimal:
+                    configuration['norms'] = numpy.ones((self.args.max_attempts, self.args.max_samples, 3), dtype=numpy.float32) * numpy.inf
+
+            objective = self.objective_class()
+            if self.args.compile:
+                objective = attacks.CompiledObjective(objective, batch_size*len(group))
+            num_batches = int(math.ceil(self.args.max_samples/batch_size))
+
+            for i in range(num_batches):
+                i_start = i*batch_size
+                i_end = min((i + 1)*batch_size, self.args.max_samples)
+                indices = numpy.arange(i_start, i_end)
+
+                batch_images = common.torch.as_variable(self.test_images[indices], self.args.use_gpu)
+                batch_classes = common.torch.as_variable(numpy.array(self.test_codes[indices]), self.args.use_gpu)
+                batch_images = batch_images.permute(0, 3, 1, 2)
+                images = batch_images.cpu().numpy()
+
+                if len(group) > 1:
+                    # Configurations are stacked along the batch dimension with per-sample epsilons.
+                    batch_images = torch.cat([batch_images] * len(group), 0)
+                    batch_classes = torch.cat([batch_classes] * len(group), 0)
+                    self.args.epsilon = common.torch.as_variable(numpy.repeat(epsilons, indices.shape[0]), self.args.use_gpu)
+
+                for t in range(self.args.max_attempts):
+                    attack = self.setup_attack(batch_images, batch_classes)
+                    success, perturbations, probabilities, norm, _ = attack.run(objective)
+                    assert not numpy.any(perturbations != perturbations), perturbations
+
+                    perturbations = perturbations.reshape((len(group), indices.shape[0]) + perturbations.shape[1:])
+                    success = success.reshape((len(group), indices.shape[0]))
+                    if self.args.minimal:
+                        norms = attack.minimal_norms.reshape((len(group), indices.shape[0], attack.minimal_norms.shape[1]))
+
+                    for k in range(len(group)):
+                        # Note that we save the perturbed image, not only the perturbation!
+                        group[k]['perturbations'][t][indices] = numpy.squeeze(numpy.transpose(perturbations[k] + images, (0, 2, 3, 1)))
+                        group[k]['success'][t][indices] = success[k]
+                        if self.args.minimal:
+                            group[k]['norms'][t][indices] = norms[k]
+
+                log('[Attack] %d: completed' % i)
+
+            for configuration in group:
+                utils.write_hdf5(configuration['args'].perturbations_file, configuration['perturbations'])
+                log('[Attack] wrote %s' % configuration['args'].perturbations_file)
+                utils.write_hdf5(configuration['args'].success_file, configuration['success'])
+                log('[Attack] wrote %s' % configuration['args'].success_file)
+                if self.args.minimal:
+                    utils.write_hdf5(configuration['args'].norms_file, configuration['norms'])
+                    log('[Attack] wrote %s' % configuration['args'].norms_file)
+
+                # Results are on disk, free memory for the next group.
+                configuration['perturbations'] = None
+                configuration['success'] = None
+                configuration['norms'] = None
+
+    def load_attack(self):
+        """
+        Load attacks and objectives of all configurations and group them.
+        """
+
+        assert os.path.exists(self.args.sweep_file), 'sweep file %s not found' % self.args.sweep_file
+        assert self.args.shards == 1, 'shards not supported in sweep'
+        sweep = utils.read_json(self.args.sweep_file)
+        log('[Attack] read %s' % self.args.sweep_file)
+
+        # Data, models and generator are loaded once, so the corresponding arguments cannot be overridden.
+        shared = ['test_images_file', 'test_codes_file', 'label_index', 'classifier_file', 'accuracy_file', 'log_file',
+                  'use_gpu', 'fold', 'compile', 'batch_size', 'generator_file', 'generator_architecture', 'shards', 'shard',
+                  'threads', 'sweep_file', 'network_architecture', 'network_activation', 'network_no_batch_normalization',
+                  'network_channels', 'network_dropout', 'network_units']
+
+        configurations = []
+        for overrides in sweep:
+            assert 'perturbations_file' in overrides and 'success_file' in overrides, 'every configuration needs its own perturbations and success files'
+
+            args = copy.copy(self.args)
+            for key in overrides.keys():
+                assert hasattr(args, key), 'unknown argument %s' % key
+                assert key not in shared, 'argument %s cannot be overridden per configuration' % key
+                setattr(args, key, overrides[key])
+
+            assert not args.batched_attempts, 'batched attempts not supported in sweep'
+            assert not args.triage, 'triage not supported in sweep'
+            assert not args.initialize_file, 'initialization from file not supported in sweep'
+            assert not args.stream, 'streaming not supported in sweep'
+            assert args.estimate_width == 0, 'estimation of robust error not supported in sweep'
+
+            if os.path.exists(args.perturbations_file) and os.path.exists(args.success_file):
+                log('[Attack] found %s, skipping' % args.perturbations_file)
+                continue
+
+            attack_class = utils.get_class('attacks', args.attack)
+            if not attack_class:
+                log('[Error] could not find attack %s' % args.attack, LogLevel.ERROR)
+                exit(1)
+
+            objective_class = utils.get_class('attacks', args.objective)
+            if not objective_class:
+                log('[Error] could not find objective %s' % args.objective, LogLevel.ERROR)
+                exit(1)
+
+            configurations.append({
+                'args': args,
+                'attack_class': attack_class,
+                'objective_class': objective_class,
+            })
+
+        # Only attacks handling per-sample epsilons can be stacked; all other arguments need to be shared.
+        outputs = ['epsilon', 'perturbations_file', 'success_file', 'norms_file']
+        self.groups = []
+        stacks = dict()
+        for configuration in configurations:
+            if issubclass(configuration['attack_class'], attacks.UntargetedBatchFusedGradientMethod):
+                arguments = vars(configuration['args'])
+                key = tuple(sorted([(key, arguments[key]) for key in arguments.keys() if key not in outputs]))
+                if key in stacks:
+                    stacks[key].append(configuration)
+                    continue
+                stacks[key] = [configuration]
+                self.groups.append(stacks[key])
+            else:
+                self.groups.append([configuration])
+
+        log('[Attack] %d configurations in %d groups' % (len(configurations), len(self.groups)))
+
+
+if __name__ == '__main__':
+    program = AttackClassifierSweep()
+    program.main()
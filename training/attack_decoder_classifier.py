@@ -8,6 +8,7 @@ from common.state import State
 from common import cuda
 from common import paths
 import common.numpy
+import attacks
 import common.torch
 import math
 import torch
@@ -70,6 +71,9 @@ class AttackDecoderClassifier:
         self.success = None
         """ (numpy.ndarray) Success per test image. """
 
+        self.generator = None
+        """ (models.PerturbationGenerator) Perturbation generator to initialize attacks with. """
+
         self.min_bound = None
         """ (numpy.ndarray) Minimum bound for codes. """
 
@@ -121,11 +125,19 @@ class AttackDecoderClassifier:
         parser.add_argument('-c_2', default=0.5, help='Weight of objective.', type=float)
         parser.add_argument('-max_iterations', default=100, help='Number of iterations for attack.', type=int)
         parser.add_argument('-max_projections', default=5, help='Number of projections for alternating projection.', type=int)
+        parser.add_argument('-projection_tolerance', default=None, help='Tolerance for stopping alternating projection early.', type=float)
         parser.add_argument('-base_lr', default=0.005, help='Learning rate for attack.', type=float)
         parser.add_argument('-no_gpu', dest='use_gpu', action='store_false')
+        parser.add_argument('-fold', default=False, action='store_true', help='Fold batch normalization into the classifier and freeze it for faster inference.')
         parser.add_argument('-no_label_leaking', default=False, dest='no_label_leaking', action='store_true')
+        parser.add_argument('-compaction', default=False, action='store_true', help='Remove successful samples from the working batch of the attack.')
+        parser.add_argument('-batched_attempts', default=False, action='store_true', help='Run all attempts at once by replicating samples in the batch.')
+        parser.add_argument('-compile', default=False, action='store_true', help='Compile models and objective for the attack; requires PyTorch 1.0 or newer, otherwise the attack runs eagerly.')
         parser.add_argument('-on_manifold', default=False, dest='on_manifold', action='store_true')
         parser.add_argument('-initialize_zero', default=False, action='store_true', help='Initialize attack at zero.')
+        parser.add_argument('-generator_file', default='', help='Snapshot state file of a perturbation generator to initialize the attack with.', type=str)
+        parser.add_argument('-generator_architecture', default='mlp', help='Architecture of the perturbation generator.', type=str)
+        parser.add_argument('-initialize_file', default='', help='HDF5 file containing perturbed inputs to initialize the attack from, e.g., from a related model or a smaller epsilon.', type=str)
 
         # Some network parameters.
         parser.add_argument('-network_architecture', default='standard', help='Classifier architecture to use.', type=str)
@@ -176,7 +188,7 @@ class AttackDecoderClassifier:
         accuracy = numpy.sum(self.accuracy[:self.args.max_samples]) / float(self.args.max_samples)
         log('[Attack] accuracy on %d samples %g' % (self.args.max_samples, accuracy))
 
-    def setup_attack(self, batch_inputs, batch_classes):
+    def setup_attack(self, batch_inputs, batch_classes, batch_initialization=None):
         """
         Setup attack.
 
@@ -184,6 +196,8 @@ class AttackDecoderClassifier:
         :type batch_inputs: torch.autograd.Variable
         :param batch_classes: true classes
         :type batch_classes: torch.autograd.Variable
+        :param batch_initialization: perturbations to initialize the attack with
+        :type batch_initialization: numpy.ndarray
         :return: attack
         :rtype: attacks.UntargetedAttack
         """
@@ -206,13 +220,19 @@ class AttackDecoderClassifier:
             attack.set_c_2(self.args.c_2)
         if getattr(attack, 'set_max_projections', None) is not None:
             attack.set_max_projections(self.args.max_projections)
+        if getattr(attack, 'set_projection_tolerance', None) is not None:
+            attack.set_projection_tolerance(self.args.projection_tolerance)
 
         attack.set_max_iterations(self.args.max_iterations)
         attack.set_base_lr(self.args.base_lr)
 
         assert attack.training_mode is False
 
-        if self.args.initialize_zero:
+        if batch_initialization is not None:
+            attack.initialize_perturbations(batch_initialization)
+        elif self.generator is not None:
+            attack.initialize_generator(self.generator)
+        elif self.args.initialize_zero:
             attack.initialize_zero()
         else:
             attack.initialize_random()
@@ -228,6 +248,7 @@ class AttackDecoderClassifier:
         assert self.model.classifier.training is False
 
         concatenate_axis = -1
+        offset = 0
         if os.path.exists(self.args.perturbations_file) and os.path.exists(self.args.success_file):
             self.original_perturbations = utils.read_hdf5(self.args.perturbations_file)
             assert len(self.original_perturbations.shape) == 3, self.original_perturbations.shape
@@ -249,6 +270,7 @@ class AttackDecoderClassifier:
                     self.test_fonts = self.test_fonts[self.original_perturbations.shape[1]:]
                     self.test_classes = self.test_classes[self.original_perturbations.shape[1]:]
                     self.args.max_samples = self.args.max_samples - self.original_perturbations.shape[1]
+                    offset = self.original_perturbations.shape[1]
                     concatenate_axis = 1
                     log('[Attack] found %d attempts with %d perturbations, computing %d more perturbations' % (
                     self.original_perturbations.shape[0], self.original_perturbations.shape[1], self.args.max_samples))
@@ -266,7 +288,16 @@ class AttackDecoderClassifier:
         else:
             batch_size = 1
 
+        initializations = None
+        if self.args.initialize_file:
+            initializations = utils.read_hdf5(self.args.initialize_file)
+            log('[Attack] read %s' % self.args.initialize_file)
+            assert initializations.shape[1] >= offset + self.args.max_samples, 'not enough samples to initialize from'
+            assert initializations.shape[2] == self.perturbations.shape[2]
+
         objective = self.objective_class()
+        if self.args.compile:
+            objective = attacks.CompiledObjective(objective, batch_size*self.args.max_attempts if self.args.batched_attempts else batch_size)
         num_batches = int(math.ceil(self.args.max_samples/batch_size))
 
         for i in range(num_batches):
@@ -284,20 +315,42 @@ class AttackDecoderClassifier:
             batch_inputs = common.torch.as_variable(self.test_theta[i_start: i_end], self.args.use_gpu)
             batch_code = common.torch.as_variable(batch_code, self.args.use_gpu)
 
+            if self.args.batched_attempts:
+                # Attempts are folded into the batch dimension: every sample is replicated for each attempt
+                # such that a single, larger attack replaces the sequential restarts.
+                batch_inputs = torch.cat([batch_inputs] * self.args.max_attempts, 0)
+                batch_classes = torch.cat([batch_classes] * self.args.max_attempts, 0)
+                batch_code = torch.cat([batch_code] * self.args.max_attempts, 0)
+
             t = 0
             # This basically allows to only optimize over theta, keeping the font/class code fixed.
             self.model.decoder.set_code(batch_code)
 
             while True and t < self.args.max_attempts:
-                attack = self.setup_attack(batch_inputs, batch_classes)
+                batch_initialization = None
+                if initializations is not None:
+                    # Stored attempts are reused cyclically; in batched mode, all remaining attempts are initialized at once.
+                    attempts = range(t, self.args.max_attempts) if self.args.batched_attempts else [t]
+                    inputs = self.test_theta[i_start: i_end]
+                    batch_initialization = numpy.concatenate([initializations[a % initializations.shape[0], offset + i_start: offset + i_end] - inputs for a in attempts], axis=0).astype(numpy.float32)
+
+                attack = self.setup_attack(batch_inputs, batch_classes, batch_initialization)
+                if self.args.compaction:
+                    # The fixed codes of the decoder need to follow the working batch of the attack.
+                    attack.set_compaction(True, lambda indices: self.model.decoder.set_code(batch_code.index_select(0, indices)))
                 success, perturbations, probabilities, norm, _ = attack.run(objective)
                 assert not numpy.any(perturbations != perturbations), perturbations
 
-                # Note that we save the perturbed image, not only the perturbation!
-                perturbations = perturbations.reshape(batch_inputs.size())  # hack for when only one dimensional latent space is used!
-                self.perturbations[t][i_start: i_end] = perturbations + batch_inputs.cpu().numpy()
-                self.success[t][i_start: i_end] = success
-                t += 1
+                # Split into attempts; there are several attempts per run in batched mode.
+                perturbations = perturbations.reshape((-1, i_end - i_start, batch_inputs.size(1)))  # hack for when only one dimensional latent space is used!
+                success = success.reshape((-1, i_end - i_start))
+                inputs = batch_inputs[:i_end - i_start].cpu().numpy()
+
+                for k in range(success.shape[0]):
+                    # Note that we save the perturbed image, not only the perturbation!
+                    self.perturbations[t][i_start: i_end] = perturbations[k] + inputs
+                    self.success[t][i_start: i_end] = success[k]
+                    t += 1
 
             log('[Attack] %d: completed' % i)
 
@@ -360,6 +413,15 @@ class AttackDecoderClassifier:
         classifier.eval()
         log('[Attack] set classifier to eval')
 
+        if self.args.fold:
+            classifier.fold()
+            log('[Attack] folded classifier')
+
+        if self.args.compile:
+            # The one-hot decoder depends on the code or theta fixed per batch and is run eagerly.
+            classifier = models.Compiled(classifier, self.args.batch_size*self.args.max_attempts if self.args.batched_attempts else self.args.batch_size)
+            log('[Attack] compiled classifier')
+
         self.model = models.DecoderClassifier(decoder, classifier)
 
     def load_attack(self):
@@ -380,6 +442,32 @@ class AttackDecoderClassifier:
             exit(1)
         log('[Attack] found %s' % self.objective_class)
 
+    def load_generator(self):
+        """
+        Load perturbation generator to initialize attacks with, if requested.
+        """
+
+        if not self.args.generator_file:
+            return
+
+        if self.args.attack.lower().find('linf') > 0:
+            ord = float('inf')
+        elif self.args.attack.lower().find('l1') > 0:
+            ord = 1
+        else:
+            ord = 2
+
+        self.generator = models.PerturbationGenerator((self.test_theta.shape[1], ), self.args.epsilon, ord, architecture=self.args.generator_architecture)
+        assert os.path.exists(self.args.generator_file), 'state file %s not found' % self.args.generator_file
+        state = State.load(self.args.generator_file)
+        log('[Attack] read %s' % self.args.generator_file)
+
+        self.generator.load_state_dict(state.model)
+        if self.args.use_gpu and not cuda.is_cuda(self.generator):
+            self.generator = self.generator.cuda()
+        self.generator.eval()
+        log('[Attack] loaded generator')
+
     def load_data(self):
         """
         Load data.
@@ -409,6 +497,7 @@ class AttackDecoderClassifier:
         self.load_data()
         self.load_model()
         self.load_attack()
+        self.load_generator()
         if not os.path.exists(self.args.accuracy_file):
             self.test()
         self.attack()
@@ -8,6 +8,7 @@ from common.state import State
 from common import cuda
 from common import paths
 import common.numpy
+import attacks
 
 import math
 import torch
@@ -115,10 +116,16 @@ class AttackSTNClassifier:
         parser.add_argument('-c_2', default=0.5, help='Weight of objective.', type=float)
         parser.add_argument('-max_iterations', default=100, help='Number of iterations for attack.', type=int)
         parser.add_argument('-max_projections', default=5, help='Number of projections for alternating projection.', type=int)
+        parser.add_argument('-projection_tolerance', default=None, help='Tolerance for stopping alternating projection early.', type=float)
         parser.add_argument('-base_lr', default=0.005, help='Learning rate for attack.', type=float)
         parser.add_argument('-no_gpu', dest='use_gpu', action='store_false')
+        parser.add_argument('-fold', default=False, action='store_true', help='Fold batch normalization into the classifier and freeze it for faster inference.')
         parser.add_argument('-no_label_leaking', dest='no_label_leaking', action='store_true')
+        parser.add_argument('-compaction', default=False, action='store_true', help='Remove successful samples from the working batch of the attack.')
+        parser.add_argument('-batched_attempts', default=False, action='store_true', help='Run all attempts at once by replicating samples in the batch.')
+        parser.add_argument('-compile', default=False, action='store_true', help='Compile models and objective for the attack; requires PyTorch 1.0 or newer, otherwise the attack runs eagerly.')
         parser.add_argument('-initialize_random', dest='initialize_random', action='store_true')
+        parser.add_argument('-initialize_file', default='', help='HDF5 file containing perturbed inputs to initialize the attack from, e.g., from a related model or a smaller epsilon.', type=str)
         parser.add_argument('-N_theta', default=6, help='Numer of transformations.', type=int)
         parser.add_argument('-translation_x', default='-0.2,0.2', type=str, help='Minimum and maximum translation in x.')
         parser.add_argument('-translation_y', default='-0.2,0.2', type=str, help='Minimum and maximum translation in y')
@@ -176,7 +183,7 @@ class AttackSTNClassifier:
         accuracy = numpy.sum(self.accuracy[:self.args.max_samples]) / float(self.args.max_samples)
         log('[Attack] accuracy on %d samples %g' % (self.args.max_samples, accuracy))
 
-    def setup_attack(self, batch_inputs, batch_classes):
+    def setup_attack(self, batch_inputs, batch_classes, batch_initialization=None):
         """
         Setup attack.
 
@@ -184,6 +191,8 @@ class AttackSTNClassifier:
         :type batch_inputs: torch.autograd.Variable
         :param batch_classes: true classes
         :type batch_classes: torch.autograd.Variable
+        :param batch_initialization: perturbations to initialize the attack with
+        :type batch_initialization: numpy.ndarray
         :return: attack
         :rtype: attacks.UntargetedAttack
         """
@@ -202,12 +211,17 @@ class AttackSTNClassifier:
             attack.set_c_2(self.args.c_2)
         if getattr(attack, 'set_max_projections', None) is not None:
             attack.set_max_projections(self.args.max_projections)
+        if getattr(attack, 'set_projection_tolerance', None) is not None:
+            attack.set_projection_tolerance(self.args.projection_tolerance)
 
         assert attack.training_mode is False
 
         attack.set_max_iterations(self.args.max_iterations)
         attack.set_base_lr(self.args.base_lr)
-        attack.initialize_zero()
+        if batch_initialization is not None:
+            attack.initialize_perturbations(batch_initialization)
+        else:
+            attack.initialize_zero()
 
         return attack
 
@@ -220,6 +234,7 @@ class AttackSTNClassifier:
         assert self.model.classifier.training is False
 
         concatenate_axis = -1
+        offset = 0
         if os.path.exists(self.args.perturbations_file) and os.path.exists(self.args.success_file):
             self.original_perturbations = utils.read_hdf5(self.args.perturbations_file)
             assert len(self.original_perturbations.shape) == 3
@@ -239,6 +254,7 @@ class AttackSTNClassifier:
                     self.test_images = self.test_images[self.original_perturbations.shape[1]:]
                     self.test_codes = self.test_codes[self.original_perturbations.shape[1]:]
                     self.args.max_samples = self.args.max_samples - self.original_perturbations.shape[1]
+                    offset = self.original_perturbations.shape[1]
                     concatenate_axis = 1
                     log('[Attack] found %d attempts with %d perturbations, computing %d more perturbations' % (
                         self.original_perturbations.shape[0], self.original_perturbations.shape[1], self.args.max_samples))
@@ -256,7 +272,16 @@ class AttackSTNClassifier:
         else:
             batch_size = 1
 
+        initializations = None
+        if self.args.initialize_file:
+            initializations = utils.read_hdf5(self.args.initialize_file)
+            log('[Attack] read %s' % self.args.initialize_file)
+            assert initializations.shape[1] >= offset + self.args.max_samples, 'not enough samples to initialize from'
+            assert initializations.shape[2] == self.perturbations.shape[2]
+
         objective = self.objective_class()
+        if self.args.compile:
+            objective = attacks.CompiledObjective(objective, batch_size*self.args.max_attempts if self.args.batched_attempts else batch_size)
         num_batches = int(math.ceil(self.args.max_samples/batch_size))
 
         for i in range(num_batches):
@@ -273,6 +298,13 @@ class AttackSTNClassifier:
             batch_images = common.torch.as_variable(self.test_images[i_start: i_end], self.args.use_gpu)
             batch_images = batch_images.permute(0, 3, 1, 2)
 
+            if self.args.batched_attempts:
+                # Attempts are folded into the batch dimension: every sample is replicated for each attempt
+                # such that a single, larger attack replaces the sequential restarts.
+                batch_theta = torch.cat([batch_theta] * self.args.max_attempts, 0)
+                batch_classes = torch.cat([batch_classes] * self.args.max_attempts, 0)
+                batch_images = torch.cat([batch_images] * self.args.max_attempts, 0)
+
             self.model.decoder.set_image(batch_images)
             #output_images = self.model.decoder.forward(batch_theta)
             #error = torch.sum(torch.abs(output_images - batch_images))
@@ -285,15 +317,30 @@ class AttackSTNClassifier:
 
             t = 0
             while True and t < self.args.max_attempts:
-                attack = self.setup_attack(batch_theta, batch_classes)
+                batch_initialization = None
+                if initializations is not None:
+                    # Stored attempts are reused cyclically; in batched mode, all remaining attempts are initialized at once.
+                    attempts = range(t, self.args.max_attempts) if self.args.batched_attempts else [t]
+                    inputs = batch_theta[:i_end - i_start].cpu().detach().numpy()
+                    batch_initialization = numpy.concatenate([initializations[a % initializations.shape[0], offset + i_start: offset + i_end] - inputs for a in attempts], axis=0).astype(numpy.float32)
+
+                attack = self.setup_attack(batch_theta, batch_classes, batch_initialization)
+                if self.args.compaction:
+                    # The images of the spatial transformer need to follow the working batch of the attack.
+                    attack.set_compaction(True, lambda indices: self.model.decoder.set_image(batch_images.index_select(0, indices)))
                 success, perturbations, probabilities, norm, _ = attack.run(objective)
                 assert not numpy.any(perturbations != perturbations), perturbations
 
-                # Note that we save the perturbed image, not only the perturbation!
-                perturbations = perturbations.reshape(batch_theta.size()) # hack for when only one dimensional latent space is used!
-                self.perturbations[t][i_start: i_end] = perturbations + batch_theta.cpu().detach().numpy()
-                self.success[t][i_start: i_end] = success
-                t += 1
+                # Split into attempts; there are several attempts per run in batched mode.
+                perturbations = perturbations.reshape((-1, i_end - i_start, batch_theta.size(1))) # hack for when only one dimensional latent space is used!
+                success = success.reshape((-1, i_end - i_start))
+                theta = batch_theta[:i_end - i_start].cpu().detach().numpy()
+
+                for k in range(success.shape[0]):
+                    # Note that we save the perturbed image, not only the perturbation!
+                    self.perturbations[t][i_start: i_end] = perturbations[k] + theta
+                    self.success[t][i_start: i_end] = success[k]
+                    t += 1
 
             log('[Attack] %d: completed' % i)
 
@@ -370,6 +417,15 @@ class AttackSTNClassifier:
         classifier.eval()
         log('[Attack] loaded classifier')
 
+        if self.args.fold:
+            classifier.fold()
+            log('[Attack] folded classifier')
+
+        if self.args.compile:
+            # The STN decoder depends on the fixed images and is run eagerly.
+            classifier = models.Compiled(classifier, self.args.batch_size*self.args.max_attempts if self.args.batched_attempts else self.args.batch_size)
+            log('[Attack] compiled classifier')
+
         self.model = models.DecoderClassifier(decoder, classifier)
         log('[Training] set up decoder classifier')
 
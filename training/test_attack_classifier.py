@@ -69,6 +69,9 @@ class TestAttackClassifier:
         self.success = None
         """ (numpy.ndarray) Success indicator for perturbations."""
 
+        self.minimal_norms = None
+        """ (numpy.ndarray) Norms of smallest successful perturbations. """
+
         self.pca = None
         """ (sklearn.decomposition.IncrementalPCA) PCA to make nearest neighbor more efficient. """
 
@@ -106,6 +109,8 @@ class TestAttackClassifier:
         parser.add_argument('-accuracy_file', default=paths.results_file('classifier/accuracy'), help='Correctly classified test samples of classifier.', type=str)
         parser.add_argument('-perturbations_file', default=paths.results_file('classifier/perturbations'), help='HDF5 file containing perturbations.', type=str)
         parser.add_argument('-success_file', default=paths.results_file('classifier/success'), help='HDF5 file indicating attack success.', type=str)
+        parser.add_argument('-norms_file', default='', help='HDF5 file containing norms of smallest successful perturbations (minimal mode).', type=str)
+        parser.add_argument('-curve_epsilons', default='', help='Epsilons to compute success rates for in minimal mode; equally spaced if empty.', type=str)
         parser.add_argument('-results_file', default='', help='Path to pickled results file.', type=str)
         parser.add_argument('-plot_directory', default=paths.experiment_dir('classifier'), help='Path to PNG plot file for success rate.', type=str)
         parser.add_argument('-plot_manifolds', default=False, action='store_true', help='Whether to plot manifolds.')
@@ -151,6 +156,13 @@ class TestAttackClassifier:
         self.accuracy = self.accuracy[:self.perturbations.shape[1]]
         log('[Testing] read %s' % self.args.accuracy_file)
 
+        if self.args.norms_file:
+            self.minimal_norms = utils.read_hdf5(self.args.norms_file)
+            assert self.minimal_norms.shape[0] == self.success.shape[0]
+            assert self.minimal_norms.shape[1] == self.success.shape[1]
+            assert self.minimal_norms.shape[2] == len(self.norms)
+            log('[Testing] read %s' % self.args.norms_file)
+
     def compute_nearest_neighbors(self, images):
         """
         Compute distances in image and latent space.
@@ -271,6 +283,41 @@ class TestAttackClassifier:
             utils.write_pickle(self.args.results_file, self.results)
             log('[Testing] wrote %s' % self.args.results_file)
 
+    def compute_curves(self):
+        """
+        Compute success rate as function of epsilon from the smallest successful perturbations.
+        """
+
+        # A sample counts as successfully attacked for a given epsilon if any attempt
+        # found a perturbation with norm at most epsilon; as before, only samples
+        # that are correctly classified are considered.
+        minimal_norms = numpy.min(self.minimal_norms, axis=0)
+        minimal_norms = minimal_norms[self.accuracy.astype(bool)]
+        N_accuracy = max(1, minimal_norms.shape[0])
+
+        for n in range(len(self.norms)):
+            norm = self.norms[n]
+            norms = minimal_norms[:, n]
+
+            if self.args.curve_epsilons:
+                epsilons = numpy.array(list(map(float, self.args.curve_epsilons.split(','))))
+            else:
+                finite = norms[numpy.isfinite(norms)]
+                epsilons = numpy.linspace(0, numpy.max(finite) if finite.shape[0] > 0 else 1, 51)
+
+            self.results[n]['curve_epsilons'] = epsilons
+            self.results[n]['curve_success'] = numpy.array([numpy.sum(norms <= epsilon) for epsilon in epsilons]) / float(N_accuracy)
+
+            if self.args.plot_directory and utils.display():
+                plot_file = os.path.join(self.args.plot_directory, 'curve_l%g' % norm)
+                plot.line(plot_file, epsilons, self.results[n]['curve_success'], title='Success Rate in $L_{%g}$ Norm' % norm,
+                          xlabel='Epsilon', ylabel='Success Rate')
+                log('[Testing] wrote %s' % plot_file)
+
+        if self.args.results_file:
+            utils.write_pickle(self.args.results_file, self.results)
+            log('[Testing] wrote %s' % self.args.results_file)
+
     def compute_latent_statistics(self):
         """
         Compute latent statistics.
@@ -531,6 +578,11 @@ class TestAttackClassifier:
 
                 table_row = ['(%d) L_%.3g' % (c, norm), 'Latent Distance', '%.3g' % self.results[n]['raw_class_latent'][c]]
                 table_data.append(table_row)
+            if 'curve_epsilons' in self.results[n]:
+                for e in range(self.results[n]['curve_epsilons'].shape[0]):
+                    table_row = ['    L_%.3g' % norm, 'Success Rate, %.3g' % self.results[n]['curve_epsilons'][e], '%.3g' % self.results[n]['curve_success'][e]]
+                    table_data.append(table_row)
+
             table_data.append(['---']*2)
 
         table = terminaltables.AsciiTable(table_data)
@@ -546,6 +598,8 @@ class TestAttackClassifier:
             self.compute_latent_statistics()
         else:
             self.compute_statistics()
+        if self.minimal_norms is not None:
+            self.compute_curves()
         self.print_statistics()
         if self.args.plot_directory and self.args.plot_manifolds and utils.display():
             self.plot_manifolds()
@@ -9,6 +9,7 @@ from common import cuda
 from common import paths
 import common.torch
 import common.numpy
+import common.shard
 import torch
 import numpy
 import argparse
@@ -52,6 +53,12 @@ class TestClassifier:
         self.results = dict()
         """ (dict) Will hold evaluation results. """
 
+        self.float_accuracy = None
+        """ (numpy.ndarray) Accuracy of the float32 classifier when checking the quantized classifier. """
+
+        self.argv = args if args is not None else sys.argv[1:]
+        """ ([str]) Arguments as given, e.g., passed on to shards. """
+
         parser = self.get_parser()
         if args is not None:
             self.args = parser.parse_args(args)
@@ -92,7 +99,13 @@ class TestClassifier:
         parser.add_argument('-results_file', default='', help='Results file for evaluation.', type=str)
         parser.add_argument('-batch_size', default=64, help='Batch size.', type=int)
         parser.add_argument('-no_gpu', dest='use_gpu', action='store_false')
+        parser.add_argument('-quantize', default=False, action='store_true', help='Test the int8-quantized classifier on CPU; requires PyTorch 1.3 or newer and an mlp or linear architecture.')
+        parser.add_argument('-quantize_check', default=False, action='store_true', help='With -quantize, additionally run the float32 classifier and report the deviation of the quantized classifier.')
+        parser.add_argument('-fold', default=False, action='store_true', help='Fold batch normalization into the classifier and freeze it for faster inference.')
         parser.add_argument('-log_file', default=paths.log_file('test_classifier'), help='Log file.', type=str)
+        parser.add_argument('-shards', default=1, help='Number of worker processes to split the samples across.', type=int)
+        parser.add_argument('-shard', default=-1, help='Shard processed by this worker, -1 to start all shards.', type=int)
+        parser.add_argument('-threads', default=1, help='Number of intra-op threads per worker, 0 to keep the default.', type=int)
 
         # Some network parameters.
         parser.add_argument('-network_architecture', default='standard', help='Classifier architecture to use.', type=str)
@@ -151,7 +164,81 @@ class TestClassifier:
         self.results = {
             'loss': self.loss,
             'error': self.error,
+            'samples': self.accuracy.shape[0],
         }
+        if self.float_accuracy is not None:
+            float_error = 1 - numpy.sum(self.float_accuracy)/float(self.float_accuracy.shape[0])
+            log('[Testing] quantized error %g; float32 error %g; %d of %d samples changed' % (
+                self.error, float_error, numpy.sum(self.accuracy != self.float_accuracy), self.accuracy.shape[0]))
+            self.results['float_error'] = float_error
+        if self.args.results_file:
+            utils.write_pickle(self.args.results_file, self.results)
+            log('[Testing] wrote %s' % self.args.results_file)
+
+    def quantize(self):
+        """
+        Replace the classifier by its int8-quantized version; with -quantize_check, the accuracy of the float32
+        classifier is computed first to report the deviation.
+        """
+
+        assert not self.args.use_gpu, 'quantized classifiers are only supported on CPU, use -no_gpu'
+        # Only linear layers are quantized, convolutional classifiers would remain in float32.
+        assert self.args.network_architecture in ['mlp', 'linear'], 'quantization only supported for mlp and linear architectures'
+
+        model = common.torch.quantize(self.model)
+
+        if self.args.quantize_check:
+            accuracy = None
+            num_batches = int(math.ceil(self.test_images.shape[0]/self.args.batch_size))
+
+            for b in range(num_batches):
+                b_start = b*self.args.batch_size
+                b_end = min((b + 1)*self.args.batch_size, self.test_images.shape[0])
+                batch_images = common.torch.as_variable(self.test_images[b_start: b_end], self.args.use_gpu)
+                batch_classes = common.torch.as_variable(self.test_codes[b_start: b_end], self.args.use_gpu)
+                batch_images = batch_images.permute(0, 3, 1, 2)
+
+                with torch.no_grad():
+                    output_classes = self.model(batch_images)
+                indices = torch.max(output_classes, dim=1)[1]
+                accuracy = common.numpy.concatenate(accuracy, (indices == batch_classes).cpu().numpy())
+
+            self.float_accuracy = accuracy.astype(bool)
+        self.model = model
+        log('[Testing] quantized classifier')
+
+    def merge(self):
+        """
+        Run all shards and merge their results.
+        """
+
+        assert self.args.accuracy_file, 'shards require an accuracy file'
+
+        common.shard.run(self.__class__, self.argv, self.args.shards, self.args.threads, self.args.log_file)
+        self.accuracy = common.shard.merge_hdf5(self.args.accuracy_file, self.args.shards)
+
+        # Loss and error are averaged over the shards weighted by their number of samples.
+        self.loss = 0.
+        self.error = 0.
+        float_error = 0.
+        for shard in range(self.args.shards):
+            results_file = common.shard.shard_file(self.args.accuracy_file, shard) + '.pkl'
+            results = utils.read_pickle(results_file)
+            self.loss += results['loss']*results['samples']/float(self.accuracy.shape[0])
+            self.error += results['error']*results['samples']/float(self.accuracy.shape[0])
+            if self.args.quantize and self.args.quantize_check:
+                float_error += results['float_error']*results['samples']/float(self.accuracy.shape[0])
+            utils.remove(results_file)
+        log('[Testing] test loss %g; test error %g' % (self.loss, self.error))
+
+        self.results = {
+            'loss': self.loss,
+            'error': self.error,
+            'samples': self.accuracy.shape[0],
+        }
+        if self.args.quantize and self.args.quantize_check:
+            log('[Testing] quantized error %g; float32 error %g' % (self.error, float_error))
+            self.results['float_error'] = float_error
         if self.args.results_file:
             utils.write_pickle(self.args.results_file, self.results)
             log('[Testing] wrote %s' % self.args.results_file)
@@ -161,6 +248,10 @@ class TestClassifier:
         Main which should be overwritten.
         """
 
+        if self.args.shard < 0 and self.args.shards > 1:
+            self.merge()
+            return
+
         self.test_images = utils.read_hdf5(self.args.test_images_file).astype(numpy.float32)
         log('[Testing] read %s' % self.args.test_images_file)
 
@@ -176,6 +267,13 @@ class TestClassifier:
         log('[Testing] read %s' % self.args.test_codes_file)
 
         N_class = numpy.max(self.test_codes) + 1
+        if self.args.shard >= 0:
+            start, end = common.shard.shard_range(self.test_images.shape[0], self.args.shard, self.args.shards)
+            self.test_images = self.test_images[start: end]
+            self.test_codes = self.test_codes[start: end]
+            self.args.accuracy_file = common.shard.shard_file(self.args.accuracy_file, self.args.shard)
+            self.args.results_file = self.args.accuracy_file + '.pkl'
+            log('[Testing] shard %d: samples %d to %d' % (self.args.shard, start, end))
         network_units = list(map(int, self.args.network_units.split(',')))
         log('[Testing] using %d input channels' % self.test_images.shape[3])
         self.model = models.Classifier(N_class, resolution=(self.test_images.shape[3], self.test_images.shape[1], self.test_images.shape[2]),
@@ -199,6 +297,13 @@ class TestClassifier:
         self.model.eval()
         log('[Testing] set classifier to eval')
 
+        if self.args.fold:
+            self.model.fold()
+            log('[Testing] folded classifier')
+
+        if self.args.quantize:
+            self.quantize()
+
         self.test()
 
 
@@ -4,12 +4,13 @@ import sys
 sys.path.insert(1, os.path.dirname(os.path.realpath(__file__)) + '/../')
 from common import utils
 import models
-from common.log import log, Log, LogLevel
+from common.log import log, Log
 from common.state import State
 from common import cuda
 from common import paths
 import common.torch
 import common.numpy
+import common.shard
 import math
 import torch
 import numpy
@@ -32,6 +33,9 @@ class TestPerturbations:
         self.args = None
         """ Arguments of program. """
 
+        self.argv = args if args is not None else sys.argv[1:]
+        """ ([str]) Arguments as given, e.g., passed on to shards. """
+
         parser = self.get_parser()
         if args is not None:
             self.args = parser.parse_args(args)
@@ -62,6 +66,9 @@ class TestPerturbations:
         self.transfer_success = None
         """ (numpy.ndarray) Success per test image. """
 
+        self.float_model = None
+        """ (torch.nn.Module) Float32 classifier when checking the quantized classifier. """
+
         if self.args.log_file:
             utils.makedir(os.path.dirname(self.args.log_file))
             Log.get_instance().attach(open(self.args.log_file, 'w'))
@@ -100,6 +107,12 @@ class TestPerturbations:
         parser.add_argument('-log_file', default=paths.log_file('classifier/attacks'), help='Log file.', type=str)
         parser.add_argument('-batch_size', default=128, help='Batch size of attack.', type=int)
         parser.add_argument('-no_gpu', dest='use_gpu', action='store_false')
+        parser.add_argument('-quantize', default=False, action='store_true', help='Test using the int8-quantized classifier on CPU; requires PyTorch 1.3 or newer and an mlp or linear architecture.')
+        parser.add_argument('-quantize_check', default=False, action='store_true', help='With -quantize, additionally run the float32 classifier and report the deviation of the quantized classifier.')
+        parser.add_argument('-fold', default=False, action='store_true', help='Fold batch normalization into the classifier and freeze it for faster inference.')
+        parser.add_argument('-shards', default=1, help='Number of worker processes to split the samples across.', type=int)
+        parser.add_argument('-shard', default=-1, help='Shard processed by this worker, -1 to start all shards.', type=int)
+        parser.add_argument('-threads', default=1, help='Number of intra-op threads per worker, 0 to keep the default.', type=int)
 
         # Some network parameters.
         parser.add_argument('-network_architecture', default='standard', help='Classifier architecture to use.', type=str)
@@ -141,6 +154,10 @@ class TestPerturbations:
             for n in range(batch_perturbations.size(0)):
                 log('[Testing] %d: original success=%d, transfer accuracy=%d' % (n, self.original_success[b_start + n], errors[n].item()))
 
+        if self.float_model is not None:
+            float_accuracy = self.errors(self.float_model, self.perturbations, self.perturbation_codes)
+            log('[Testing] quantized transfer accuracy changed on %d of %d perturbations' % (numpy.sum((perturbations_accuracy == 0) != (float_accuracy == 0)), perturbations_accuracy.shape[0]))
+
         self.transfer_success[perturbations_accuracy == 0] = -1
         self.transfer_success = self.transfer_success.reshape((self.N_samples, self.N_attempts))
         self.transfer_success = numpy.swapaxes(self.transfer_success, 0, 1)
@@ -166,6 +183,10 @@ class TestPerturbations:
             if b % 100 == 0:
                 log('[Testing] computing accuracy %d' % b)
 
+        if self.float_model is not None:
+            float_accuracy = self.errors(self.float_model, self.test_images, self.test_codes)
+            log('[Testing] quantized accuracy changed on %d of %d samples' % (numpy.sum((self.transfer_accuracy == 0) != (float_accuracy == 0)), self.transfer_accuracy.shape[0]))
+
         self.transfer_accuracy = self.transfer_accuracy == 0
         log('[Testing] original accuracy=%g' % (numpy.sum(self.original_accuracy)/float(self.original_accuracy.shape[0])))
         log('[Testing] transfer accuracy=%g' % (numpy.sum(self.transfer_accuracy)/float(self.transfer_accuracy.shape[0])))
@@ -177,6 +198,54 @@ class TestPerturbations:
         utils.write_hdf5(self.args.transfer_accuracy_file, self.transfer_accuracy)
         log('[Testing] wrote %s' % self.args.transfer_accuracy_file)
 
+    def errors(self, model, images, codes):
+        """
+        Compute per-sample errors of a classifier, e.g., of the float32 classifier when testing the quantized one.
+
+        :param model: classifier
+        :type model: torch.nn.Module
+        :param images: images
+        :type images: numpy.ndarray
+        :param codes: classes
+        :type codes: numpy.ndarray
+        :return: errors, zero if correctly classified
+        :rtype: numpy.ndarray
+        """
+
+        errors = None
+        num_batches = int(math.ceil(images.shape[0] / self.args.batch_size))
+
+        for b in range(num_batches):
+            b_start = b * self.args.batch_size
+            b_end = min((b + 1) * self.args.batch_size, images.shape[0])
+            batch_images = common.torch.as_variable(images[b_start: b_end], self.args.use_gpu)
+            batch_classes = common.torch.as_variable(codes[b_start: b_end], self.args.use_gpu)
+            batch_images = batch_images.permute(0, 3, 1, 2)
+
+            with torch.no_grad():
+                output_classes = model(batch_images)
+            indices = torch.max(output_classes, dim=1)[1]
+            errors = common.numpy.concatenate(errors, torch.abs(indices - batch_classes).cpu().numpy())
+
+        return errors
+
+    def quantize(self):
+        """
+        Replace the classifier by its int8-quantized version; with -quantize_check, the float32 classifier is kept
+        to report the deviation.
+        """
+
+        assert not self.args.use_gpu, 'quantized classifiers are only supported on CPU, use -no_gpu'
+        # Only linear layers are quantized, convolutional classifiers would remain in float32.
+        assert self.args.network_architecture in ['mlp', 'linear'], 'quantization only supported for mlp and linear architectures'
+
+        model = common.torch.quantize(self.model)
+
+        if self.args.quantize_check:
+            self.float_model = self.model
+        self.model = model
+        log('[Testing] quantized classifier')
+
     def load_models(self):
         """
         Load models.
@@ -206,6 +275,13 @@ class TestPerturbations:
         self.model.eval()
         log('[Testing] set classifier to eval')
 
+        if self.args.fold:
+            self.model.fold()
+            log('[Testing] folded classifier')
+
+        if self.args.quantize:
+            self.quantize()
+
     def load_data(self):
         """
         Load data.
@@ -242,13 +318,51 @@ class TestPerturbations:
         self.perturbation_codes = numpy.repeat(self.test_codes[:self.N_samples], self.N_attempts, axis=0)
         self.transfer_success = numpy.copy(self.original_success)
 
+    def shard(self):
+        """
+        Restrict perturbations and test samples to the shard of this worker.
+        """
+
+        # Perturbations are sample-major, i.e., all attempts of a sample are consecutive.
+        start, end = common.shard.shard_range(self.N_samples, self.args.shard, self.args.shards)
+        self.perturbations = self.perturbations[start*self.N_attempts: end*self.N_attempts]
+        self.perturbation_codes = self.perturbation_codes[start*self.N_attempts: end*self.N_attempts]
+        self.original_success = self.original_success[start*self.N_attempts: end*self.N_attempts]
+        self.transfer_success = self.transfer_success[start*self.N_attempts: end*self.N_attempts]
+        self.N_samples = end - start
+        log('[Testing] shard %d: perturbations of samples %d to %d' % (self.args.shard, start, end))
+
+        start, end = common.shard.shard_range(self.test_images.shape[0], self.args.shard, self.args.shards)
+        self.test_images = self.test_images[start: end]
+        self.test_codes = self.test_codes[start: end]
+        self.original_accuracy = self.original_accuracy[start: end]
+        log('[Testing] shard %d: samples %d to %d' % (self.args.shard, start, end))
+
+        self.args.transfer_success_file = common.shard.shard_file(self.args.transfer_success_file, self.args.shard)
+        self.args.transfer_accuracy_file = common.shard.shard_file(self.args.transfer_accuracy_file, self.args.shard)
+
+    def merge(self):
+        """
+        Run all shards and merge their results.
+        """
+
+        common.shard.run(self.__class__, self.argv, self.args.shards, self.args.threads, self.args.log_file)
+        self.transfer_success = common.shard.merge_hdf5(self.args.transfer_success_file, self.args.shards, axis=1)
+        self.transfer_accuracy = common.shard.merge_hdf5(self.args.transfer_accuracy_file, self.args.shards, axis=0)
+
     def main(self):
         """
         Main.
         """
 
+        if self.args.shard < 0 and self.args.shards > 1:
+            self.merge()
+            return
+
         self.load_data()
         self.load_models()
+        if self.args.shard >= 0:
+            self.shard()
         self.test()
 
 
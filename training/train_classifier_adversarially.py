@@ -11,6 +11,7 @@ from common.timer import elapsed
 from common import paths
 import common.torch
 import common.numpy
+import attacks
 from training import train_classifier
 import torch
 import numpy
@@ -51,6 +52,15 @@ class TrainClassifierAdversarially(train_classifier.TrainClassifier):
         self.norm = None
         """ (float) Attack norm for data augmentation. """
 
+        self.compiled_model = None
+        """ (models.Compiled) Compiled model used for attacks. """
+
+        self.compiled_objective = None
+        """ (attacks.CompiledObjective) Compiled objective used for attacks. """
+
+        self.generator = None
+        """ (models.PerturbationGenerator) Perturbation generator to initialize attacks with. """
+
     def get_parser(self):
         """
         Get parser.
@@ -79,6 +89,9 @@ class TrainClassifierAdversarially(train_classifier.TrainClassifier):
         parser.add_argument('-validation_samples', default=0, help='Number of samples for validation.', type=int)
         parser.add_argument('-early_stopping', default=False, action='store_true', help='Use early stopping.')
         parser.add_argument('-attack_samples', default=1000, help='Samples to attack.', type=int)
+        parser.add_argument('-estimate_width', default=0, help='Attack test samples in random order until the confidence interval on robust error is narrower than this width; 0 to attack all samples.', type=float)
+        parser.add_argument('-estimate_confidence', default=0.95, help='Confidence level of the interval on robust error.', type=float)
+        parser.add_argument('-estimate_interval', default='wilson', help='Confidence interval on robust error, wilson or clopper_pearson.', type=str)
         parser.add_argument('-batch_size', default=64, help='Batch size.', type=int)
         parser.add_argument('-epochs', default=10, help='Number of epochs.', type=int)
         parser.add_argument('-weight_decay', default=0.0001, help='Weight decay importance.', type=float)
@@ -110,6 +123,9 @@ class TrainClassifierAdversarially(train_classifier.TrainClassifier):
         parser.add_argument('-max_projections', default=5, help='Number of projections for alternating projection.', type=int)
         parser.add_argument('-base_lr', default=0.005, help='Learning rate for attack.', type=float)
         parser.add_argument('-verbose', action='store_true', default=False, help='Verbose attacks.')
+        parser.add_argument('-compile', default=False, action='store_true', help='Compile model and objective for the attack; requires PyTorch 1.0 or newer, otherwise the attack runs eagerly.')
+        parser.add_argument('-generator_file', default='', help='Snapshot state file of a perturbation generator to initialize the attack with.', type=str)
+        parser.add_argument('-generator_architecture', default='standard', help='Architecture of the perturbation generator.', type=str)
 
         # Variants.
         parser.add_argument('-full_variant', default=False, action='store_true', help='100% variant.')
@@ -129,6 +145,13 @@ class TrainClassifierAdversarially(train_classifier.TrainClassifier):
         :type batch_classes: torch.autograd.Variable
         """
 
+        if self.args.compile:
+            # Weights are shared, so the compiled model follows the updates during training.
+            if self.compiled_model is None:
+                self.compiled_model = models.Compiled(model)
+            assert self.compiled_model.module is model
+            model = self.compiled_model
+
         attack = self.attack_class(model, batch_images, batch_classes, self.args.epsilon)
 
         if getattr(attack, 'set_c_0', None) is not None:
@@ -153,10 +176,28 @@ class TrainClassifierAdversarially(train_classifier.TrainClassifier):
         else:
             assert attack.training_mode is False
 
-        attack.initialize_random()
+        if self.generator is not None:
+            attack.initialize_generator(self.generator)
+        else:
+            attack.initialize_random()
 
         return attack
 
+    def setup_objective(self):
+        """
+        Setup objective.
+
+        :return: objective
+        :rtype: attacks.UntargetedObjective
+        """
+
+        if self.args.compile:
+            if self.compiled_objective is None:
+                self.compiled_objective = attacks.CompiledObjective(self.objective_class())
+            return self.compiled_objective
+
+        return self.objective_class()
+
     def train(self):
         """
         Train adversarially.
@@ -181,7 +222,7 @@ class TrainClassifierAdversarially(train_classifier.TrainClassifier):
                 batch_images = common.torch.as_variable(self.train_images[perm], self.args.use_gpu)
                 batch_images = batch_images.permute(0, 3, 1, 2)
 
-                objective = self.objective_class()
+                objective = self.setup_objective()
                 attack = self.setup_attack(self.model, batch_images, batch_classes)
                 success, perturbations, probabilities, norm, _ = attack.run(objective, self.args.verbose)
                 batch_perturbations = common.torch.as_variable(perturbations.astype(numpy.float32), self.args.use_gpu)
@@ -204,7 +245,7 @@ class TrainClassifierAdversarially(train_classifier.TrainClassifier):
                 error = self.error(batch_classes, output_classes)
                 perturbation_error = error = error.item()
             else:
-                objective = self.objective_class()
+                objective = self.setup_objective()
                 attack = self.setup_attack(self.model, batch_images[split:], batch_classes[split:])
                 success, perturbations, probabilities, norm, _ = attack.run(objective, self.args.verbose)
 
@@ -306,13 +347,19 @@ class TrainClassifierAdversarially(train_classifier.TrainClassifier):
         num_batches = int(math.ceil(self.args.attack_samples/self.args.batch_size))
         assert self.args.attack_samples > 0 and self.args.attack_samples <= self.test_images.shape[0]
 
+        samples = numpy.arange(self.args.attack_samples)
+        if self.args.estimate_width > 0:
+            # Random order such that stopping early gives an unbiased estimate.
+            samples = numpy.random.permutation(samples)
+        errors = trials = 0
+
         for b in range(num_batches):
-            perm = numpy.take(range(self.args.attack_samples), range(b*self.args.batch_size, (b+1)*self.args.batch_size), mode='clip')
+            perm = numpy.take(samples, range(b*self.args.batch_size, (b+1)*self.args.batch_size), mode='clip')
             batch_images = common.torch.as_variable(self.test_images[perm], self.args.use_gpu)
             batch_classes = common.torch.as_variable(self.test_codes[perm], self.args.use_gpu)
             batch_images = batch_images.permute(0, 3, 1, 2)
 
-            objective = self.objective_class()
+            objective = self.setup_objective()
             attack = self.setup_attack(self.model, batch_images, batch_classes)
             s, p, _, _, _ = attack.run(objective, False)
 
@@ -329,6 +376,18 @@ class TrainClassifierAdversarially(train_classifier.TrainClassifier):
             norm += numpy.mean(numpy.linalg.norm(p.reshape(p.shape[0], -1), axis=1, ord=self.norm))
             success += numpy.sum(s >= 0)/self.args.batch_size
 
+            if self.args.estimate_width > 0:
+                # The last batch is padded by clipping, padded samples are not counted.
+                valid = min(self.args.batch_size, self.args.attack_samples - b*self.args.batch_size)
+                incorrect = torch.max(output_classes, 1)[1] != batch_classes
+                errors += int(torch.sum(incorrect[:valid]).item())
+                trials += valid
+                lower, upper = common.numpy.binomial_interval(errors, trials, self.args.estimate_confidence, self.args.estimate_interval)
+                if upper - lower < self.args.estimate_width:
+                    log('[Training] %d: robust error in [%g, %g] after %d samples' % (self.epoch, lower, upper, trials))
+                    num_batches = b + 1
+                    break
+
         perturbation_error /= num_batches
         perturbation_loss /= num_batches
         success /= num_batches
@@ -444,6 +503,25 @@ class TrainClassifierAdversarially(train_classifier.TrainClassifier):
             exit(1)
         log('[Training] found %s' % self.objective_class)
 
+    def load_generator(self):
+        """
+        Load perturbation generator to initialize attacks with, if requested.
+        """
+
+        if not self.args.generator_file:
+            return
+
+        self.generator = models.PerturbationGenerator((self.train_images.shape[3], self.train_images.shape[1], self.train_images.shape[2]), self.args.epsilon, self.norm, architecture=self.args.generator_architecture)
+        assert os.path.exists(self.args.generator_file), 'state file %s not found' % self.args.generator_file
+        state = State.load(self.args.generator_file)
+        log('[Training] read %s' % self.args.generator_file)
+
+        self.generator.load_state_dict(state.model)
+        if self.args.use_gpu and not cuda.is_cuda(self.generator):
+            self.generator = self.generator.cuda()
+        self.generator.eval()
+        log('[Training] loaded generator')
+
     def main(self):
         """
         Main which should be overwritten.
@@ -451,6 +529,7 @@ class TrainClassifierAdversarially(train_classifier.TrainClassifier):
 
         self.load_attack()
         self.load_data()
+        self.load_generator()
         self.load_model_and_scheduler()
 
         assert self.norm is not None
@@ -69,6 +69,7 @@ class TrainLearnedDecoderClassifierAdversarially(train_classifier_adversarially.
         parser.add_argument('-test_images_file', default=paths.test_images_file(), help='HDF5 file containing dataset.', type=str)
         parser.add_argument('-test_codes_file', default=paths.test_codes_file(), help='HDF5 file containing codes.', type=str)
         parser.add_argument('-decoder_files', default=paths.state_file('decoder'), help='Decoder files.', type=str)
+        parser.add_argument('-decoder_grouped', default=False, action='store_true', help='Run the per-class decoders on samples grouped by class, stacking their weights if possible.')
         parser.add_argument('-latent_space_size', default=10, help='Size of latent space.', type=int)
         parser.add_argument('-label_index', default=2, help='Column index in label file.', type=int)
         parser.add_argument('-state_file', default=paths.state_file('robust_manifold_classifier'), help='Snapshot state file.', type=str)
@@ -571,7 +572,7 @@ class TrainLearnedDecoderClassifierAdversarially(train_classifier_adversarially.
 
                 decoder.eval()
                 log('[Training] loaded %s' % decoder_files[i])
-            self.decoder = models.SelectiveDecoder(decoders, resolution=(self.train_images.shape[3], self.train_images.shape[1], self.train_images.shape[2]))
+            self.decoder = models.SelectiveDecoder(decoders, resolution=(self.train_images.shape[3], self.train_images.shape[1], self.train_images.shape[2]), grouped=self.args.decoder_grouped)
         else:
             log('[Training] loading one decoder')
             decoder = models.LearnedDecoder(self.args.latent_space_size, resolution=(self.train_images.shape[3], self.train_images.shape[1], self.train_images.shape[2]),
@@ -0,0 +1,306 @@
+import os
+import sys
+sys.path.insert(1, os.path.dirname(os.path.realpath(__file__)) + '/../')
+from common import utils
+import models
+from common.log import log, Log
+from common.scheduler import ADAMScheduler
+from common.state import State
+from common import cuda
+from common.timer import elapsed
+from common import paths
+import common.torch
+import torch
+import numpy
+import argparse
+import math
+import functools
+
+
+class TrainPerturbationGenerator:
+    """
+    Train a perturbation generator on stored successful perturbations, to be used to initialize attacks.
+    """
+
+    def __init__(self, args=None):
+        """
+        Initialize.
+
+        :param args: optional arguments if not to use sys.argv
+        :type args: [str]
+        """
+
+        self.args = None
+        """ Arguments of program. """
+
+        parser = self.get_parser()
+        if args is not None:
+            self.args = parser.parse_args(args)
+        else:
+            self.args = parser.parse_args()
+
+        self.inputs = None
+        """ (numpy.ndarray) Inputs, i.e., images or latent codes, with successful perturbations. """
+
+        self.perturbations = None
+        """ (numpy.ndarray) Successful perturbations to regress. """
+
+        self.val_inputs = None
+        """ (numpy.ndarray) Inputs to validate on. """
+
+        self.val_perturbations = None
+        """ (numpy.ndarray) Perturbations to validate on. """
+
+        self.model = None
+        """ (models.PerturbationGenerator) Model to train. """
+
+        self.scheduler = None
+        """ (Scheduler) Scheduler for training. """
+
+        self.train_statistics = numpy.zeros((0, 3))
+        """ (numpy.ndarray) Will hold training statistics. """
+
+        self.epoch = 0
+        """ (int) Current epoch. """
+
+        utils.makedir(os.path.dirname(self.args.state_file))
+        utils.makedir(os.path.dirname(self.args.log_file))
+
+        if self.args.log_file:
+            Log.get_instance().attach(open(self.args.log_file, 'w'))
+
+        log('-- ' + self.__class__.__name__)
+        for key in vars(self.args):
+            log('[Training] %s=%s' % (key, str(getattr(self.args, key))))
+
+    def __del__(self):
+        """
+        Remove log file.
+        """
+
+        if self.args is not None:
+            if self.args.log_file:
+                Log.get_instance().detach(self.args.log_file)
+
+    def get_parser(self):
+        """
+        Get parser.
+
+        :return: parser
+        :rtype: argparse.ArgumentParser
+        """
+
+        parser = argparse.ArgumentParser(description='Train perturbation generator.')
+        parser.add_argument('-inputs_file', default=paths.test_images_file(), help='HDF5 file containing the attacked images or latent codes.', type=str)
+        parser.add_argument('-perturbations_file', default=paths.results_file('classifier/perturbations'), help='HDF5 file containing perturbed inputs.', type=str)
+        parser.add_argument('-success_file', default=paths.results_file('classifier/success'), help='HDF5 file indicating attack success.', type=str)
+        parser.add_argument('-state_file', default=paths.state_file('generator'), help='Snapshot state file.', type=str)
+        parser.add_argument('-log_file', default=paths.log_file('generator'), help='Log file.', type=str)
+        parser.add_argument('-training_file', default=paths.results_file('generator/training'), help='Training statistics file.', type=str)
+        parser.add_argument('-epsilon', default=0.3, help='Epsilon of the attack.', type=float)
+        parser.add_argument('-ord', default=float('inf'), help='Norm of the attack.', type=float)
+        parser.add_argument('-validation_samples', default=0, help='Number of samples for validation.', type=int)
+        parser.add_argument('-batch_size', default=64, help='Batch size.', type=int)
+        parser.add_argument('-epochs', default=10, help='Number of epochs.', type=int)
+        parser.add_argument('-weight_decay', default=0.0001, help='Weight decay importance.', type=float)
+        parser.add_argument('-no_gpu', dest='use_gpu', action='store_false')
+        parser.add_argument('-skip', default=5, help='Verbosity in iterations.', type=int)
+        parser.add_argument('-lr', default=0.01, type=float, help='Base learning rate.')
+        parser.add_argument('-lr_decay', default=0.9, type=float, help='Learning rate decay.')
+
+        # Some network parameters; attacks construct the generator with the defaults.
+        parser.add_argument('-network_architecture', default='standard', help='Generator architecture to use, standard for images and mlp for latent codes.', type=str)
+
+        return parser
+
+    def loss(self, batch_perturbations, output_perturbations):
+        """
+        Loss.
+
+        :param batch_perturbations: target perturbations
+        :type batch_perturbations: torch.autograd.Variable
+        :param output_perturbations: predicted perturbations
+        :type output_perturbations: torch.autograd.Variable
+        :return: error
+        :rtype: torch.autograd.Variable
+        """
+
+        return torch.mean(torch.sum((output_perturbations - batch_perturbations).view(batch_perturbations.size(0), -1)**2, dim=1))
+
+    def train(self):
+        """
+        Train for one epoch.
+        """
+
+        self.model.train()
+        log('[Training] %d set generator to train' % self.epoch)
+        assert self.model.training is True
+
+        num_batches = int(math.ceil(self.inputs.shape[0]/self.args.batch_size))
+        permutation = numpy.random.permutation(self.inputs.shape[0])
+
+        for b in range(num_batches):
+            self.scheduler.update(self.epoch, float(b)/num_batches)
+
+            perm = numpy.take(permutation, range(b*self.args.batch_size, (b+1)*self.args.batch_size), mode='wrap')
+            batch_inputs = common.torch.as_variable(self.inputs[perm], self.args.use_gpu)
+            batch_perturbations = common.torch.as_variable(self.perturbations[perm], self.args.use_gpu)
+
+            output_perturbations = self.model(batch_inputs)
+
+            self.scheduler.optimizer.zero_grad()
+            loss = self.loss(batch_perturbations, output_perturbations)
+            loss.backward()
+            self.scheduler.optimizer.step()
+            loss = loss.item()
+
+            iteration = self.epoch*num_batches + b + 1
+            self.train_statistics = numpy.vstack((self.train_statistics, numpy.array([
+                iteration,
+                iteration*self.args.batch_size,
+                loss,
+            ])))
+
+            if b % self.args.skip == self.args.skip // 2:
+                log('[Training] %d | %d: %g' % (
+                    self.epoch,
+                    b,
+                    numpy.mean(self.train_statistics[max(0, iteration - self.args.skip):iteration, 2]),
+                ))
+
+    def validate(self):
+        """
+        Validate the model.
+        """
+
+        self.model.eval()
+        log('[Training] %d set generator to eval' % self.epoch)
+        assert self.model.training is False
+
+        loss = 0
+        num_batches = int(math.ceil(self.val_inputs.shape[0]/self.args.batch_size))
+
+        for b in range(num_batches):
+            b_start = b*self.args.batch_size
+            b_end = min((b + 1)*self.args.batch_size, self.val_inputs.shape[0])
+            batch_inputs = common.torch.as_variable(self.val_inputs[b_start: b_end], self.args.use_gpu)
+            batch_perturbations = common.torch.as_variable(self.val_perturbations[b_start: b_end], self.args.use_gpu)
+
+            with torch.no_grad():
+                output_perturbations = self.model(batch_inputs)
+            loss += self.loss(batch_perturbations, output_perturbations).item()
+
+        loss /= num_batches
+        log('[Training] %d: val %g' % (self.epoch, loss))
+
+    def loop(self):
+        """
+        Main loop for training and validation.
+        """
+
+        while self.epoch < self.args.epochs:
+            log('[Training] %s' % self.scheduler.report())
+
+            training = elapsed(functools.partial(self.train))
+            log('[Training] %gs training' % training)
+
+            if self.val_inputs is not None:
+                validation = elapsed(functools.partial(self.validate))
+                log('[Training] %gs validation' % validation)
+
+            utils.remove(self.args.state_file + '.%d' % (self.epoch - 1))
+            State.checkpoint(self.model, self.scheduler.optimizer, self.epoch, self.args.state_file + '.%d' % self.epoch)
+            log('[Training] %d: checkpoint' % self.epoch)
+
+            if self.args.training_file:
+                utils.write_hdf5(self.args.training_file, self.train_statistics)
+                log('[Training] %d: wrote %s' % (self.epoch, self.args.training_file))
+            self.epoch += 1 # !
+
+        utils.remove(self.args.state_file + '.%d' % (self.epoch - 1))
+        State.checkpoint(self.model, self.scheduler.optimizer, self.epoch, self.args.state_file)
+        log('[Training] %d: checkpoint' % self.epoch)
+
+    def load_data(self):
+        """
+        Load data; for every sample, the smallest successful perturbation across attempts is used as target.
+        """
+
+        inputs = utils.read_hdf5(self.args.inputs_file).astype(numpy.float32)
+        log('[Training] read %s' % self.args.inputs_file)
+
+        perturbations = utils.read_hdf5(self.args.perturbations_file).astype(numpy.float32)
+        log('[Training] read %s' % self.args.perturbations_file)
+
+        success = utils.read_hdf5(self.args.success_file)
+        log('[Training] read %s' % self.args.success_file)
+
+        assert perturbations.shape[0] == success.shape[0]
+        assert perturbations.shape[1] == success.shape[1]
+        assert perturbations.shape[1] <= inputs.shape[0]
+
+        # For handling both color and gray images.
+        if len(inputs.shape) == 3:
+            inputs = numpy.expand_dims(inputs, axis=3)
+        inputs = inputs[:perturbations.shape[1]]
+        perturbations = perturbations.reshape((perturbations.shape[0], ) + inputs.shape) - numpy.expand_dims(inputs, axis=0)
+        if len(inputs.shape) == 4:
+            inputs = numpy.transpose(inputs, (0, 3, 1, 2))
+            perturbations = numpy.transpose(perturbations, (0, 1, 4, 2, 3))
+
+        norms = numpy.linalg.norm(perturbations.reshape(perturbations.shape[0], perturbations.shape[1], -1), ord=self.args.ord, axis=2)
+        norms[success < 0] = numpy.inf
+        attempts = numpy.argmin(norms, axis=0)
+        selected = numpy.min(norms, axis=0) < numpy.inf
+        log('[Training] found %d samples with successful perturbations' % numpy.sum(selected))
+
+        self.inputs = inputs[selected]
+        self.perturbations = perturbations[attempts[selected], numpy.arange(perturbations.shape[1])[selected]]
+
+        if self.args.validation_samples > 0:
+            assert self.args.validation_samples < self.inputs.shape[0]
+            self.val_inputs = self.inputs[-self.args.validation_samples:]
+            self.val_perturbations = self.perturbations[-self.args.validation_samples:]
+            self.inputs = self.inputs[:-self.args.validation_samples]
+            self.perturbations = self.perturbations[:-self.args.validation_samples]
+
+    def load_model_and_scheduler(self):
+        """
+        Load model.
+        """
+
+        params = {
+            'lr': self.args.lr,
+            'lr_decay': self.args.lr_decay,
+            'lr_min': 0.0000001,
+            'weight_decay': self.args.weight_decay,
+        }
+
+        self.model = models.PerturbationGenerator(self.inputs.shape[1:], self.args.epsilon, self.args.ord,
+                                                  architecture=self.args.network_architecture)
+
+        if self.args.use_gpu and not cuda.is_cuda(self.model):
+            self.model = self.model.cuda()
+            log('[Training] model is not CUDA')
+
+        self.scheduler = ADAMScheduler(self.model.parameters(), **params)
+        self.scheduler.initialize()  # !
+
+        log(self.model)
+
+    def main(self):
+        """
+        Main.
+        """
+
+        self.load_data()
+        self.load_model_and_scheduler()
+
+        assert self.model is not None
+        assert self.scheduler is not None
+        self.loop()
+
+
+if __name__ == '__main__':
+    program = TrainPerturbationGenerator()
+    program.main()